@@ -0,0 +1,78 @@
+import asyncio
+from quart import Quart, Response, abort, request, send_file
+from routes.async_api import async_api_bp
+from protocol.url_storage import (
+    initialize_system, file_monitor, redis_monitor, lead_background_sync, maintain_code_filter,
+    host_leader, change_feed
+)
+from protocol.file_backends import file_backup
+from protocol.url_index import url_index, file_writer
+from config.settings import STORAGE_MODE
+from protocol.analytics import click_aggregator
+from utils.static_assets import static_assets, is_not_modified
+
+# ASGI-режим: все обработчики, мониторы и лента изменений живут в одном event loop
+# сервера, Redis вызывается напрямую через await (redis_bridge здесь не нужен).
+#
+#   hypercorn asgi:app --bind 0.0.0.0:5001
+#   python asgi.py
+
+app = Quart(__name__, static_folder=None)
+
+app.register_blueprint(async_api_bp)
+
+background_tasks = []
+
+
+async def send_static(asset):
+    if asset is None:
+        abort(404)
+    if is_not_modified(request.headers.get("If-None-Match"), asset.etag):
+        response = Response("", status=304)
+    else:
+        response = await send_file(asset.path, mimetype=asset.mimetype, add_etags=False)
+    response.headers.update(asset.headers())
+    return response
+
+
+@app.route("/")
+async def home():
+    return await send_static(static_assets.home(request.headers.get("Accept-Encoding")))
+
+
+@app.route("/static/<path:filename>")
+async def static_file(filename):
+    return await send_static(static_assets.resolve(filename, request.headers.get("Accept-Encoding")))
+
+
+@app.before_serving
+async def startup():
+    """Подключаемся к Redis и запускаем фоновые задачи в loop сервера"""
+    print("[APP] Starting ASGI application...")
+    # С несколькими воркерами (hypercorn -w N) мониторы работают только у лидера на машине
+    if not await initialize_system(host_leader.try_acquire()):
+        raise RuntimeError("Initialization failed")
+    if STORAGE_MODE != "redis":
+        # Индекс загружается до первого запроса и не в loop сервера
+        await asyncio.to_thread(url_index.reload)
+
+    background_tasks.append(asyncio.create_task(click_aggregator.run()))
+    background_tasks.append(asyncio.create_task(maintain_code_filter()))
+    background_tasks.append(asyncio.create_task(lead_background_sync()))
+
+
+@app.after_serving
+async def shutdown():
+    file_monitor.stop_monitoring()
+    redis_monitor.stop_monitoring()
+    change_feed.stop()
+    click_aggregator.stop()
+    for task in background_tasks:
+        task.cancel()
+    await click_aggregator.flush()
+    file_backup.flush()
+    file_writer.flush()
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5001)
@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import time
+import random
+import resource
+import subprocess
+from typing import Dict, List, Optional
+
+# Один seed на все прогоны: одинаковые коды, URL и порядок запросов на любом коммите
+BENCH_SEED = 20240601
+
+CODE_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+CODE_LENGTH = 7
+
+# ---------------------------
+# DATASET
+# ---------------------------
+
+def dataset_codes(size: int, seed: int = BENCH_SEED) -> List[str]:
+    """Коды набора данных: случайные, как у ссылок до перехода на счётчик"""
+    rng = random.Random(seed)
+    codes = set()
+    while len(codes) < size:
+        codes.add("".join(rng.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH)))
+    return sorted(codes)
+
+def dataset_url(i: int) -> str:
+    return f"https://bench.example.com/dataset/{i}?ref=bench"
+
+def write_dataset(path: str, codes: List[str], backend: str):
+    """Пишем набор потоково, не собирая весь JSON в памяти (1M записей ~ 80 МБ)"""
+    with open(path, "w", encoding="utf-8") as f:
+        if backend == "log":
+            for i, code in enumerate(codes):
+                f.write(json.dumps({"id": code, "original_url": dataset_url(i)}) + "\n")
+            return
+        f.write("[\n")
+        for i, code in enumerate(codes):
+            if i:
+                f.write(",\n")
+            f.write(json.dumps({"id": code, "original_url": dataset_url(i)}))
+        f.write("\n]")
+
+# ---------------------------
+# APPLICATION SETUP
+# ---------------------------
+
+def fake_redis():
+    """Подменяем клиент ashredis на fakeredis: весь Redis живёт в памяти процесса"""
+    import fakeredis
+    import ashredis.object_redis as object_redis
+
+    server = fakeredis.FakeServer()
+
+    class FakeRedis(fakeredis.FakeAsyncRedis):
+        def __init__(self, host=None, port=None, password=None, db=0, decode_responses=True, **kwargs):
+            super().__init__(server=server, db=db, decode_responses=decode_responses)
+
+    object_redis.Redis = FakeRedis
+
+def prepare_app(size: int, mode: str, backend: str, redis: str, workdir: str):
+    """Готовим набор данных и поднимаем Flask-приложение так же, как main.py.
+
+    Настройки передаются через окружение до импорта приложения, DATA_FILE
+    подменяется в BANNED_FILES.config - модули хранилища читают его при импорте.
+    Возвращает (app, startup_seconds).
+    """
+    data_file = os.path.join(workdir, "data.jsonl" if backend == "log" else "data.json")
+    os.environ.update({
+        "URL_STORAGE_MODE": mode,
+        "URL_STORAGE_BACKEND": backend,
+        "URL_LOG_FILE": data_file,
+        "URL_CODE_COUNTER_FILE": os.path.join(workdir, "data.counter"),
+        "URL_ANALYTICS_FILE": os.path.join(workdir, "data.clicks.json"),
+    })
+
+    print(f"[BENCH] Writing {size} records to {data_file}")
+    write_dataset(data_file, dataset_codes(size), backend)
+
+    if redis == "fake":
+        fake_redis()
+
+    import BANNED_FILES.config as private_config
+    private_config.DATA_FILE = data_file
+
+    started = time.perf_counter()
+    import main
+    main.init_sync()
+    return main.app, time.perf_counter() - started
+
+# ---------------------------
+# MEASUREMENTS
+# ---------------------------
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(latencies: List[float], elapsed: float, errors: int) -> Dict[str, float]:
+    """Латентности в секундах -> сводка в миллисекундах"""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        "requests": count,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(count / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(values) / count * 1000, 3) if count else 0.0,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p90_ms": round(percentile(values, 0.90) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if count else 0.0,
+    }
+
+def own_peak_rss() -> int:
+    """Пиковый RSS текущего процесса в байтах (ru_maxrss в Linux - килобайты)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def process_peak_rss(pid: int) -> Optional[int]:
+    """Пиковый RSS другого процесса (VmHWM из /proc, только Linux)"""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
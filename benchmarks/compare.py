@@ -0,0 +1,48 @@
+import sys
+import json
+
+# Сравнение двух файлов результатов benchmarks.run:
+#   python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+
+METRICS = ("throughput_rps", "p50_ms", "p99_ms")
+
+
+def index_runs(report):
+    return {(r["size"], r["mode"], r["transport"]): r for r in report["runs"]}
+
+def change(old, new):
+    if not old:
+        return "   n/a"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Usage: python -m benchmarks.compare OLD.json NEW.json")
+        sys.exit(1)
+    with open(argv[0], "r", encoding="utf-8") as f:
+        old_report = json.load(f)
+    with open(argv[1], "r", encoding="utf-8") as f:
+        new_report = json.load(f)
+
+    print(f"{old_report.get('commit')} -> {new_report.get('commit')}")
+    old_runs = index_runs(old_report)
+    for key, new_run in index_runs(new_report).items():
+        old_run = old_runs.get(key)
+        if not old_run:
+            continue
+        size, mode, transport = key
+        print(f"\nsize={size} mode={mode} transport={transport}  "
+              f"peak_rss {change(old_run.get('peak_rss_bytes'), new_run.get('peak_rss_bytes') or 0)}  "
+              f"startup {change(old_run['startup_s'], new_run['startup_s'])}")
+        for name, new in new_run["scenarios"].items():
+            old = old_run["scenarios"].get(name)
+            if not old:
+                continue
+            cells = "  ".join(f"{metric} {old[metric]:>9} -> {new[metric]:>9} ({change(old[metric], new[metric])})"
+                              for metric in METRICS)
+            print(f"    {name:<14} {cells}")
+
+
+if __name__ == "__main__":
+    main()
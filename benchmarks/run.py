@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import platform
+import tempfile
+import traceback
+import subprocess
+from benchmarks.common import dataset_codes, prepare_app, own_peak_rss, process_peak_rss, git_commit
+from benchmarks.scenarios import SCENARIOS, build_requests, run_test_client, run_http
+
+# Нагрузочные прогоны /api/shorten, редиректов, /api/stats и /api/health.
+#
+#   python -m benchmarks.run                                  # 1k/100k/1M, file и redis, client и http
+#   python -m benchmarks.run --sizes 1000 --modes redis --transports http
+#   python -m benchmarks.compare benchmarks/results/a1b2c3d.json benchmarks/results/e4f5a6b.json
+#
+# Каждая комбинация (размер, режим, транспорт) идёт в отдельном процессе: модули
+# хранилища читают настройки при импорте, а пиковый RSS должен быть своим у каждого
+# прогона. Redis по умолчанию - fakeredis в памяти процесса (--redis real - сервер
+# из BANNED_FILES.config). Результат - JSON в benchmarks/results/<commit>.json.
+#
+#   pip install -r benchmarks/requirements.txt
+
+DEFAULT_SIZES = "1000,100000,1000000"
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SERVER_START_TIMEOUT = 1800
+
+# ---------------------------
+# WORKER
+# ---------------------------
+
+def run_scenarios(args, run):
+    codes = dataset_codes(args.size)
+    results = {}
+    for name in args.scenarios.split(","):
+        requests = build_requests(name, args.warmup + args.requests, codes)
+        print(f"[BENCH] {name}: {args.warmup} warmup + {args.requests} requests")
+        # Прогрев (первая загрузка индекса, соединения пула) в замер не входит
+        run(requests[:args.warmup])
+        results[name] = run(requests[args.warmup:])
+    return results
+
+def worker_client(args):
+    app, startup = prepare_app(args.size, args.mode, args.backend, args.redis, args.workdir)
+    scenarios = run_scenarios(args, lambda requests: run_test_client(app, requests, args.max_seconds))
+    return {"startup_s": round(startup, 4), "peak_rss_bytes": own_peak_rss(), "scenarios": scenarios}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def worker_http(args):
+    port = free_port()
+    ready_file = os.path.join(args.workdir, "ready.json")
+    log = open(os.path.join(args.workdir, "server.log"), "w", encoding="utf-8")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.server", "--size", str(args.size), "--mode", args.mode,
+         "--backend", args.backend, "--redis", args.redis, "--port", str(port), "--workdir", args.workdir],
+        stdout=log, stderr=subprocess.STDOUT
+    )
+    try:
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while not os.path.exists(ready_file):
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"Benchmark server did not start, see {log.name}")
+            time.sleep(0.1)
+        with open(ready_file, "r", encoding="utf-8") as f:
+            ready = json.load(f)
+
+        scenarios = run_scenarios(
+            args, lambda requests: run_http("127.0.0.1", port, requests, args.concurrency, args.max_seconds)
+        )
+        return {
+            "startup_s": ready["startup_s"],
+            "peak_rss_bytes": process_peak_rss(server.pid),
+            "concurrency": args.concurrency,
+            "scenarios": scenarios
+        }
+    finally:
+        server.terminate()
+        server.wait()
+        log.close()
+
+def run_worker(args):
+    try:
+        result = worker_http(args) if args.transport == "http" else worker_client(args)
+        result.update({"size": args.size, "mode": args.mode, "backend": args.backend, "transport": args.transport})
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+    except Exception:
+        traceback.print_exc()
+        sys.stdout.flush()
+        os._exit(1)
+    sys.stdout.flush()
+    # Фоновые потоки приложения (redis_bridge, мониторы) не должны задерживать выход
+    os._exit(0)
+
+# ---------------------------
+# ORCHESTRATOR
+# ---------------------------
+
+def run_one(args, size, mode, transport):
+    workdir = tempfile.mkdtemp(prefix="urlbench-")
+    result_file = os.path.join(workdir, "result.json")
+    command = [
+        sys.executable, "-m", "benchmarks.run", "--worker",
+        "--size", str(size), "--mode", mode, "--transport", transport, "--backend", args.backend,
+        "--redis", args.redis, "--requests", str(args.requests), "--warmup", str(args.warmup),
+        "--concurrency", str(args.concurrency), "--max-seconds", str(args.max_seconds), "--scenarios", args.scenarios,
+        "--workdir", workdir, "--result-file", result_file
+    ]
+    log_path = os.path.join(workdir, "worker.log")
+    try:
+        with open(log_path, "w", encoding="utf-8") as log:
+            code = subprocess.call(command, stdout=log, stderr=subprocess.STDOUT)
+        if code != 0 or not os.path.exists(result_file):
+            with open(log_path, "r", encoding="utf-8") as log:
+                tail = log.readlines()[-20:]
+            print(f"[BENCH ERROR] size={size} mode={mode} transport={transport} failed:\n" + "".join(tail))
+            return None
+        with open(result_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def print_run(result):
+    rss = result.get("peak_rss_bytes")
+    print(f"[BENCH] size={result['size']} mode={result['mode']} transport={result['transport']} "
+          f"startup={result['startup_s']}s peak_rss={rss // (1024 * 1024) if rss else '?'}MB")
+    for name, summary in result["scenarios"].items():
+        print(f"    {name:<14} {summary['throughput_rps']:>10} rps  p50={summary['p50_ms']}ms "
+              f"p99={summary['p99_ms']}ms  errors={summary['errors']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="URLMuhameda benchmarks")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="размеры набора данных через запятую")
+    parser.add_argument("--modes", default="file,redis", help="URL_STORAGE_MODE: file,redis")
+    parser.add_argument("--transports", default="client,http", help="client (Flask test client), http")
+    parser.add_argument("--backend", default="json", help="URL_STORAGE_BACKEND: json | log")
+    parser.add_argument("--redis", default="fake", help="fake (fakeredis) | real")
+    parser.add_argument("--requests", type=int, default=2000, help="запросов на сценарий")
+    parser.add_argument("--warmup", type=int, default=50, help="запросов прогрева на сценарий")
+    parser.add_argument("--concurrency", type=int, default=4, help="параллельных соединений (http)")
+    parser.add_argument("--max-seconds", type=float, default=30, help="предел времени на сценарий")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--out", help="файл результата (по умолчанию benchmarks/results/<commit>.json)")
+    parser.add_argument("--keep", action="store_true", help="не удалять рабочие каталоги")
+    # Внутренний режим: один прогон в отдельном процессе
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--transport", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "backend": args.backend, "redis": args.redis, "requests": args.requests, "warmup": args.warmup,
+            "concurrency": args.concurrency, "max_seconds": args.max_seconds
+        },
+        "runs": []
+    }
+    for size in (int(s) for s in args.sizes.split(",")):
+        for mode in args.modes.split(","):
+            for transport in args.transports.split(","):
+                print(f"[BENCH] Running size={size} mode={mode} transport={transport}...")
+                result = run_one(args, size, mode, transport)
+                if result:
+                    print_run(result)
+                    report["runs"].append(result)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import json
+import time
+import random
+import threading
+import http.client
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from benchmarks.common import BENCH_SEED, CODE_ALPHABET, CODE_LENGTH, summarize
+
+# ---------------------------
+# SCENARIOS
+# ---------------------------
+
+class BenchRequest(NamedTuple):
+    method: str
+    path: str
+    body: Optional[dict]
+    expected: Tuple[int, ...]
+
+
+def shorten(i: int, rng: random.Random, codes: List[str]) -> BenchRequest:
+    # Каждый запрос - новый URL, чтобы мерить запись, а не дедупликацию
+    return BenchRequest("POST", "/api/shorten", {"url": f"https://bench.example.com/new/{i}/{rng.random()}"}, (201,))
+
+def redirect_hit(i: int, rng: random.Random, codes: List[str]) -> BenchRequest:
+    return BenchRequest("GET", "/" + rng.choice(codes), None, (301, 302, 307, 308))
+
+def redirect_miss(i: int, rng: random.Random, codes: List[str]) -> BenchRequest:
+    # '-' не входит в алфавит кодов: такой код гарантированно отсутствует, но длина верная
+    code = "".join(rng.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH - 1)) + "-"
+    return BenchRequest("GET", "/" + code, None, (404,))
+
+def stats_page(i: int, rng: random.Random, codes: List[str]) -> BenchRequest:
+    return BenchRequest("GET", "/api/stats?limit=100", None, (200,))
+
+def stats_summary(i: int, rng: random.Random, codes: List[str]) -> BenchRequest:
+    return BenchRequest("GET", "/api/stats?summary=1", None, (200,))
+
+def health(i: int, rng: random.Random, codes: List[str]) -> BenchRequest:
+    return BenchRequest("GET", "/api/health", None, (200,))
+
+
+# Порядок важен: shorten меняет набор данных, поэтому идёт после чтений
+SCENARIOS: Dict[str, Callable[[int, random.Random, List[str]], BenchRequest]] = {
+    "redirect_hit": redirect_hit,
+    "redirect_miss": redirect_miss,
+    "stats_page": stats_page,
+    "stats_summary": stats_summary,
+    "health": health,
+    "shorten": shorten,
+}
+
+def build_requests(name: str, count: int, codes: List[str]) -> List[BenchRequest]:
+    """Заранее собранные запросы: генерация не попадает в замер"""
+    rng = random.Random(f"{BENCH_SEED}:{name}")
+    make = SCENARIOS[name]
+    return [make(i, rng, codes) for i in range(count)]
+
+# ---------------------------
+# DRIVERS
+# ---------------------------
+
+def run_test_client(app, requests: List[BenchRequest], max_seconds: float) -> Dict[str, float]:
+    """Прогон через Flask test client: только код приложения, без сети и WSGI-сервера"""
+    client = app.test_client()
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + max_seconds
+    started = time.perf_counter()
+    for req in requests:
+        t0 = time.perf_counter()
+        response = client.open(req.path, method=req.method, json=req.body)
+        latencies.append(time.perf_counter() - t0)
+        if response.status_code not in req.expected:
+            errors += 1
+        response.close()
+        if t0 > deadline:
+            break
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+def run_http(host: str, port: int, requests: List[BenchRequest], concurrency: int,
+             max_seconds: float) -> Dict[str, float]:
+    """Прогон по настоящему HTTP: concurrency потоков, у каждого своё keep-alive соединение"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    position = [0]
+    deadline = time.perf_counter() + max_seconds
+
+    def worker():
+        connection = http.client.HTTPConnection(host, port, timeout=30)
+        local_latencies, local_errors = [], 0
+        while True:
+            with lock:
+                index = position[0]
+                position[0] += 1
+            if index >= len(requests) or time.perf_counter() > deadline:
+                break
+            req = requests[index]
+            body = json.dumps(req.body) if req.body is not None else None
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            t0 = time.perf_counter()
+            try:
+                connection.request(req.method, req.path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=30)
+                status = None
+            local_latencies.append(time.perf_counter() - t0)
+            if status not in req.expected:
+                local_errors += 1
+        connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - started, errors[0])
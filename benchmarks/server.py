@@ -0,0 +1,48 @@
+import os
+import sys
+import json
+import argparse
+from werkzeug.serving import WSGIRequestHandler, make_server
+from benchmarks.common import prepare_app
+
+# Локальный HTTP-сервер для прогона по сети (его запускает benchmarks.run):
+#   python -m benchmarks.server --size 1000 --mode file --port 5055 --workdir /tmp/bench
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Keep-alive (HTTP/1.1) и без строки лога на каждый запрос - иначе замеряем
+    установку TCP-соединений и запись в stderr, а не приложение"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_request(self, code="-", size="-"):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="URLMuhameda benchmark server")
+    parser.add_argument("--size", type=int, required=True)
+    parser.add_argument("--mode", default="file")
+    parser.add_argument("--backend", default="json")
+    parser.add_argument("--redis", default="fake")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--workdir", required=True)
+    args = parser.parse_args(argv)
+
+    app, startup = prepare_app(args.size, args.mode, args.backend, args.redis, args.workdir)
+    server = make_server(args.host, args.port, app, threaded=True, request_handler=QuietRequestHandler)
+
+    # Клиент ждёт этот файл: сервер слушает порт и набор данных загружен
+    ready_file = os.path.join(args.workdir, "ready.json")
+    with open(ready_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"pid": os.getpid(), "startup_s": round(startup, 4)}, f)
+    os.replace(ready_file + ".tmp", ready_file)
+
+    print(f"[BENCH] Serving on {args.host}:{args.port}")
+    sys.stdout.flush()
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
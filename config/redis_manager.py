@@ -1,7 +1,13 @@
 import os
 import asyncio
+import hashlib
+import threading
+from bisect import bisect
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 from ashredis import RedisParams, RedisManager as BaseRedisManager
+from utils.metrics import instrument_redis
 
 load_dotenv()
 
@@ -14,24 +20,192 @@ REDIS_PARAMS = RedisParams(
 
 
 class RedisManager(BaseRedisManager):
-    def __init__(self):
-        super().__init__(redis_params=REDIS_PARAMS)
+    def __init__(self, redis_params: RedisParams = REDIS_PARAMS):
+        super().__init__(redis_params=redis_params)
         self._connected = False
 
+    @property
+    def name(self) -> str:
+        """Имя шарда на кольце: host:port/db (без пароля - попадает в логи)"""
+        params = self._redis_params
+        return f"{params.host}:{params.port}/{params.db}"
+
     async def init_connection(self):
         if not self._connected:
-            print(f"Connecting to Redis: {REDIS_PARAMS.host}:{REDIS_PARAMS.port}")
-            await self.connect()   # <<< ВАЖНО!
+            print(f"Connecting to Redis: {self._redis_params.host}:{self._redis_params.port}")
+            # ashredis открывает соединение (пул redis.asyncio) в __aenter__
+            await self.__aenter__()   # <<< ВАЖНО!
+            instrument_redis(self._redis)
             self._connected = True
             print("Redis connected successfully")
 
+    @property
+    def client(self):
+        """Низкоуровневый клиент redis.asyncio для команд, которых нет в ashredis"""
+        return self._redis
+
 
 # Глобальный инстанс RedisManager
 redis_manager = RedisManager()
 
+# ---------------------------
+# SHARDS
+# ---------------------------
+
+# Шарды данных: REDIS_SHARDS="redis://:pass@host1:6379/0,redis://host2:6379/0".
+# Не задано - один шард redis_manager, как без шардирования. Служебные ключи
+# (счётчики, версия набора) всегда на redis_manager.
+#
+# Добавление шарда без остановки:
+#   1. REDIS_SHARDS_PREVIOUS = старый список, REDIS_SHARDS = новый; перезапустить воркеры.
+#      Запись идёт на нового владельца, чтение при промахе - ещё и на прежнего.
+#   2. python -m protocol.rebalance run - перенос ключей к новым владельцам.
+#   3. Убрать REDIS_SHARDS_PREVIOUS и перезапустить воркеры.
+REDIS_SHARDS = os.environ.get("REDIS_SHARDS", "")
+REDIS_SHARDS_PREVIOUS = os.environ.get("REDIS_SHARDS_PREVIOUS", "")
+# Точек на кольце на шард: больше - ровнее распределение
+REDIS_SHARD_VNODES = int(os.environ.get("REDIS_SHARD_VNODES", 160))
+
+
+def parse_shard(url: str) -> RedisParams:
+    """redis://[:password@]host[:port][/db] -> RedisParams"""
+    parts = urlsplit(url if "://" in url else "redis://" + url)
+    db = parts.path.strip("/")
+    return RedisParams(
+        host=parts.hostname or "localhost",
+        port=parts.port or 6379,
+        password=parts.password or None,
+        db=int(db) if db else 0
+    )
+
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Консистентное хеширование: ключ принадлежит первой точке кольца после его хеша.
+
+    При добавлении шарда к нему переезжает ~1/N ключей, остальные остаются на месте.
+    """
+
+    def __init__(self, names: List[str], vnodes: int = REDIS_SHARD_VNODES):
+        points = sorted((ring_hash(f"{name}#{i}"), name) for name in names for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def node(self, key: str) -> str:
+        index = bisect(self._hashes, ring_hash(key))
+        return self._names[index % len(self._names)]
+
+
+class ShardedRedis:
+    """Маршрутизация ключей Redis по шардам.
+
+    for_key(код или другой ключ) - шард-владелец; previous_for_key - прежний владелец
+    на время переезда (None, если переезда нет или владелец тот же).
+    """
+
+    def __init__(self, primary: RedisManager, shards: str = REDIS_SHARDS, previous: str = REDIS_SHARDS_PREVIOUS):
+        self.primary = primary
+        self.managers: Dict[str, RedisManager] = {primary.name: primary}
+        self.ring = self._ring(shards) or HashRing([primary.name])
+        self.previous_ring = self._ring(previous)
+
+    def _ring(self, urls: str) -> Optional[HashRing]:
+        names = []
+        for url in filter(None, (item.strip() for item in urls.split(","))):
+            manager = RedisManager(parse_shard(url))
+            # Шард с теми же host/port/db, что и redis_manager, - это он и есть
+            manager = self.managers.setdefault(manager.name, manager)
+            names.append(manager.name)
+        return HashRing(names) if names else None
+
+    @property
+    def all(self) -> List[RedisManager]:
+        return list(self.managers.values())
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.managers) > 1
+
+    @property
+    def migrating(self) -> bool:
+        return self.previous_ring is not None
+
+    def for_key(self, key: str) -> RedisManager:
+        return self.managers[self.ring.node(key)]
+
+    def previous_for_key(self, key: str) -> Optional[RedisManager]:
+        if self.previous_ring is None:
+            return None
+        name = self.previous_ring.node(key)
+        return None if name == self.ring.node(key) else self.managers[name]
+
+    async def init_connection(self):
+        await asyncio.gather(*(manager.init_connection() for manager in self.all))
+
+    def reset(self):
+        """Соединения принадлежат loop, в котором открыты: после fork - заново"""
+        for manager in self.all:
+            manager._connected = False
+            manager._redis = None
+
+
+redis_shards = ShardedRedis(redis_manager)
+
+# ---------------------------
+# SYNC BRIDGE FOR FLASK
+# ---------------------------
+
+# Сколько секунд синхронный вызов ждёт ответа Redis
+REDIS_SYNC_TIMEOUT = float(os.environ.get("REDIS_SYNC_TIMEOUT", 5))
+
+
+class RedisLoopBridge:
+    """Один фоновый event loop на процесс, которому принадлежат пулы соединений шардов.
+
+    Flask-обработчики (синхронные) отправляют корутины в этот loop и ждут результат,
+    поэтому все потоки воркера делят один пул, а не создают свой loop на каждый вызов.
+    """
+
+    def __init__(self, shards: ShardedRedis):
+        self._shards = shards
+        self._loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        # После fork (gunicorn) поток с loop не наследуется - поднимаем новый
+        if self._loop is None or self._pid != os.getpid():
+            with self._lock:
+                if self._loop is None or self._pid != os.getpid():
+                    self._start()
+        return self._loop
+
+    def _start(self):
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True, name="redis-loop").start()
+        self._loop = loop
+        self._pid = os.getpid()
+        # Соединения из родительского процесса принадлежат чужому loop
+        self._shards.reset()
+
+    def submit(self, coro):
+        """Запускаем корутину в фоне, не дожидаясь результата"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float = REDIS_SYNC_TIMEOUT):
+        """Выполняем корутину синхронно (из потока Flask)"""
+        return self.submit(coro).result(timeout)
+
+    def connect(self):
+        self.run(self._shards.init_connection())
+
+
+redis_bridge = RedisLoopBridge(redis_shards)
+
 # helper для синхронного вызова в Flask
 def init_redis_sync():
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(redis_manager.init_connection())
-    loop.close()
+    redis_bridge.connect()
@@ -0,0 +1,166 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ---------------------------
+# FILE STORAGE
+# ---------------------------
+
+# Формат хранения на диске: "json" (исходный DATA_FILE) или "log" (append-only JSONL)
+STORAGE_BACKEND = os.environ.get("URL_STORAGE_BACKEND", "json")
+
+# Путь к append-only логу (по умолчанию рядом с DATA_FILE, с расширением .jsonl)
+LOG_FILE = os.environ.get("URL_LOG_FILE") or None
+
+# fsync после каждых N записей или не реже чем раз в N миллисекунд
+LOG_FSYNC_BATCH = int(os.environ.get("URL_LOG_FSYNC_BATCH", 64))
+LOG_FSYNC_INTERVAL_MS = int(os.environ.get("URL_LOG_FSYNC_INTERVAL_MS", 200))
+
+# Новые ссылки пишутся в файл фоновым потоком: накопленное - одной записью не чаще
+# раза в N мс (индекс и Redis обновляются сразу). Очередь - не больше N ссылок, дальше
+# запрос ждёт потока. URL_WRITE_BEHIND=0 - писать в файл прямо в запросе (режим file)
+WRITE_BEHIND_ENABLED = os.environ.get("URL_WRITE_BEHIND", "1") == "1"
+WRITE_BEHIND_INTERVAL_MS = int(os.environ.get("URL_WRITE_BEHIND_INTERVAL_MS", 100))
+WRITE_BEHIND_QUEUE_SIZE = int(os.environ.get("URL_WRITE_BEHIND_QUEUE_SIZE", 100000))
+
+# Компакция запускается, когда лог вырос в N раз с последней компакции (размер после неё
+# хранится рядом с логом, в .compacted, и общий для всех воркеров), но не раньше N байт
+LOG_COMPACT_RATIO = float(os.environ.get("URL_LOG_COMPACT_RATIO", 2.0))
+LOG_COMPACT_MIN_BYTES = int(os.environ.get("URL_LOG_COMPACT_MIN_BYTES", 1 << 20))
+
+# Бинарный снимок индекса для быстрого старта (protocol/snapshot.py), открывается через mmap.
+# По умолчанию рядом с DATA_FILE с расширением .snap; URL_SNAPSHOT_ENABLED=0 - не использовать
+SNAPSHOT_ENABLED = os.environ.get("URL_SNAPSHOT_ENABLED", "1") == "1"
+SNAPSHOT_FILE = os.environ.get("URL_SNAPSHOT_FILE") or None
+
+# ---------------------------
+# STORAGE MODE
+# ---------------------------
+
+# "file" - файл основной, Redis зеркало; "redis" - Redis основной, файл асинхронный бэкап
+STORAGE_MODE = os.environ.get("URL_STORAGE_MODE", "file")
+
+# ---------------------------
+# WORKERS
+# ---------------------------
+
+# Несколько процессов (gunicorn -c gunicorn.conf.py main:app): записи в файлы идут под flock,
+# а мониторы и синхронизацию с Redis ведёт один воркер на машине - владелец этого лок-файла
+# (по умолчанию рядом с DATA_FILE). Остальные раз в N секунд пробуют перехватить лок.
+LEADER_LOCK_FILE = os.environ.get("URL_LEADER_LOCK_FILE") or None
+LEADER_RETRY_INTERVAL = float(os.environ.get("URL_LEADER_RETRY_INTERVAL", 5))
+
+# ---------------------------
+# REDIS BULK WRITES
+# ---------------------------
+
+# save_many режет список на пачки: каждая - отдельный pipeline (MULTI/EXEC), чтобы
+# первичная загрузка миллионов ссылок не занимала Redis одной командой на секунды
+SAVE_CHUNK_SIZE = int(os.environ.get("URL_SAVE_CHUNK_SIZE", 1000))
+# Сколько пачек в полёте одновременно
+SAVE_CONCURRENCY = int(os.environ.get("URL_SAVE_CONCURRENCY", 4))
+# Попыток на пачку, пауза между ними растёт вдвое начиная с SAVE_RETRY_DELAY секунд
+SAVE_RETRIES = int(os.environ.get("URL_SAVE_RETRIES", 3))
+SAVE_RETRY_DELAY = float(os.environ.get("URL_SAVE_RETRY_DELAY", 0.5))
+# Печатать прогресс не чаще раза в N секунд
+SAVE_PROGRESS_INTERVAL = float(os.environ.get("URL_SAVE_PROGRESS_INTERVAL", 5))
+
+# ---------------------------
+# LINK EXPIRATION
+# ---------------------------
+
+# Истёкшие ссылки (expires_at) не открываются сразу, а удаляются фоновым проходом
+# лидера: раз в EXPIRY_SWEEP_INTERVAL секунд, не больше EXPIRY_SWEEP_BATCH за одну запись
+EXPIRY_SWEEP_INTERVAL = float(os.environ.get("URL_EXPIRY_SWEEP_INTERVAL", 5))
+EXPIRY_SWEEP_BATCH = int(os.environ.get("URL_EXPIRY_SWEEP_BATCH", 1000))
+
+# ---------------------------
+# SHORT CODE ALLOCATION
+# ---------------------------
+
+# Префикс коротких ссылок: short_id = SHORT_URL_BASE + код
+SHORT_URL_BASE = os.environ.get("URL_SHORT_URL_BASE", "https://url.muhamedlabs.pro/")
+
+# counter | permutation | block | random (см. utils.helpers.CodeAllocator)
+CODE_ALLOCATOR = os.environ.get("URL_CODE_ALLOCATOR", "permutation")
+CODE_BLOCK_SIZE = int(os.environ.get("URL_CODE_BLOCK_SIZE", 1000))
+# Ключ перестановки: смена ключа на живых данных может дать коллизию с уже выданными кодами
+CODE_PERMUTATION_KEY = os.environ.get("URL_CODE_PERMUTATION_KEY", "muhamedlabs")
+# Локальный счётчик для режима file (по умолчанию рядом с DATA_FILE)
+CODE_COUNTER_FILE = os.environ.get("URL_CODE_COUNTER_FILE") or None
+
+# Максимум URL в одном запросе /api/shorten/batch
+BATCH_MAX_URLS = int(os.environ.get("URL_BATCH_MAX_URLS", 10000))
+
+# Размер страницы /api/stats по умолчанию и максимальный
+STATS_PAGE_SIZE = int(os.environ.get("URL_STATS_PAGE_SIZE", 100))
+STATS_MAX_PAGE_SIZE = int(os.environ.get("URL_STATS_MAX_PAGE_SIZE", 1000))
+
+# Сколько секунд readiness-проба ждёт PING от Redis
+READINESS_TIMEOUT = float(os.environ.get("URL_READINESS_TIMEOUT", 1))
+
+# ---------------------------
+# CHANGE FEED
+# ---------------------------
+
+# Лента изменений (urls_stream на каждом шарде): XREAD BLOCK на N мс и до N событий за раз.
+# В режиме file ленту читает только лидер на машине и переносит изменения в файл; остальные
+# воркеры узнают о них, когда индекс проверит файл (раз в INDEX_CHECK_INTERVAL = 1 с), т.е.
+# чужая ссылка видна воркеру-не-лидеру с задержкой до ~1 с после записи в файл
+CHANGE_FEED_BLOCK_MS = int(os.environ.get("URL_CHANGE_FEED_BLOCK_MS", 5000))
+CHANGE_FEED_BATCH = int(os.environ.get("URL_CHANGE_FEED_BATCH", 1000))
+# Пауза перед повторным чтением после ошибки (Redis недоступен)
+CHANGE_FEED_RETRY_INTERVAL = float(os.environ.get("URL_CHANGE_FEED_RETRY_INTERVAL", 1))
+# Лидер раз в N секунд подрезает ленту примерно до CHANGE_FEED_MAXLEN последних событий
+CHANGE_FEED_MAXLEN = int(os.environ.get("URL_CHANGE_FEED_MAXLEN", 1000000))
+CHANGE_FEED_TRIM_INTERVAL = float(os.environ.get("URL_CHANGE_FEED_TRIM_INTERVAL", 60))
+# Монитор файла (изменения файла -> Redis) проверяет mtime/размер раз в N секунд
+FILE_MONITOR_INTERVAL = float(os.environ.get("URL_FILE_MONITOR_INTERVAL", 1))
+# Страховочная сверка версии набора в Redis, если событие ленты потерялось
+REDIS_MONITOR_FALLBACK_INTERVAL = float(os.environ.get("URL_REDIS_MONITOR_FALLBACK_INTERVAL", 60))
+
+# ---------------------------
+# CODE FILTER
+# ---------------------------
+
+# Фильтр Блума по существующим кодам (режим redis): промахи сканеров отсекаются в памяти
+CODE_FILTER_ENABLED = os.environ.get("URL_CODE_FILTER_ENABLED", "1") == "1"
+# На сколько кодов рассчитан фильтр (при сборке - не меньше 2x текущего числа ссылок)
+# и доля ложных "возможно есть"; 1 млн кодов при 1% - ~1.2 МБ
+CODE_FILTER_CAPACITY = int(os.environ.get("URL_CODE_FILTER_CAPACITY", 1000000))
+CODE_FILTER_ERROR_RATE = float(os.environ.get("URL_CODE_FILTER_ERROR_RATE", 0.01))
+# Коды, созданные другими процессами, фильтр получает из ленты изменений (CHANGE FEED)
+# Кеш промахов для кодов, прошедших фильтр: секунд жизни (0 - выключен) и размер
+NEGATIVE_CACHE_TTL = float(os.environ.get("URL_NEGATIVE_CACHE_TTL", 5))
+NEGATIVE_CACHE_SIZE = int(os.environ.get("URL_NEGATIVE_CACHE_SIZE", 100000))
+
+# ---------------------------
+# CLICK ANALYTICS
+# ---------------------------
+
+# "redis" - HINCRBY в хеши clicks:<code>; "file" - JSON-файл счётчиков
+ANALYTICS_BACKEND = os.environ.get("URL_ANALYTICS_BACKEND", "redis")
+ANALYTICS_FILE = os.environ.get("URL_ANALYTICS_FILE") or None
+# Сброс буфера кликов каждые N мс или при накоплении N событий. Буфер держит
+# до 20 * URL_ANALYTICS_FLUSH_EVENTS событий, лишние вытесняются (urlmuhameda_clicks_dropped_total)
+ANALYTICS_FLUSH_INTERVAL_MS = int(os.environ.get("URL_ANALYTICS_FLUSH_INTERVAL_MS", 1000))
+ANALYTICS_FLUSH_EVENTS = int(os.environ.get("URL_ANALYTICS_FLUSH_EVENTS", 5000))
+
+# ---------------------------
+# REDIRECTS
+# ---------------------------
+
+# Код редиректа по умолчанию (у ссылки может быть свой, поле redirect):
+# 301/308 - постоянная ссылка, кешируется браузером и CDN; 302/307 - изменяемая
+REDIRECT_STATUS = int(os.environ.get("URL_REDIRECT_STATUS", 302))
+# max-age постоянных редиректов; для изменяемых 0 = no-cache (кеш перепроверяет по ETag)
+REDIRECT_PERMANENT_MAX_AGE = int(os.environ.get("URL_REDIRECT_PERMANENT_MAX_AGE", 86400))
+REDIRECT_TEMPORARY_MAX_AGE = int(os.environ.get("URL_REDIRECT_TEMPORARY_MAX_AGE", 0))
+
+# Очистка кеша CDN: POST {"files": [short_url, ...]} (формат Cloudflare) с Bearer-токеном
+CDN_PURGE_URL = os.environ.get("URL_CDN_PURGE_URL") or None
+CDN_PURGE_TOKEN = os.environ.get("URL_CDN_PURGE_TOKEN") or None
+
+# Bearer-токен служебных эндпоинтов (/api/links/<code>/purge); не задан - эндпоинты выключены
+ADMIN_TOKEN = os.environ.get("URL_ADMIN_TOKEN") or None
@@ -0,0 +1,18 @@
+import os
+
+# Несколько воркеров на всех ядрах:
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# Каждый воркер после fork поднимает свой loop redis_bridge и пул соединений (init_sync).
+# Записи в файлы защищены flock, мониторы и синхронизацию с Redis ведёт один воркер
+# на машине (URL_LEADER_LOCK_FILE), поэтому приложение нельзя загружать в мастере (preload_app).
+
+bind = os.environ.get("URL_BIND", "0.0.0.0:5001")
+workers = int(os.environ.get("URL_WORKERS", os.cpu_count() or 1))
+threads = int(os.environ.get("URL_THREADS", 4))
+preload_app = False
+
+
+def post_worker_init(worker):
+    from main import init_sync
+    init_sync()
@@ -1,86 +1,52 @@
-import asyncio
 import os
-import threading
-from flask import Flask, send_from_directory
+from flask import Flask
 from routes.api import api_bp
 from routes.views import views_bp
-from protocol.url_storage import initialize_system, load_file_to_redis
+from protocol.url_storage import initialize_system, lead_background_sync, maintain_code_filter, host_leader
 from BANNED_FILES.config import redis_manager
+from config.redis_manager import redis_bridge
+from protocol.analytics import click_aggregator
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-app = Flask(__name__, template_folder=BASE_DIR, static_folder=BASE_DIR)
+# Статика отдаётся только через /static/ (routes/views.py), см. utils/static_assets.py
+app = Flask(__name__, template_folder=BASE_DIR, static_folder=None)
 
 app.register_blueprint(api_bp)
 app.register_blueprint(views_bp)
 
 
-@app.route("/")
-def home():
-    return send_from_directory(BASE_DIR, "home.html")
-
-
-@app.route("/<path:filename>")
-def static_files(filename):
-    return send_from_directory(BASE_DIR, filename)
-
-
-async def periodic_sync():
-    """Каждые 30 минут загружает данные из файла в Redis"""
-    while True:
-        try:
-            print("[SYNC] Scheduled file -> Redis started")
-            await load_file_to_redis()
-            print("[SYNC] Scheduled file -> Redis completed")
-        except Exception as e:
-            print(f"[SYNC-ERROR] {e}")
-
-        await asyncio.sleep(1800)  # 30 минут
-
-
 def init_sync():
-    """Синхронная инициализация асинхронных компонентов"""
-    try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    """Синхронная инициализация асинхронных компонентов.
 
-        loop.run_until_complete(redis_manager.init_connection())
+    Всё асинхронное выполняется в едином loop redis_bridge, которому принадлежит
+    пул соединений Redis - тот же, через который работают Flask-обработчики.
+    Под gunicorn вызывается в каждом воркере (см. gunicorn.conf.py); файл в Redis
+    заливает только лидер на машине.
+    """
+    try:
+        redis_bridge.connect()
         print("[REDIS] Redis is ready")
 
         if not hasattr(redis_manager, "_redis") or redis_manager._redis is None:
             raise RuntimeError("Redis connection failed - _redis is None")
 
-        loop.run_until_complete(load_file_to_redis())
-        print("[SYNC] File -> Redis done")
+        leader = host_leader.try_acquire()
+        redis_bridge.run(initialize_system(leader), timeout=None)
+        print("[SYNC] File -> Redis done" if leader else "[SYNC] File -> Redis is loaded by the leader worker")
 
         start_background_monitoring()
 
     except Exception as e:
         print(f"Initialization failed: {e}")
         raise
-    finally:
-        loop.close()
 
 def start_background_monitoring():
-    """Запускаем мониторинг и периодическую синхронизацию в фоновом потоке"""
-
-    def run_monitoring():
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-            loop.run_until_complete(initialize_system())
-
-            loop.create_task(periodic_sync())
-            print("[SYNC] Periodic file sync every 30 minutes started")
-
-            loop.run_forever()
-
-        except Exception as e:
-            print(f"Background monitoring error: {e}")
-
-    threading.Thread(target=run_monitoring, daemon=True).start()
-    print("[MONITOR] Background monitoring started")
+    """Запускаем в фоновом loop redis_bridge сброс кликов и фильтр кодов (в каждом воркере)
+    и мониторы по ленте изменений (в одном воркере на машине)"""
+    redis_bridge.submit(click_aggregator.run())
+    redis_bridge.submit(maintain_code_filter())
+    redis_bridge.submit(lead_background_sync())
 
 
 def run_flask():
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque, defaultdict
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+from BANNED_FILES.config import DATA_FILE
+from config.redis_manager import redis_shards
+from config.settings import (
+    ANALYTICS_BACKEND, ANALYTICS_FILE, ANALYTICS_FLUSH_INTERVAL_MS, ANALYTICS_FLUSH_EVENTS
+)
+from utils.process_lock import FileLock
+from utils.metrics import CLICKS_DROPPED
+from protocol.sharding import pipeline_by_key
+
+# Хеш счётчиков одной ссылки: total, day:YYYY-MM-DD, ref:<host>
+REDIS_CLICKS_PREFIX = "clicks"
+
+# ---------------------------
+# CLICK AGGREGATION
+# ---------------------------
+
+class ClickAggregator:
+    """Буфер кликов с отложенной записью.
+
+    Редирект только дописывает событие в deque (append атомарен, блокировок нет).
+    Фоновый flusher раз в flush_interval_ms или при накоплении flush_events
+    событий сворачивает их в дельты и сливает в Redis одним pipeline HINCRBY
+    (или в файл счётчиков). Редирект никогда не ждёт записи аналитики.
+    """
+
+    def __init__(self, backend: str = ANALYTICS_BACKEND,
+                 flush_interval_ms: int = ANALYTICS_FLUSH_INTERVAL_MS,
+                 flush_events: int = ANALYTICS_FLUSH_EVENTS,
+                 path: str = None):
+        self._backend = backend
+        self._interval = flush_interval_ms / 1000
+        self._flush_events = flush_events
+        self._path = path or ANALYTICS_FILE or os.path.splitext(DATA_FILE)[0] + ".clicks.json"
+        # Буфер ограничен всегда: если сброс не успевает (или flusher не запущен),
+        # старые события вытесняются - их число видно в CLICKS_DROPPED
+        self._events = deque(maxlen=flush_events * 20)
+        # Дельты, не записанные из-за ошибки; уйдут со следующим сбросом
+        self._failed: Dict[str, Dict[str, int]] = {}
+        self._loop = None
+        self._wake = None
+        self._wake_pending = False
+        self._running = False
+        self._file_counters: Optional[Dict[str, Dict[str, int]]] = None
+        self._file_info = None
+        # Файл счётчиков общий для всех воркеров: слияние - под локом и по свежему файлу
+        self._file_lock = FileLock(self._path + ".lock", "clicks")
+
+    # --- горячий путь ---
+
+    def record(self, code: str, referrer: Optional[str] = None):
+        if len(self._events) == self._events.maxlen:
+            CLICKS_DROPPED.inc()
+        self._events.append((code, referrer, time.time()))
+        if len(self._events) >= self._flush_events and not self._wake_pending and self._loop:
+            self._wake_pending = True
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # --- фоновая запись ---
+
+    async def run(self):
+        """Цикл flusher; запускается в фоновом loop (redis_bridge или ASGI-сервера)"""
+        if self._running:
+            return
+        self._running = True
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        print(f"[ANALYTICS] Flusher started ({self._backend}, {int(self._interval * 1000)}ms)")
+
+        while self._running:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            self._wake_pending = False
+            await self.flush()
+
+    def stop(self):
+        self._running = False
+
+    def _drain(self) -> Dict[str, Dict[str, int]]:
+        """Забираем накопленные события и сворачиваем в дельты по ссылкам"""
+        deltas: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        failed, self._failed = self._failed, {}
+        for code, fields in failed.items():
+            for field, value in fields.items():
+                deltas[code][field] += value
+        while True:
+            try:
+                code, referrer, ts = self._events.popleft()
+            except IndexError:
+                return deltas
+            fields = deltas[code]
+            fields["total"] += 1
+            fields["day:" + time.strftime("%Y-%m-%d", time.gmtime(ts))] += 1
+            fields["ref:" + referrer_host(referrer)] += 1
+
+    async def flush(self) -> int:
+        deltas = self._drain()
+        if not deltas:
+            return 0
+        if self._backend == "redis":
+            return await self._flush_to_redis(deltas)
+        try:
+            await asyncio.to_thread(self._merge_into_file, deltas)
+        except Exception as e:
+            # Клики не теряем: вернём их в буфер до следующей попытки
+            print(f"[ANALYTICS ERROR] Flush failed: {e}")
+            self._failed = deltas
+            return 0
+        return sum(fields["total"] for fields in deltas.values())
+
+    async def _flush_to_redis(self, deltas: Dict[str, Dict[str, int]]) -> int:
+        """Счётчики лежат на шарде ссылки: по pipeline (MULTI/EXEC) на шард.
+        В буфер возвращаются только коды шардов, где pipeline не прошёл: уже
+        применённые на других шардах приращения повторно не посчитаются"""
+        codes = list(deltas)
+
+        def increment(pipeline, i):
+            for field, value in deltas[codes[i]].items():
+                pipeline.hincrby(f"{REDIS_CLICKS_PREFIX}:{codes[i]}", field, value)
+
+        try:
+            results = await pipeline_by_key(codes, increment, return_exceptions=True)
+        except Exception as e:
+            print(f"[ANALYTICS ERROR] Flush failed: {e}")
+            self._failed = deltas
+            return 0
+        failed = {code: deltas[code] for code, result in zip(codes, results) if isinstance(result, Exception)}
+        if failed:
+            errors = {str(result) for result in results if isinstance(result, Exception)}
+            print(f"[ANALYTICS ERROR] Flush failed for {len(failed)} links: {'; '.join(errors)}")
+            self._failed = failed
+        return sum(fields["total"] for code, fields in deltas.items() if code not in failed)
+
+    # --- файл счётчиков ---
+
+    def _stat_file(self):
+        try:
+            stat = os.stat(self._path)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _load_file_counters(self) -> Dict[str, Dict[str, int]]:
+        """Счётчики из файла; перечитываем, только если его переписал этот или другой процесс"""
+        file_info = self._stat_file()
+        if self._file_counters is None or file_info != self._file_info:
+            try:
+                with open(self._path, "r", encoding="utf-8") as f:
+                    self._file_counters = json.load(f)
+            except (OSError, ValueError):
+                self._file_counters = {}
+            self._file_info = file_info
+        return self._file_counters
+
+    def _merge_into_file(self, deltas: Dict[str, Dict[str, int]]):
+        with self._file_lock:
+            counters = self._load_file_counters()
+            for code, fields in deltas.items():
+                stored = counters.setdefault(code, {})
+                for field, value in fields.items():
+                    stored[field] = stored.get(field, 0) + value
+
+            tmp_path = f"{self._path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(counters, f, ensure_ascii=False)
+                os.replace(tmp_path, self._path)
+            except Exception:
+                # Дельты уже в кеше, но не в файле: при повторе перечитаем файл
+                self._file_counters = None
+                raise
+            self._file_info = self._stat_file()
+
+    # --- чтение ---
+
+    async def get_clicks(self, code: str) -> Dict[str, Any]:
+        if self._backend == "redis":
+            key = f"{REDIS_CLICKS_PREFIX}:{code}"
+            raw = await redis_shards.for_key(code).client.hgetall(key)
+            previous = redis_shards.previous_for_key(code)
+            if previous is not None:
+                # До переноса часть кликов ещё у прежнего владельца
+                for field, value in (await previous.client.hgetall(key)).items():
+                    raw[field] = int(raw.get(field, 0)) + int(value)
+        else:
+            # Файл читается в пуле потоков: loop (redis_bridge или сервера) общий для всех запросов
+            raw = await asyncio.to_thread(self._read_file_clicks, code)
+        return format_clicks(raw)
+
+    def _read_file_clicks(self, code: str) -> Dict[str, int]:
+        # Под локом: кеш счётчиков меняет и _merge_into_file в другом потоке
+        with self._file_lock:
+            return dict(self._load_file_counters().get(code, {}))
+
+
+def referrer_host(referrer: Optional[str]) -> str:
+    """Храним только хост: число полей хеша остаётся ограниченным"""
+    if not referrer:
+        return "direct"
+    return (urlsplit(referrer).hostname or "direct").lower()
+
+def format_clicks(raw: Dict[str, Any]) -> Dict[str, Any]:
+    days, referrers = {}, {}
+    for field, value in raw.items():
+        if field.startswith("day:"):
+            days[field[4:]] = int(value)
+        elif field.startswith("ref:"):
+            referrers[field[4:]] = int(value)
+    return {
+        "total_clicks": int(raw.get("total", 0)),
+        "days": dict(sorted(days.items())),
+        "referrers": dict(sorted(referrers.items(), key=lambda item: -item[1]))
+    }
+
+
+# Глобальный агрегатор кликов
+click_aggregator = ClickAggregator()
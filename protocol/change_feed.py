@@ -0,0 +1,137 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from config.redis_manager import redis_shards, RedisManager
+from protocol.sharding import gather_shards
+from config.settings import CHANGE_FEED_BLOCK_MS, CHANGE_FEED_BATCH, CHANGE_FEED_RETRY_INTERVAL
+
+# Лента изменений ссылок - urls_stream каждого шарда. Событие пишется на любое изменение:
+# save/update - ashredis при сохранении хеша, update/delete/expire - url_storage.
+# Процесс читает ленту блокирующим XREAD со своей позиции и узнаёт о чужой записи
+# через миллисекунды, без опроса. Consumer group здесь не подходит: событие нужно
+# каждому процессу, а не одному из группы.
+
+# (событие, код ссылки)
+Change = Tuple[str, str]
+# changes = None - часть ленты подрезана раньше, чем её прочитали: перечитать всё
+Handler = Callable[[Optional[List[Change]]], Awaitable[None]]
+
+def stream_id(value: str) -> Tuple[int, int]:
+    milliseconds, _, sequence = value.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+def parse_changes(entries) -> List[Change]:
+    changes = []
+    for _, data in entries:
+        code = data.get("hash_key", "").split(":", 1)[-1]
+        if code:
+            changes.append((data.get("event", "save"), code))
+    return changes
+
+# ---------------------------
+# CHANGE FEED
+# ---------------------------
+
+class ChangeFeed:
+    """Чтение ленты всех шардов (по XREAD BLOCK на шард) и рассылка подписчикам.
+
+    Подписчик - корутина handler(changes), вызывается последовательно в порядке
+    ленты шарда. Чтение запускает первый start() в loop процесса.
+    """
+
+    def __init__(self, stream: str, block_ms: int = CHANGE_FEED_BLOCK_MS, batch: int = CHANGE_FEED_BATCH):
+        self.stream = stream
+        self.block_ms = block_ms
+        self.batch = batch
+        self.position: Dict[str, str] = {}
+        self._handlers: List[Handler] = []
+        self._task: Optional[asyncio.Task] = None
+        # Шарды, чья лента прочитана до конца и разослана подписчикам
+        self._caught_up: Set[str] = set()
+
+    def subscribe(self, handler: Handler):
+        self._handlers.append(handler)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def live(self) -> bool:
+        """Подписчики получили все события всех шардов: нет отставания, ошибки чтения
+        или пересборки - состояние, собранное по ленте, можно считать текущим"""
+        return self.running and len(self._caught_up) >= len(redis_shards.all)
+
+    def start(self, position: Optional[Dict[str, str]] = None):
+        """Читаем после position (шард -> id); по умолчанию - только новые события"""
+        if self.running:
+            return
+        if position is not None:
+            self.position = dict(position)
+        self._task = asyncio.ensure_future(self._run(position is not None))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._caught_up.clear()
+
+    async def _run(self, positioned: bool):
+        if not positioned:
+            self.position = await self._last_ids()
+        print(f"[CHANGE FEED] Following {self.stream} on {len(redis_shards.all)} shard(s)")
+        await gather_shards(self._follow)
+
+    async def _last_ids(self) -> Dict[str, str]:
+        async def last_id(manager: RedisManager):
+            entries = await manager.client.xrevrange(self.stream, count=1)
+            return manager.name, entries[0][0] if entries else "0-0"
+
+        return dict(await gather_shards(last_id))
+
+    async def _follow(self, manager: RedisManager):
+        check_gap = True
+        while True:
+            try:
+                last_id = self.position.get(manager.name, "0-0")
+                if check_gap and await self._trimmed_after(manager, last_id):
+                    print(f"[CHANGE FEED] {manager.name}: stream trimmed past {last_id}, full reload")
+                    self._caught_up.discard(manager.name)
+                    await self._dispatch(None)
+                check_gap = False
+                # Пока не дочитали до конца, не ждём новых событий: пустой ответ без BLOCK
+                # сразу говорит, что лента прочитана
+                block = self.block_ms if manager.name in self._caught_up else None
+                response = await manager.client.xread({self.stream: last_id}, count=self.batch, block=block)
+                if not response:
+                    self._caught_up.add(manager.name)
+                    continue
+                self._caught_up.discard(manager.name)
+                entries = response[0][1]
+                self.position[manager.name] = entries[-1][0]
+                # Полная пачка - отстаём от ленты, и её начало могли подрезать
+                check_gap = len(entries) >= self.batch
+                await self._dispatch(parse_changes(entries))
+                if not check_gap:
+                    self._caught_up.add(manager.name)
+            except asyncio.CancelledError:
+                self._caught_up.discard(manager.name)
+                raise
+            except Exception as e:
+                print(f"[CHANGE FEED ERROR] {manager.name}: {e}")
+                self._caught_up.discard(manager.name)
+                check_gap = True
+                await asyncio.sleep(CHANGE_FEED_RETRY_INTERVAL)
+
+    async def _trimmed_after(self, manager: RedisManager, last_id: str) -> bool:
+        """Лента начинается позже last_id: события между ними подрезаны непрочитанными"""
+        if last_id == "0-0":
+            return False
+        first = await manager.client.xrange(self.stream, "-", "+", count=1)
+        return bool(first) and stream_id(first[0][0]) > stream_id(last_id)
+
+    async def _dispatch(self, changes: Optional[List[Change]]):
+        for handler in list(self._handlers):
+            try:
+                await handler(changes)
+            except Exception as e:
+                print(f"[CHANGE FEED ERROR] Handler {getattr(handler, '__name__', handler)}: {e}")
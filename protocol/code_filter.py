@@ -0,0 +1,178 @@
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+from config.settings import (
+    CODE_FILTER_ENABLED, CODE_FILTER_CAPACITY, CODE_FILTER_ERROR_RATE,
+    NEGATIVE_CACHE_TTL, NEGATIVE_CACHE_SIZE
+)
+from utils.metrics import CODE_FILTER_REJECTS
+
+# Большая часть промахов редиректа - сканеры, перебирающие случайные 7-символьные пути.
+# Фильтр Блума по всем существующим кодам отвечает "точно нет" без похода в хранилище;
+# "возможно есть" (включая ложные срабатывания и удалённые коды) проверяет хранилище,
+# а повторные промахи по таким кодам ненадолго запоминает NegativeCache.
+
+# ---------------------------
+# BLOOM FILTER
+# ---------------------------
+
+class BloomFilter:
+    """Битовый массив m бит и k хешей (двойное хеширование по blake2b).
+
+    Писатели - под локом; читатели без блокировок: бит только выставляется,
+    поэтому читатель в худшем случае не увидит код, добавленный в этот момент.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = CODE_FILTER_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self._size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self._hashes = max(round(self._size / capacity * math.log(2)), 1)
+        self._bits = bytearray((self._size + 7) // 8)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def _positions(self, code: str):
+        digest = hashlib.blake2b(code.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self._size
+        return [(h1 + i * h2) % size for i in range(self._hashes)]
+
+    def add(self, code: str):
+        positions = self._positions(code)
+        bits = self._bits
+        added = False
+        with self._lock:
+            for position in positions:
+                mask = 1 << (position & 7)
+                if not bits[position >> 3] & mask:
+                    bits[position >> 3] |= mask
+                    added = True
+            # Повторное добавление кода (своя запись, затем её событие в stream) не считаем
+            if added:
+                self.count += 1
+
+    def __contains__(self, code: str) -> bool:
+        bits = self._bits
+        for position in self._positions(code):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+# ---------------------------
+# NEGATIVE CACHE
+# ---------------------------
+
+class NegativeCache:
+    """Коды, которых не оказалось в хранилище: code -> время истечения.
+
+    Не больше max_size записей (вытесняются самые старые); ttl <= 0 - выключен.
+    """
+
+    def __init__(self, ttl: float = NEGATIVE_CACHE_TTL, max_size: int = NEGATIVE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._expires = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, code: str):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._expires[code] = time.monotonic() + self.ttl
+            self._expires.move_to_end(code)
+            while len(self._expires) > self.max_size:
+                self._expires.popitem(last=False)
+
+    def discard(self, code: str):
+        if self._expires:
+            with self._lock:
+                self._expires.pop(code, None)
+
+    def __contains__(self, code: str) -> bool:
+        expires = self._expires.get(code)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            self.discard(code)
+            return False
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._expires.clear()
+
+# ---------------------------
+# CODE FILTER
+# ---------------------------
+
+class CodeFilter:
+    """Фильтр Блума и кеш промахов перед поиском по коду.
+
+    Пока фильтр не построен (или выключен), rejects() ничего не отсекает.
+    """
+
+    def __init__(self, enabled: bool = CODE_FILTER_ENABLED, capacity: int = CODE_FILTER_CAPACITY):
+        self.enabled = enabled
+        self.capacity = capacity
+        self._bloom: Optional[BloomFilter] = None
+        self.misses = NegativeCache()
+
+    @property
+    def ready(self) -> bool:
+        return self._bloom is not None
+
+    @property
+    def needs_rebuild(self) -> bool:
+        """Кодов больше, чем рассчитан фильтр: ложных срабатываний уже заметно больше"""
+        bloom = self._bloom
+        return bloom is not None and bloom.count > bloom.capacity
+
+    def new_filter(self, count: int = 0) -> BloomFilter:
+        """Пустой фильтр для пересборки: заполняется в стороне, затем install()"""
+        return BloomFilter(max(self.capacity, 2 * count))
+
+    def install(self, bloom: BloomFilter):
+        """Подменяем фильтр одним присваиванием"""
+        self._bloom = bloom
+        self.misses.clear()
+        print(f"[CODE FILTER] Built for {bloom.count} codes ({bloom.nbytes // 1024} KB)")
+
+    def rebuild(self, codes: Iterable[str], count: int = 0):
+        bloom = self.new_filter(count)
+        for code in codes:
+            bloom.add(code)
+        self.install(bloom)
+
+    def add(self, code: str):
+        bloom = self._bloom
+        if bloom is not None:
+            bloom.add(code)
+        self.misses.discard(code)
+
+    def rejects(self, code: str) -> bool:
+        """True - кода точно нет (или он только что не нашёлся), хранилище можно не спрашивать"""
+        bloom = self._bloom
+        if bloom is not None and code not in bloom:
+            CODE_FILTER_REJECTS.inc("bloom")
+            return True
+        if code in self.misses:
+            CODE_FILTER_REJECTS.inc("negative_cache")
+            return True
+        return False
+
+    def remember_miss(self, code: str):
+        if self.enabled:
+            self.misses.add(code)
+
+
+# Глобальный фильтр кодов
+code_filter = CodeFilter()
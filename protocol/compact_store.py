@@ -0,0 +1,373 @@
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Any
+from redis_storage.url import Url
+from config.settings import SHORT_URL_BASE
+from utils.helpers import normalize_url, CODE_LENGTH
+
+# Ячейки хеш-таблиц: >= 0 - номер слота, EMPTY - свободно, TOMBSTONE - удалённая запись
+EMPTY = -1
+TOMBSTONE = -2
+
+# Положение URL слота в буфере - одно число: offset << SPAN_BITS | length.
+# Одна ячейка array меняется атомарно, поэтому читатель не увидит смещение без длины.
+SPAN_BITS = 24
+SPAN_MASK = (1 << SPAN_BITS) - 1
+DELETED = (1 << 64) - 1
+
+# Заполненность хеш-таблиц, после которой они перестраиваются (до заполненности <= 1/2)
+MAX_LOAD = 0.66
+
+# Мусор в буфере URL (после обновлений и удалений), после которого он переписывается
+BLOB_COMPACT_MIN = 1 << 20
+
+def short_id(code: str) -> str:
+    """Полная короткая ссылка - не хранится, собирается по коду"""
+    return SHORT_URL_BASE + code
+
+# ---------------------------
+# COMPACT URL STORE
+# ---------------------------
+
+class CompactUrlStore:
+    """Колоночное хранилище code -> original_url без объекта на запись.
+
+    Слот i - это 7 байт кода в _codes[i*7:(i+1)*7] и URL (UTF-8) в общем буфере,
+    положение которого записано в _spans[i]. Поиск по коду - открытая
+    адресация в array('q') со слотами; обратный индекс normalize_url(url) -> код
+    (для дедупликации) - такая же таблица с хешами нормализованных URL.
+    short_id не хранится, собирается по коду (см. short_id()).
+
+    ~100 байт на ссылку с URL в 60 символов против ~400 у словарей строк
+    и ~1 КБ у списка Url. Коды нестандартной длины (старые данные) лежат
+    в обычном словаре _odd.
+
+    Писатель должен быть один (UrlIndex держит свой лок). Читатели работают
+    без блокировок: слот заполняется раньше, чем попадает в таблицу, а
+    перестроенные массивы (таблицы, пара буфер + spans) подменяются одним присваиванием.
+    """
+
+    def __init__(self, index_originals: bool = True):
+        self._index_originals = index_originals
+        self._reset()
+
+    def _reset(self):
+        self._codes = bytearray()
+        self._columns = (bytearray(), array("Q"))  # (буфер URL, spans)
+        self._table = array("q", [EMPTY]) * 1024
+        self._table_used = 0  # занятые ячейки, включая TOMBSTONE
+        self._originals = array("q", [EMPTY]) * 1024 if self._index_originals else None
+        self._original_hashes = array("q", [0]) * 1024 if self._index_originals else None
+        self._originals_used = 0
+        self._odd: Dict[str, str] = {}
+        self._odd_originals: Dict[str, str] = {}
+        self._live = 0
+        self._garbage = 0
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], index_originals: bool = True) -> "CompactUrlStore":
+        store = cls(index_originals)
+        for item in records:
+            if not item.get("deleted"):
+                store.put(item["id"], item["original_url"], not item.get("expires_at"))
+        return store
+
+    # --- слоты ---
+
+    def _code_at(self, slot: int) -> bytes:
+        start = slot * CODE_LENGTH
+        return bytes(self._codes[start:start + CODE_LENGTH])
+
+    def _url_at(self, slot: int) -> str:
+        blob, spans = self._columns
+        span = spans[slot]
+        offset = span >> SPAN_BITS
+        return blob[offset:offset + (span & SPAN_MASK)].decode("utf-8")
+
+    def _slot_count(self) -> int:
+        return len(self._columns[1])
+
+    def _is_deleted(self, slot: int) -> bool:
+        return self._columns[1][slot] == DELETED
+
+    @staticmethod
+    def _key(code: str) -> Optional[bytes]:
+        if len(code) != CODE_LENGTH or not code.isascii():
+            return None
+        return code.encode("ascii")
+
+    # --- таблица кодов ---
+
+    def _find_slot(self, key: bytes) -> Tuple[int, int]:
+        """(позиция в таблице, слот); слот = EMPTY, если кода нет"""
+        table = self._table
+        mask = len(table) - 1
+        position = hash(key) & mask
+        while True:
+            slot = table[position]
+            if slot == EMPTY:
+                return position, EMPTY
+            if slot >= 0:
+                start = slot * CODE_LENGTH
+                if self._codes[start:start + CODE_LENGTH] == key:
+                    return position, slot
+            position = (position + 1) & mask
+
+    def _insert_code(self, key: bytes, slot: int):
+        if (self._table_used + 1) > len(self._table) * MAX_LOAD:
+            # Слот уже в _spans - перестройка сама положит его в таблицу
+            self._rebuild_tables()
+            return
+        table = self._table
+        mask = len(table) - 1
+        position = hash(key) & mask
+        while table[position] >= 0:
+            position = (position + 1) & mask
+        if table[position] == EMPTY:
+            self._table_used += 1
+        table[position] = slot
+
+    # --- обратный индекс ---
+
+    def _find_original(self, normalized: str) -> Tuple[int, int]:
+        table, hashes = self._originals, self._original_hashes
+        mask = len(table) - 1
+        digest = hash(normalized)
+        position = digest & mask
+        while True:
+            slot = table[position]
+            if slot == EMPTY:
+                return position, EMPTY
+            if slot >= 0 and hashes[position] == digest and normalize_url(self._url_at(slot)) == normalized:
+                return position, slot
+            position = (position + 1) & mask
+
+    def _insert_original(self, normalized: str, slot: int):
+        # Первая ссылка на URL остаётся канонической
+        if self._find_original(normalized)[1] != EMPTY:
+            return
+        if (self._originals_used + 1) > len(self._originals) * MAX_LOAD:
+            self._rebuild_tables()
+        table, hashes = self._originals, self._original_hashes
+        mask = len(table) - 1
+        digest = hash(normalized)
+        position = digest & mask
+        while table[position] >= 0:
+            position = (position + 1) & mask
+        if table[position] == EMPTY:
+            self._originals_used += 1
+        table[position] = slot
+        hashes[position] = digest
+
+    def _remove_original(self, normalized: str, slot: int):
+        position, found = self._find_original(normalized)
+        if found == slot:
+            self._originals[position] = TOMBSTONE
+
+    def _rebuild_tables(self):
+        """Перестраиваем обе таблицы под текущее число живых слотов (без TOMBSTONE)"""
+        size = 1024
+        while size < (self._live + 1) * 2:
+            size *= 2
+
+        table = array("q", [EMPTY]) * size
+        mask = size - 1
+        originals = array("q", [EMPTY]) * size if self._index_originals else None
+        hashes = array("q", [0]) * size if self._index_originals else None
+        canonical = {}
+        if self._index_originals:
+            # Каноническая ссылка сохраняется и после перестройки
+            old_table, old_hashes = self._originals, self._original_hashes
+            for position, slot in enumerate(old_table):
+                if slot >= 0:
+                    canonical[slot] = old_hashes[position]
+
+        for slot in range(self._slot_count()):
+            if self._is_deleted(slot):
+                continue
+            position = hash(self._code_at(slot)) & mask
+            while table[position] != EMPTY:
+                position = (position + 1) & mask
+            table[position] = slot
+
+            if slot in canonical:
+                digest = canonical[slot]
+                position = digest & mask
+                while originals[position] != EMPTY:
+                    position = (position + 1) & mask
+                originals[position] = slot
+                hashes[position] = digest
+
+        self._table, self._table_used = table, self._live
+        if self._index_originals:
+            self._originals, self._original_hashes = originals, hashes
+            self._originals_used = len(canonical)
+
+    def _compact_blob(self):
+        """Переписываем буфер URL без мусора от обновлений и удалений"""
+        old_blob, old_spans = self._columns
+        blob = bytearray()
+        spans = array("Q", old_spans)
+        for slot, span in enumerate(old_spans):
+            if span == DELETED:
+                continue
+            offset, length = span >> SPAN_BITS, span & SPAN_MASK
+            spans[slot] = len(blob) << SPAN_BITS | length
+            blob += old_blob[offset:offset + length]
+        self._columns = (blob, spans)
+        self._garbage = 0
+
+    # --- запись ---
+
+    def put(self, code: str, original_url: str, index_original: bool = True) -> bool:
+        """Добавляем или обновляем ссылку; False - такая запись уже есть.
+
+        index_original=False - ссылка не попадает в обратный индекс (ссылки со сроком
+        жизни не выдаются повторно при дедупликации).
+        """
+        key = self._key(code)
+        if key is None:
+            return self._put_odd(code, original_url, index_original)
+
+        _, slot = self._find_slot(key)
+        data = original_url.encode("utf-8")
+        if len(data) > SPAN_MASK:
+            raise ValueError(f"URL too long for compact store: {len(data)} bytes")
+        blob, spans = self._columns
+        if slot != EMPTY:
+            old_url = self._url_at(slot)
+            if self._index_originals:
+                self._remove_original(normalize_url(old_url), slot)
+            if old_url == original_url:
+                if self._index_originals and index_original:
+                    self._insert_original(normalize_url(original_url), slot)
+                return False
+            self._garbage += spans[slot] & SPAN_MASK
+            span = len(blob) << SPAN_BITS | len(data)
+            blob += data
+            spans[slot] = span
+        else:
+            slot = len(spans)
+            self._codes += key
+            span = len(blob) << SPAN_BITS | len(data)
+            blob += data
+            spans.append(span)
+            self._live += 1
+            self._insert_code(key, slot)
+
+        if self._index_originals and index_original:
+            self._insert_original(normalize_url(original_url), slot)
+        if self._garbage > BLOB_COMPACT_MIN and self._garbage > len(blob) // 2:
+            self._compact_blob()
+        return True
+
+    def remove(self, code: str) -> bool:
+        key = self._key(code)
+        if key is None:
+            return self._remove_odd(code)
+
+        position, slot = self._find_slot(key)
+        if slot == EMPTY:
+            return False
+        if self._index_originals:
+            self._remove_original(normalize_url(self._url_at(slot)), slot)
+        spans = self._columns[1]
+        self._table[position] = TOMBSTONE
+        self._garbage += spans[slot] & SPAN_MASK
+        spans[slot] = DELETED
+        self._live -= 1
+        return True
+
+    def clear(self):
+        self._reset()
+
+    def _put_odd(self, code: str, original_url: str, index_original: bool = True) -> bool:
+        old = self._odd.get(code)
+        if old == original_url:
+            return False
+        if old is not None:
+            self._remove_odd(code)
+        self._odd[code] = original_url
+        if self._index_originals and index_original:
+            self._odd_originals.setdefault(normalize_url(original_url), code)
+        return True
+
+    def _remove_odd(self, code: str) -> bool:
+        old = self._odd.pop(code, None)
+        if old is None:
+            return False
+        if self._index_originals:
+            normalized = normalize_url(old)
+            if self._odd_originals.get(normalized) == code:
+                del self._odd_originals[normalized]
+        return True
+
+    # --- чтение ---
+
+    def get(self, code: str) -> Optional[str]:
+        key = self._key(code)
+        if key is None:
+            return self._odd.get(code)
+        slot = self._find_slot(key)[1]
+        return None if slot == EMPTY else self._url_at(slot)
+
+    def find_code(self, original_url: str) -> Optional[str]:
+        """Код, под которым этот URL (после нормализации) уже есть в хранилище"""
+        normalized = normalize_url(original_url)
+        slot = self._find_original(normalized)[1]
+        if slot != EMPTY:
+            return self._code_at(slot).decode("ascii")
+        return self._odd_originals.get(normalized)
+
+    def __contains__(self, code: str) -> bool:
+        return self.get(code) is not None
+
+    def __len__(self) -> int:
+        return self._live + len(self._odd)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """(code, original_url) в порядке добавления, нестандартные коды - в конце"""
+        slot = 0
+        while slot < self._slot_count():
+            if not self._is_deleted(slot):
+                yield self._code_at(slot).decode("ascii"), self._url_at(slot)
+            slot += 1
+        yield from list(self._odd.items())
+
+    def page(self, cursor: int, limit: int) -> Tuple[List[Tuple[str, str]], Optional[int]]:
+        """Страница (code, original_url) с позиции cursor; next_cursor = None - конец.
+
+        Позиция - номер слота, поэтому курсор не сдвигается при удалениях.
+        Нестандартные коды идут после всех слотов.
+        """
+        items = []
+        total = self._slot_count()
+        position = cursor
+        while position < total and len(items) < limit:
+            if not self._is_deleted(position):
+                items.append((self._code_at(position).decode("ascii"), self._url_at(position)))
+            position += 1
+
+        end = total + len(self._odd)
+        if position >= total and len(items) < limit and self._odd:
+            odd = list(self._odd.items())[position - total:]
+            taken = odd[:limit - len(items)]
+            items.extend(taken)
+            position += len(taken)
+        return items, position if position < end else None
+
+    def urls(self) -> Iterator[Url]:
+        """Url по одному, с вычисленным short_id - для кода, которому нужны объекты"""
+        for code, original_url in self.items():
+            yield Url(id=code, original_url=original_url, short_id=short_id(code))
+
+    __iter__ = urls
+
+    @property
+    def nbytes(self) -> int:
+        """Размер колонок и таблиц (без _odd)"""
+        blob, spans = self._columns
+        size = len(self._codes) + len(blob) + spans.itemsize * len(spans)
+        size += self._table.itemsize * len(self._table)
+        if self._index_originals:
+            size += (self._originals.itemsize + self._original_hashes.itemsize) * len(self._originals)
+        return size
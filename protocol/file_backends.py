@@ -0,0 +1,602 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from BANNED_FILES.config import DATA_FILE
+from config.settings import (
+    STORAGE_BACKEND, LOG_FILE, LOG_FSYNC_BATCH, LOG_FSYNC_INTERVAL_MS,
+    LOG_COMPACT_RATIO, LOG_COMPACT_MIN_BYTES, SHORT_URL_BASE, WRITE_BEHIND_INTERVAL_MS, WRITE_BEHIND_QUEUE_SIZE
+)
+from ashredis import MISSING
+from utils.process_lock import FileLock
+from utils.metrics import WRITE_BEHIND_WAITS
+from redis_storage.url import Url
+
+# ---------------------------
+# RECORD CONVERSION
+# ---------------------------
+
+def record_to_url(item: Dict[str, Any]) -> Url:
+    """dict из файла -> Url"""
+    return Url(
+        id=item["id"],
+        original_url=item["original_url"],
+        short_id=item.get("short_id", SHORT_URL_BASE + item["id"]),
+        redirect=item.get("redirect", MISSING),
+        expires_at=item.get("expires_at", MISSING)
+    )
+
+def url_to_record(url: Url) -> Dict[str, Any]:
+    """Url -> dict для записи в файл"""
+    record = {"id": url.id, "original_url": url.original_url}
+    if url.short_id:
+        record["short_id"] = url.short_id
+    if url.redirect:
+        record["redirect"] = url.redirect
+    if url.expires_at:
+        record["expires_at"] = url.expires_at
+    return record
+
+# ---------------------------
+# JSON FILE BACKEND (исходный формат)
+# ---------------------------
+
+class JsonFileBackend:
+    """Весь набор записей в одном JSON-массиве; каждая запись переписывает файл.
+
+    Чтение-изменение-запись идёт под FileLock, поэтому несколько процессов
+    не теряют записи друг друга.
+    """
+
+    kind = "json"
+    # Изменения можно прочитать только целиком
+    incremental = False
+
+    def __init__(self, path: str = DATA_FILE):
+        self.path = path
+        self.lock = FileLock(path + ".lock", "json")
+
+    def get_file_info(self) -> Tuple[float, int]:
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime, stat.st_size)
+        except OSError:
+            return (0, 0)
+
+    def _read(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def read_records(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            return {item["id"]: item for item in self._read()}
+
+    def read_changes(self, cursor) -> Tuple[Optional[List[Dict[str, Any]]], Any, bool]:
+        """Возвращает (records, cursor, full); records = None, если файл не менялся"""
+        file_info = self.get_file_info()
+        if file_info == cursor:
+            return None, cursor, False
+        with self.lock:
+            return self._read(), self.get_file_info(), True
+
+    def current_cursor(self):
+        return self.get_file_info()
+
+    def load_all(self) -> List[Url]:
+        with self.lock:
+            return [record_to_url(item) for item in self._read()]
+
+    def _write(self, data: List[Dict[str, Any]]):
+        # Через временный файл: читатель без лока не увидит наполовину записанный JSON
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def _rewrite(self, change) -> Tuple[Tuple[float, int], Tuple[float, int]]:
+        """Чтение-изменение-запись под локом. Возвращает курсоры файла до и после:
+        если до записи файл был на курсоре читателя, чужих изменений он не пропустил"""
+        with self.lock:
+            before = self.get_file_info()
+            self._write(change(self._read()))
+            return before, self.get_file_info()
+
+    def write_all(self, urls: List[Url]):
+        return self._rewrite(lambda data: [url_to_record(u) for u in urls])
+
+    def append_many(self, urls: List[Url]):
+        return self._rewrite(lambda data: data + [url_to_record(u) for u in urls])
+
+    def append(self, url: Url):
+        return self.append_many([url])
+
+    def upsert_many(self, urls: List[Url]):
+        """Заменяем записи с теми же id (или дописываем, если их нет) одной перезаписью"""
+        records = {url.id: url_to_record(url) for url in urls}
+        return self._rewrite(
+            lambda data: [item for item in data if item.get("id") not in records] + list(records.values())
+        )
+
+    def update(self, url: Url):
+        """Заменяем запись с тем же id (или дописываем, если её нет)"""
+        return self.upsert_many([url])
+
+    def delete_many(self, codes: List[str]):
+        """Удаляем записи одной перезаписью файла (истёкшие ссылки - пачкой за проход)"""
+        removed = set(codes)
+        return self._rewrite(lambda data: [item for item in data if item.get("id") not in removed])
+
+    def close(self):
+        pass
+
+# ---------------------------
+# APPEND-ONLY LOG BACKEND
+# ---------------------------
+
+class AppendLogBackend:
+    """Одна JSON-запись на строку; новая ссылка = одна дописанная строка.
+
+    Последняя запись с данным id побеждает, запись {"id": ..., "deleted": true}
+    удаляет ссылку. Компакция переписывает лог, оставляя только живые записи.
+    Запись, восстановление и компакция идут под FileLock (общим для процессов);
+    писатель, заметивший подмену файла компакцией другого процесса, открывает его заново.
+
+    Решение о компакции берётся из общего состояния, а не из счётчиков процесса:
+    рядом с логом (path + ".compacted") лежат inode и размер лога сразу после последней
+    компакции, и лог компактируется, когда вырос больше чем в compact_ratio раз.
+    """
+
+    kind = "log"
+    incremental = True
+
+    def __init__(self, path: str, fsync_batch: int = LOG_FSYNC_BATCH,
+                 fsync_interval_ms: int = LOG_FSYNC_INTERVAL_MS,
+                 compact_ratio: float = LOG_COMPACT_RATIO,
+                 compact_min_bytes: int = LOG_COMPACT_MIN_BYTES):
+        self.path = path
+        self.state_path = path + ".compacted"
+        self.lock = FileLock(path + ".lock", "log")
+        self._fsync_batch = fsync_batch
+        self._fsync_interval = fsync_interval_ms / 1000
+        self._compact_ratio = compact_ratio
+        self._compact_min_bytes = compact_min_bytes
+        self._fh = None
+        self._pending = 0
+        # (inode, размер) лога после последней компакции - из state_path
+        self._baseline = None
+        self._compacting = False
+        self._opened = False
+
+    # --- открытие и восстановление ---
+
+    def _ensure_open(self):
+        if self._opened:
+            return
+        with self.lock:
+            if self._opened:
+                return
+            self._recover()
+            self._fh = open(self.path, "ab")
+            self._load_baseline()
+            self._opened = True
+        threading.Thread(target=self._fsync_loop, daemon=True).start()
+        atexit.register(self.close)
+
+    def _recover(self):
+        """Отрезаем недописанный хвост, оставшийся после падения процесса"""
+        if not os.path.exists(self.path):
+            return
+        good_end = 0
+        offset = 0
+        skipped = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                offset += len(line)
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                good_end = offset
+
+        size = os.path.getsize(self.path)
+        if size > good_end:
+            print(f"[LOG] Truncating {size - good_end} bytes of torn tail in {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(good_end)
+                os.fsync(f.fileno())
+        if skipped:
+            print(f"[LOG] Skipped {skipped} corrupted lines in {self.path}")
+
+    # --- состояние компакции (общее для процессов) ---
+
+    def _load_baseline(self):
+        """Читаем размер лога после последней компакции; для лога, который ещё
+        не компактировали, за точку отсчёта берём его текущий размер"""
+        stat = os.fstat(self._fh.fileno())
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+        if state and state.get("inode") == stat.st_ino:
+            self._baseline = (stat.st_ino, state["size"])
+        else:
+            self._save_baseline(stat.st_ino, stat.st_size)
+
+    def _save_baseline(self, inode: int, size: int):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"inode": inode, "size": size}, f)
+        os.replace(tmp_path, self.state_path)
+        self._baseline = (inode, size)
+
+    # --- fsync ---
+
+    def _fsync_locked(self):
+        if self._fh and self._pending:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._pending = 0
+
+    def _fsync_loop(self):
+        while self._opened:
+            time.sleep(self._fsync_interval)
+            try:
+                with self.lock:
+                    self._fsync_locked()
+            except Exception as e:
+                print(f"[LOG FSYNC ERROR] {e}")
+
+    def close(self):
+        with self.lock:
+            if self._fh:
+                self._fsync_locked()
+                self._fh.close()
+                self._fh = None
+            self._opened = False
+
+    # --- запись ---
+
+    def _write_lines(self, records: List[Dict[str, Any]]):
+        self._ensure_open()
+        payload = b"".join(
+            (json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8") for r in records
+        )
+        with self.lock:
+            self._reopen_if_replaced()
+            self._fh.write(payload)
+            self._fh.flush()
+            self._pending += len(records)
+            if self._pending >= self._fsync_batch:
+                self._fsync_locked()
+            # Размер файла включает строки всех процессов
+            size = os.fstat(self._fh.fileno()).st_size
+        self._maybe_compact(size)
+
+    def _reopen_if_replaced(self):
+        """Лог мог подменить (компакцией) другой процесс - дописываем в новый файл"""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if self._fh is not None and inode == os.fstat(self._fh.fileno()).st_ino:
+            return
+        if self._fh is not None:
+            self._fsync_locked()
+            self._fh.close()
+        self._fh = open(self.path, "ab")
+        self._load_baseline()
+
+    def append(self, url: Url):
+        self._write_lines([url_to_record(url)])
+
+    def append_many(self, urls: List[Url]):
+        if urls:
+            self._write_lines([url_to_record(u) for u in urls])
+
+    def upsert_many(self, urls: List[Url]):
+        # Последняя запись с данным id побеждает - обновление это просто новая строка
+        self.append_many(urls)
+
+    def update(self, url: Url):
+        self.upsert_many([url])
+
+    def delete(self, code: str):
+        self.delete_many([code])
+
+    def delete_many(self, codes: List[str]):
+        # Удаление - строка-надгробие; место освободит компакция
+        if codes:
+            self._write_lines([{"id": code, "deleted": True} for code in codes])
+
+    def write_all(self, urls: List[Url]):
+        """Полная замена содержимого (используется при синхронизации из Redis)"""
+        self._ensure_open()
+        records = [url_to_record(u) for u in urls]
+        with self.lock:
+            self._fsync_locked()
+            self._replace_locked(records, b"")
+
+    def _write_snapshot(self, tmp_path: str, records: List[Dict[str, Any]]):
+        with open(tmp_path, "wb") as f:
+            for r in records:
+                f.write((json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replace_locked(self, records: List[Dict[str, Any]], tail: bytes):
+        tmp_path = self.path + ".tmp"
+        self._write_snapshot(tmp_path, records)
+        if tail:
+            with open(tmp_path, "ab") as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+        self._fh.close()
+        os.replace(tmp_path, self.path)
+        self._fh = open(self.path, "ab")
+        # Точка отсчёта - только живые записи: хвост, дописанный во время компакции, уже рост
+        stat = os.fstat(self._fh.fileno())
+        self._save_baseline(stat.st_ino, stat.st_size - len(tail))
+
+    # --- компакция ---
+
+    def _maybe_compact(self, size: int):
+        if self._compacting or size < self._compact_min_bytes:
+            return
+        if size <= self._compact_ratio * self._baseline[1]:
+            return
+        self._compacting = True
+        threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        """Фоновая компакция: тяжёлая часть выполняется без блокировки писателей"""
+        try:
+            self._ensure_open()
+            with self.lock:
+                self._reopen_if_replaced()
+                self._fsync_locked()
+                snapshot_inode = os.fstat(self._fh.fileno()).st_ino
+                snapshot_end = os.path.getsize(self.path)
+
+            records = list(self._read_range(0, snapshot_end)[0].values())
+            live = [r for r in records if not r.get("deleted")]
+
+            with self.lock:
+                if os.stat(self.path).st_ino != snapshot_inode:
+                    print("[LOG] Skipping compaction: log was compacted by another process")
+                    return
+                self._fsync_locked()
+                with open(self.path, "rb") as f:
+                    f.seek(snapshot_end)
+                    tail = f.read()
+                before = os.path.getsize(self.path)
+                self._replace_locked(live, tail)
+            print(f"[LOG] Compacted {before} -> {os.path.getsize(self.path)} bytes")
+        except Exception as e:
+            print(f"[LOG COMPACT ERROR] {e}")
+        finally:
+            self._compacting = False
+
+    # --- чтение ---
+
+    def _read_range(self, start: int, end: Optional[int] = None) -> Tuple[Dict[str, Dict[str, Any]], int]:
+        """Читаем полные строки с offset start; возвращаем записи и новый offset"""
+        records: Dict[str, Dict[str, Any]] = {}
+        offset = start
+        if not os.path.exists(self.path):
+            return records, offset
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            for line in f:
+                if end is not None and offset + len(line) > end:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                records[item["id"]] = item
+        return records, offset
+
+    def read_records(self) -> Dict[str, Dict[str, Any]]:
+        records, _ = self._read_range(0)
+        return {code: r for code, r in records.items() if not r.get("deleted")}
+
+    def _stat(self) -> Tuple[int, int]:
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_ino, stat.st_size)
+        except OSError:
+            return (0, 0)
+
+    def get_file_info(self) -> Tuple[int, int]:
+        return self._stat()
+
+    def current_cursor(self):
+        return self._stat()
+
+    def read_changes(self, cursor) -> Tuple[Optional[List[Dict[str, Any]]], Any, bool]:
+        """cursor = (inode, offset). После компакции inode меняется -> полное чтение"""
+        inode, size = self._stat()
+        if cursor and cursor[0] == inode and cursor[1] <= size:
+            if cursor[1] == size:
+                return None, cursor, False
+            records, offset = self._read_range(cursor[1])
+            return list(records.values()), (inode, offset), False
+        records, offset = self._read_range(0)
+        live = [r for r in records.values() if not r.get("deleted")]
+        return live, (inode, offset), True
+
+    def load_all(self) -> List[Url]:
+        return [record_to_url(item) for item in self.read_records().values()]
+
+# ---------------------------
+# BACKGROUND WRITER
+# ---------------------------
+
+class BackgroundFileWriter:
+    """Отложенная групповая запись новых ссылок в файловый бэкенд.
+
+    Запрос только кладёт ссылку в очередь; один поток забирает всё накопленное
+    и пишет одной операцией (upsert_many), не чаще раза в interval секунд, поэтому
+    время запроса не зависит от размера файла и от чужих записей под FileLock.
+    Очередь ограничена max_queue: когда она полна, submit() ждёт (backpressure).
+    Непрошедшая запись повторяется следующим проходом. on_written(batch, written)
+    вызывается после каждой успешной записи (written - что вернул upsert_many).
+    Запись по id, а не дописывание: в режиме redis через бэкап идут и изменения
+    редиректа уже сохранённых ссылок.
+    """
+
+    def __init__(self, backend, interval: float = WRITE_BEHIND_INTERVAL_MS / 1000,
+                 max_queue: int = WRITE_BEHIND_QUEUE_SIZE, name: str = "backup",
+                 on_written: Optional[Callable[[List[Url], Any], None]] = None):
+        self._backend = backend
+        self._interval = interval
+        self._queue: "queue.Queue[Url]" = queue.Queue(maxsize=max_queue)
+        self._name = name
+        self._on_written = on_written
+        self._thread = None
+        self._lock = threading.Lock()
+        # Пачку пишет кто-то один (поток или flush), иначе обновления одного кода
+        # могли бы лечь в файл в обратном порядке
+        self._write_lock = threading.Lock()
+        self._retry: List[Url] = []
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True, name=f"file-writer-{self._name}")
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def submit(self, url: Url):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(url)
+        except queue.Full:
+            WRITE_BEHIND_WAITS.inc(self._name)
+            self._queue.put(url)
+
+    def submit_many(self, urls: List[Url]):
+        for url in urls:
+            self.submit(url)
+
+    def has_room(self, count: int = 1) -> bool:
+        """submit() count ссылок сейчас не будет ждать"""
+        return self._queue.qsize() + count <= self._queue.maxsize or self._queue.maxsize <= 0
+
+    def _drain(self, first: Url = None) -> List[Url]:
+        batch = self._retry + ([first] if first is not None else [])
+        self._retry = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _write(self, batch: List[Url]) -> bool:
+        try:
+            written = self._backend.upsert_many(batch)
+        except Exception as e:
+            print(f"[FILE WRITER ERROR] Failed to write {len(batch)} URLs ({self._name}): {e}")
+            self._retry = batch
+            return False
+        if self._on_written is not None:
+            self._on_written(batch, written)
+        return True
+
+    def _run(self):
+        while True:
+            first = self._queue.get() if not self._retry else None
+            started = time.monotonic()
+            with self._write_lock:
+                batch = self._drain(first)
+                if batch:
+                    self._write(batch)
+            # Следующая пачка копится, пока не пройдёт interval
+            time.sleep(max(self._interval - (time.monotonic() - started), 0))
+
+    def flush(self):
+        """Дописываем всё, что уже в очереди: при остановке процесса и перед
+        записью, которая должна лечь в файл после них"""
+        with self._write_lock:
+            batch = self._drain()
+            if batch:
+                self._write(batch)
+
+# ---------------------------
+# MIGRATION
+# ---------------------------
+
+def default_log_path() -> str:
+    return LOG_FILE or os.path.splitext(DATA_FILE)[0] + ".jsonl"
+
+def migrate_json_to_log(json_path: str = DATA_FILE, log_path: str = None) -> int:
+    """Одноразовая миграция DATA_FILE -> append-only лог. Существующий лог не трогаем."""
+    log_path = log_path or default_log_path()
+    if os.path.exists(log_path) and os.path.getsize(log_path) > 0:
+        return 0
+    if not os.path.exists(json_path):
+        return 0
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    tmp_path = log_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for item in data:
+            # Тот же сериализатор, что у бэкендов: переносятся все поля записи
+            record = url_to_record(record_to_url(item))
+            f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, log_path)
+
+    print(f"[LOG] Migrated {len(data)} URLs from {json_path} to {log_path}")
+    return len(data)
+
+# ---------------------------
+# BACKEND SELECTION
+# ---------------------------
+
+def create_file_backend(kind: str = STORAGE_BACKEND):
+    if kind == "log":
+        log_path = default_log_path()
+        # Миграция - отдельный шаг развёртывания, а не побочный эффект импорта
+        if not os.path.exists(log_path) and os.path.exists(DATA_FILE):
+            print(f"[LOG] {log_path} does not exist; import {DATA_FILE} with "
+                  f"python -m protocol.file_backends migrate")
+        return AppendLogBackend(log_path)
+    if kind == "json":
+        return JsonFileBackend(DATA_FILE)
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+
+# Глобальный бэкенд файлового хранилища
+file_backend = create_file_backend()
+file_backup = BackgroundFileWriter(file_backend)
+
+
+if __name__ == "__main__":
+    # python -m protocol.file_backends migrate [json_path] [log_path]
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        migrate_json_to_log(*sys.argv[2:4])
+    elif len(sys.argv) >= 2 and sys.argv[1] == "compact":
+        AppendLogBackend(sys.argv[2] if len(sys.argv) > 2 else default_log_path()).compact()
+    else:
+        print("Usage: python -m protocol.file_backends migrate|compact [paths]")
@@ -0,0 +1,109 @@
+import sys
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List
+from config.redis_manager import redis_shards, RedisManager
+from protocol.sharding import gather_shards, move_keys
+from protocol.url_storage import REDIS_DIGEST_KEY, url_key, scan_codes
+from protocol.analytics import REDIS_CLICKS_PREFIX
+
+# Перенос ключей к владельцам по текущему кольцу REDIS_SHARDS после добавления шарда.
+# Запускать, когда все воркеры уже работают с новыми REDIS_SHARDS и REDIS_SHARDS_PREVIOUS:
+# они пишут новому владельцу и при промахе читают у прежнего, поэтому сервис работает
+# во время переноса. Повторный прогон безопасен и переносит только оставшееся.
+#
+#   python -m protocol.rebalance status   - сколько ключей лежит не на своём шарде
+#   python -m protocol.rebalance run      - перенести их
+
+# Ключей в одном DUMP/RESTORE pipeline
+REBALANCE_BATCH = 500
+
+# ---------------------------
+# REBALANCE
+# ---------------------------
+
+async def rebalance_keys(source: RedisManager, keys: AsyncIterator[str], owner: Callable[[str], RedisManager],
+                         merge: bool = False, dry_run: bool = False, batch: int = REBALANCE_BATCH) -> int:
+    """Переносим с source ключи, владелец которых по кольцу - другой шард"""
+    pending: Dict[RedisManager, List[str]] = {}
+    misplaced = 0
+    async for key in keys:
+        target = owner(key)
+        if target is source:
+            continue
+        misplaced += 1
+        if dry_run:
+            continue
+        group = pending.setdefault(target, [])
+        group.append(key)
+        if len(group) >= batch:
+            await move_keys(source, target, group, merge)
+            group.clear()
+    for target, group in pending.items():
+        if group:
+            await move_keys(source, target, group, merge)
+    return misplaced
+
+async def rebalance_digests(source: RedisManager, dry_run: bool = False, batch: int = REBALANCE_BATCH) -> int:
+    """Поля обратного индекса urls_by_digest - к шарду-владельцу digest (HSETNX, затем HDEL)"""
+    pending: Dict[RedisManager, Dict[str, str]] = {}
+    misplaced = 0
+
+    async def move(target: RedisManager, fields: Dict[str, str]):
+        pipeline = target.client.pipeline()
+        for digest, code in fields.items():
+            pipeline.hsetnx(REDIS_DIGEST_KEY, digest, code)
+        await pipeline.execute()
+        await source.client.hdel(REDIS_DIGEST_KEY, *fields)
+        fields.clear()
+
+    async for digest, code in source.client.hscan_iter(REDIS_DIGEST_KEY, count=batch):
+        target = redis_shards.for_key(digest)
+        if target is source:
+            continue
+        misplaced += 1
+        if dry_run:
+            continue
+        fields = pending.setdefault(target, {})
+        fields[digest] = code
+        if len(fields) >= batch:
+            await move(target, fields)
+    for target, fields in pending.items():
+        if fields:
+            await move(target, fields)
+    return misplaced
+
+async def rebalance_shard(source: RedisManager, dry_run: bool = False) -> Dict[str, int]:
+    async def url_keys():
+        async for code in scan_codes(source):
+            yield url_key(code)
+
+    clicks_prefix = f"{REDIS_CLICKS_PREFIX}:"
+    return {
+        "urls": await rebalance_keys(
+            source, url_keys(), lambda key: redis_shards.for_key(key.split(":", 1)[1]), dry_run=dry_run),
+        "clicks": await rebalance_keys(
+            source, source.client.scan_iter(match=clicks_prefix + "*", count=REBALANCE_BATCH, _type="hash"),
+            lambda key: redis_shards.for_key(key[len(clicks_prefix):]), merge=True, dry_run=dry_run),
+        "digests": await rebalance_digests(source, dry_run=dry_run),
+    }
+
+async def rebalance(dry_run: bool = False) -> Dict[str, Dict[str, int]]:
+    """Все шарды параллельно; возвращает шард -> число ключей не на своём месте"""
+    await redis_shards.init_connection()
+
+    async def run(source: RedisManager):
+        return source.name, await rebalance_shard(source, dry_run)
+
+    return dict(await gather_shards(run))
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) >= 2 else None
+    if command in ("status", "run"):
+        for name, counts in asyncio.run(rebalance(dry_run=command == "status")).items():
+            verb = "misplaced" if command == "status" else "moved"
+            print(f"[REBALANCE] {name}: {verb} {counts['urls']} URLs, "
+                  f"{counts['clicks']} click counters, {counts['digests']} digests")
+    else:
+        print("Usage: python -m protocol.rebalance status | run")
+        sys.exit(1)
@@ -0,0 +1,125 @@
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+from redis.exceptions import ResponseError
+from config.redis_manager import redis_shards, RedisManager
+
+# Команды по ключам, разложенные по шардам (см. ShardedRedis в config/redis_manager.py).
+# Ключ маршрутизации - код ссылки (Url:<code>, clicks:<code>) или digest URL для
+# обратного индекса. С одним шардом всё сводится к одному pipeline, как без шардирования.
+
+# command(pipeline, index) добавляет в pipeline команду для keys[index]
+Command = Callable[[Any, int], Any]
+
+# ---------------------------
+# PIPELINES BY SHARD
+# ---------------------------
+
+async def pipeline_by_key(keys: List[str], command: Command,
+                          route: Callable[[str], Optional[RedisManager]] = None,
+                          return_exceptions: bool = False) -> List[Any]:
+    """По pipeline на шард, шарды параллельно; результаты в порядке keys.
+
+    route(key) - шард для ключа (по умолчанию владелец); None - ключ пропускается.
+    return_exceptions=True - ошибка шарда не прерывает остальные: результатом
+    каждого его ключа становится исключение.
+    """
+    route = route or redis_shards.for_key
+    groups: Dict[RedisManager, List[int]] = {}
+    for index, key in enumerate(keys):
+        manager = route(key)
+        if manager is not None:
+            groups.setdefault(manager, []).append(index)
+
+    results: List[Any] = [None] * len(keys)
+
+    async def run(manager: RedisManager, indexes: List[int]):
+        pipeline = manager.client.pipeline()
+        for index in indexes:
+            command(pipeline, index)
+        for index, value in zip(indexes, await pipeline.execute()):
+            results[index] = value
+
+    outcomes = await asyncio.gather(
+        *(run(manager, indexes) for manager, indexes in groups.items()), return_exceptions=return_exceptions
+    )
+    for indexes, outcome in zip(groups.values(), outcomes):
+        if isinstance(outcome, Exception):
+            for index in indexes:
+                results[index] = outcome
+    return results
+
+async def read_by_key(keys: List[str], command: Command, missing: Callable[[Any], bool] = lambda value: not value) -> List[Any]:
+    """Чтение у владельцев; на время переезда промахи дочитываются у прежнего владельца"""
+    results = await pipeline_by_key(keys, command)
+    if redis_shards.migrating:
+        retry = [index for index, value in enumerate(results) if missing(value)]
+        values = await pipeline_by_key(
+            [keys[index] for index in retry], lambda pipeline, i: command(pipeline, retry[i]),
+            route=redis_shards.previous_for_key
+        )
+        for index, value in zip(retry, values):
+            if value is not None:
+                results[index] = value
+    return results
+
+async def write_by_key(keys: List[str], command: Command):
+    """Запись у владельцев; на время переезда - и у прежних (для удалений)"""
+    await pipeline_by_key(keys, command)
+    if redis_shards.migrating:
+        await pipeline_by_key(keys, command, route=redis_shards.previous_for_key)
+
+async def gather_shards(call: Callable[[RedisManager], Any]) -> List[Any]:
+    """call(manager) на всех шардах параллельно"""
+    return await asyncio.gather(*(call(manager) for manager in redis_shards.all))
+
+# ---------------------------
+# MOVING KEYS
+# ---------------------------
+
+async def move_keys(source: RedisManager, target: RedisManager, keys: List[str], merge: bool = False) -> int:
+    """Переносим ключи с source на target (DUMP/RESTORE с TTL, затем DEL на source).
+
+    Если ключ на target уже есть, он новее (записан после смены владельца) и остаётся;
+    merge=True - хеши счётчиков складываются (HINCRBY). Возвращает число перенесённых.
+    """
+    # Без MULTI: ответ EXEC декодируется целиком, а DUMP должен остаться байтами
+    pipeline = source.client.pipeline(transaction=False)
+    for key in keys:
+        pipeline.dump(key)
+        pipeline.pttl(key)
+    dumped = await pipeline.execute()
+
+    present = [(key, dumped[i * 2], dumped[i * 2 + 1]) for i, key in enumerate(keys) if dumped[i * 2] is not None]
+    if not present:
+        return 0
+
+    pipeline = target.client.pipeline(transaction=False)
+    for key, payload, ttl in present:
+        pipeline.restore(key, max(ttl, 0), payload)
+    restored = await pipeline.execute(raise_on_error=False)
+
+    moved, busy, failed = [], [], []
+    for (key, _, _), result in zip(present, restored):
+        if not isinstance(result, Exception):
+            moved.append(key)
+        elif isinstance(result, ResponseError) and str(result).startswith("BUSYKEY"):
+            busy.append(key)
+        else:
+            failed.append(result)
+    if merge and busy:
+        pipeline = source.client.pipeline()
+        for key in busy:
+            pipeline.hgetall(key)
+        counters = await pipeline.execute()
+        pipeline = target.client.pipeline()
+        for key, fields in zip(busy, counters):
+            for field, value in fields.items():
+                pipeline.hincrby(key, field, int(value))
+        await pipeline.execute()
+
+    # Не перенесённое из-за ошибки остаётся на source до следующего прогона
+    if moved or busy:
+        await source.client.delete(*moved, *busy)
+    if failed:
+        raise failed[0]
+    return len(moved) + len(busy)
@@ -0,0 +1,367 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from BANNED_FILES.config import DATA_FILE
+from config.settings import SNAPSHOT_FILE, SHORT_URL_BASE
+from utils.helpers import normalize_url, url_digest, CODE_LENGTH
+
+# Бинарный снимок набора ссылок для быстрого холодного старта.
+#
+#   заголовок  MAGIC, версия, длина meta, число записей
+#   meta       JSON: источник (бэкенд, путь, курсор) и коды нестандартной длины
+#   codes      count * 7 байт ASCII, по возрастанию
+#   redirects  count * u8: код редиректа - 300 (0 - глобальный REDIRECT_STATUS)
+#   expires    count * u32: unix-время истечения ссылки (0 - бессрочная)
+#   spans      count * u64: offset << SPAN_BITS | length URL в blob
+#   digests    count * u64: original_digest(url)
+#   originals  count * u32: номера записей, отсортированные по digest (дедупликация)
+#   blob       URL в UTF-8
+#
+# Файл открывается через mmap и ищется на месте бинарным поиском: старт не зависит
+# от размера набора, а воркеры на одной машине делят страницы page cache.
+# Числа в нативном порядке байт; на big-endian снимок не открывается (индекс строится из файла).
+#
+#   python -m protocol.snapshot build [snapshot]          # из текущего файлового бэкенда
+#   python -m protocol.snapshot from-json DATA_FILE [snapshot]
+#   python -m protocol.snapshot to-json SNAPSHOT JSON_PATH
+
+MAGIC = b"URLSNAP\x00"
+VERSION = 2
+HEADER = struct.Struct("<8sIIQ")  # magic, version, длина meta, число записей
+ALIGN = 8
+
+# Тот же формат положения URL, что и в CompactUrlStore
+SPAN_BITS = 24
+SPAN_MASK = (1 << SPAN_BITS) - 1
+
+REDIRECT_BASE = 300
+
+# Сколько байт лога перед курсором сверяется при открытии снимка
+FINGERPRINT_BYTES = 4096
+
+Row = Tuple[str, str, Optional[int], Optional[int], Optional[int]]  # code, original_url, redirect, digest, expires_at
+
+def default_snapshot_path() -> str:
+    return SNAPSHOT_FILE or os.path.splitext(DATA_FILE)[0] + ".snap"
+
+def original_digest(original_url: str) -> int:
+    """Стабильный между процессами 64-битный ключ normalize_url(url) (hash() - нет)"""
+    return int(url_digest(original_url)[:16], 16)
+
+def _align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def _layout(meta_length: int, count: int) -> Dict[str, int]:
+    """Смещения секций файла"""
+    offset = _align(HEADER.size + meta_length)
+    layout = {}
+    for name, size in (("codes", count * CODE_LENGTH), ("redirects", count), ("expires", count * 4),
+                       ("spans", count * 8), ("digests", count * 8), ("originals", count * 4), ("blob", 0)):
+        layout[name] = offset
+        offset = _align(offset + size)
+    return layout
+
+def _is_standard(code: str) -> bool:
+    return len(code) == CODE_LENGTH and code.isascii()
+
+# ---------------------------
+# WRITE
+# ---------------------------
+
+def write_snapshot(path: str, rows: Iterable[Row], source: Dict[str, Any]) -> int:
+    """Атомарно (tmp + rename) пишем снимок и возвращаем число записей.
+
+    rows - (code, original_url, redirect, digest, expires_at) по возрастанию кода, без повторов;
+    digest = None - посчитать здесь. source - откуда снимок и до какого курсора.
+    """
+    codes = bytearray()
+    redirects = bytearray()
+    expires = array("I")
+    spans = array("Q")
+    digests = array("Q")
+    blob = bytearray()
+    odd: Dict[str, List[Any]] = {}
+    previous = b""
+
+    for code, original_url, redirect, digest, expires_at in rows:
+        if not _is_standard(code):
+            odd[code] = [original_url, redirect or 0, expires_at or 0]
+            continue
+        key = code.encode("ascii")
+        if key <= previous:
+            raise ValueError(f"Snapshot rows must be sorted by code without duplicates: {code}")
+        previous = key
+        data = original_url.encode("utf-8")
+        if len(data) > SPAN_MASK:
+            raise ValueError(f"URL too long for snapshot: {len(data)} bytes")
+        codes += key
+        redirects.append(redirect - REDIRECT_BASE if redirect else 0)
+        expires.append(expires_at or 0)
+        spans.append(len(blob) << SPAN_BITS | len(data))
+        digests.append(original_digest(original_url) if digest is None else digest)
+        blob += data
+
+    count = len(spans)
+    # Среди одинаковых URL первой идёт запись с меньшим кодом - она и каноническая
+    originals = array("I", sorted(range(count), key=digests.__getitem__))
+    meta = json.dumps({"source": source, "odd": odd}, ensure_ascii=False).encode("utf-8")
+    layout = _layout(len(meta), count)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(meta), count))
+        f.write(meta)
+        for name, data in (("codes", codes), ("redirects", redirects), ("expires", expires),
+                           ("spans", spans), ("digests", digests), ("originals", originals), ("blob", blob)):
+            f.write(b"\0" * (layout[name] - f.tell()))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count + len(odd)
+
+def records_to_rows(records: Iterable[Dict[str, Any]]) -> List[Row]:
+    """Записи файлового бэкенда -> строки снимка (по коду, без удалённых).
+    Повторы одного кода схлопываются: побеждает последняя запись, как в индексе"""
+    latest = {item["id"]: item for item in records}
+    rows = [(item["id"], item["original_url"], item.get("redirect"), None, item.get("expires_at"))
+            for item in latest.values() if not item.get("deleted")]
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+def log_fingerprint(path: str, offset: int) -> Optional[str]:
+    """sha1 байт лога перед offset: после компакции inode старого лога может
+    достаться новому файлу, и один курсор (inode, offset) уже ничего не гарантирует"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(offset - FINGERPRINT_BYTES, 0))
+            return hashlib.sha1(f.read(min(offset, FINGERPRINT_BYTES))).hexdigest()
+    except OSError:
+        return None
+
+def backend_source(backend, cursor) -> Dict[str, Any]:
+    source = {"backend": backend.kind, "path": os.path.abspath(backend.path), "cursor": list(cursor)}
+    if backend.kind == "log":
+        source["fingerprint"] = log_fingerprint(backend.path, cursor[1])
+    return source
+
+def build_snapshot(backend, path: str) -> int:
+    """Снимок текущего содержимого файлового бэкенда (JSON или лог)"""
+    records, cursor, _ = backend.read_changes(None)
+    return write_snapshot(path, records_to_rows(records or []), backend_source(backend, cursor))
+
+# ---------------------------
+# READ
+# ---------------------------
+
+class UrlSnapshot:
+    """Снимок, открытый через mmap. Только чтение; закрывается вместе с последней ссылкой"""
+
+    def __init__(self, path: str, mm: mmap.mmap, meta: Dict[str, Any], count: int, layout: Dict[str, int]):
+        self.path = path
+        self.source = meta.get("source") or {}
+        self.count = count
+        self._mm = mm
+        view = memoryview(mm)
+        self._codes = layout["codes"]
+        self._redirects = layout["redirects"]
+        self._expires = view[layout["expires"]:layout["expires"] + count * 4].cast("I")
+        self._spans = view[layout["spans"]:layout["spans"] + count * 8].cast("Q")
+        self._digests = view[layout["digests"]:layout["digests"] + count * 8].cast("Q")
+        self._originals = view[layout["originals"]:layout["originals"] + count * 4].cast("I")
+        self._blob = layout["blob"]
+        self._odd = {code: (value[0], value[1] or None, value[2] or None)
+                     for code, value in (meta.get("odd") or {}).items()}
+        self._odd_originals: Dict[str, str] = {}
+        for code, (original_url, _, expires_at) in sorted(self._odd.items()):
+            if not expires_at:
+                self._odd_originals.setdefault(normalize_url(original_url), code)
+
+    @classmethod
+    def open(cls, path: str) -> Optional["UrlSnapshot"]:
+        """None - снимка нет или он не читается (тогда индекс строится из файла)"""
+        if sys.byteorder != "little" or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < HEADER.size:
+                    raise ValueError("file is too short")
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, meta_length, count = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"unsupported format {magic!r} v{version}")
+            meta = json.loads(mm[HEADER.size:HEADER.size + meta_length])
+            layout = _layout(meta_length, count)
+            if len(mm) < layout["blob"]:
+                raise ValueError("file is truncated")
+            return cls(path, mm, meta, count, layout)
+        except (OSError, ValueError) as e:
+            print(f"[SNAPSHOT ERROR] Ignoring {path}: {e}")
+            return None
+
+    def source_cursor(self, backend) -> Optional[Tuple]:
+        """Курсор бэкенда, на котором снят снимок; None - снимок от другого источника"""
+        if (self.source.get("backend") != backend.kind
+                or self.source.get("path") != os.path.abspath(backend.path)):
+            return None
+        cursor = tuple(self.source.get("cursor") or ())
+        if not cursor:
+            return None
+        if "fingerprint" in self.source and log_fingerprint(backend.path, cursor[1]) != self.source["fingerprint"]:
+            return None
+        return cursor
+
+    # --- записи ---
+
+    def _code_at(self, index: int) -> str:
+        start = self._codes + index * CODE_LENGTH
+        return self._mm[start:start + CODE_LENGTH].decode("ascii")
+
+    def _url_at(self, index: int) -> str:
+        span = self._spans[index]
+        start = self._blob + (span >> SPAN_BITS)
+        return self._mm[start:start + (span & SPAN_MASK)].decode("utf-8")
+
+    def _redirect_at(self, index: int) -> Optional[int]:
+        value = self._mm[self._redirects + index]
+        return REDIRECT_BASE + value if value else None
+
+    def _expires_at(self, index: int) -> Optional[int]:
+        return self._expires[index] or None
+
+    def _find(self, code: str) -> int:
+        """Номер записи с этим кодом (бинарный поиск по mmap) или -1"""
+        key = code.encode("ascii")
+        mm, base = self._mm, self._codes
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = base + middle * CODE_LENGTH
+            probe = mm[start:start + CODE_LENGTH]
+            if probe < key:
+                low = middle + 1
+            elif probe > key:
+                high = middle
+            else:
+                return middle
+        return -1
+
+    # --- чтение ---
+
+    def lookup(self, code: str) -> Tuple[Optional[str], Optional[int], Optional[int]]:
+        """(original_url, redirect, expires_at) или (None, None, None)"""
+        if not _is_standard(code):
+            return self._odd.get(code, (None, None, None))
+        index = self._find(code)
+        if index < 0:
+            return None, None, None
+        return self._url_at(index), self._redirect_at(index), self._expires_at(index)
+
+    def get(self, code: str) -> Optional[str]:
+        return self.lookup(code)[0]
+
+    def find_code(self, original_url: str) -> Optional[str]:
+        """Код, под которым этот URL (после нормализации) есть в снимке; ссылки со сроком
+        жизни для дедупликации не выдаются"""
+        normalized = normalize_url(original_url)
+        digest = original_digest(original_url)
+        originals, digests = self._originals, self._digests
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if digests[originals[middle]] < digest:
+                low = middle + 1
+            else:
+                high = middle
+        while low < self.count and digests[originals[low]] == digest:
+            index = originals[low]
+            if not self._expires[index] and normalize_url(self._url_at(index)) == normalized:
+                return self._code_at(index)
+            low += 1
+        return self._odd_originals.get(normalized)
+
+    def __contains__(self, code: str) -> bool:
+        return self.get(code) is not None
+
+    def __len__(self) -> int:
+        return self.count + len(self._odd)
+
+    @property
+    def positions(self) -> int:
+        """Число позиций курсора page(): записи, потом нестандартные коды"""
+        return self.count + len(self._odd)
+
+    def page(self, cursor: int, limit: int) -> Tuple[List[Tuple[str, str]], Optional[int]]:
+        """Страница (code, original_url) с позиции cursor; next_cursor = None - конец"""
+        end = min(cursor + limit, self.positions)
+        items = [(self._code_at(i), self._url_at(i)) for i in range(cursor, min(end, self.count))]
+        if end > self.count:
+            odd = sorted(self._odd.items())[max(cursor - self.count, 0):end - self.count]
+            items.extend((code, value[0]) for code, value in odd)
+        return items, end if end < self.positions else None
+
+    def rows(self) -> Iterator[Row]:
+        """(code, original_url, redirect, digest, expires_at) по возрастанию кода, нестандартные - в конце"""
+        for index in range(self.count):
+            yield (self._code_at(index), self._url_at(index), self._redirect_at(index),
+                   self._digests[index], self._expires_at(index))
+        for code, (original_url, redirect, expires_at) in sorted(self._odd.items()):
+            yield code, original_url, redirect, None, expires_at
+
+    def expiring(self) -> Iterator[Tuple[int, str]]:
+        """(expires_at, code) ссылок со сроком жизни - для очереди истечения индекса"""
+        for index, expires_at in enumerate(self._expires):
+            if expires_at:
+                yield expires_at, self._code_at(index)
+        for code, (_, _, expires_at) in self._odd.items():
+            if expires_at:
+                yield expires_at, code
+
+# ---------------------------
+# JSON CONVERSION
+# ---------------------------
+
+def json_to_snapshot(json_path: str, snapshot_path: str) -> int:
+    """DATA_FILE (JSON-массив) -> снимок; курсор источника - mtime/size JSON-файла"""
+    from protocol.file_backends import JsonFileBackend
+    return build_snapshot(JsonFileBackend(json_path), snapshot_path)
+
+def snapshot_to_json(snapshot_path: str, json_path: str) -> int:
+    """Снимок -> JSON-массив в формате DATA_FILE"""
+    snapshot = UrlSnapshot.open(snapshot_path)
+    if snapshot is None:
+        raise ValueError(f"Cannot read snapshot {snapshot_path}")
+    data = []
+    for code, original_url, redirect, _, expires_at in snapshot.rows():
+        record = {"id": code, "original_url": original_url, "short_id": SHORT_URL_BASE + code}
+        if redirect:
+            record["redirect"] = redirect
+        if expires_at:
+            record["expires_at"] = expires_at
+        data.append(record)
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, json_path)
+    return len(data)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) >= 2 else None
+    if command == "build":
+        from protocol.file_backends import file_backend
+        target = sys.argv[2] if len(sys.argv) >= 3 else default_snapshot_path()
+        print(f"[SNAPSHOT] Wrote {build_snapshot(file_backend, target)} URLs to {target}")
+    elif command == "from-json" and len(sys.argv) >= 3:
+        target = sys.argv[3] if len(sys.argv) >= 4 else default_snapshot_path()
+        print(f"[SNAPSHOT] Wrote {json_to_snapshot(sys.argv[2], target)} URLs to {target}")
+    elif command == "to-json" and len(sys.argv) >= 4:
+        print(f"[SNAPSHOT] Wrote {snapshot_to_json(sys.argv[2], sys.argv[3])} URLs to {sys.argv[3]}")
+    else:
+        print("Usage: python -m protocol.snapshot build [snapshot] | from-json JSON [snapshot] | to-json SNAPSHOT JSON")
+        sys.exit(1)
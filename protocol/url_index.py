@@ -0,0 +1,382 @@
+import time
+import atexit
+import heapq
+import threading
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from protocol.file_backends import file_backend, BackgroundFileWriter
+from protocol.compact_store import CompactUrlStore
+from protocol.snapshot import UrlSnapshot, write_snapshot, records_to_rows, backend_source, default_snapshot_path
+from config.settings import SNAPSHOT_ENABLED
+from redis_storage.url import Url
+
+# Как часто (в секундах) проверять, не изменился ли файл на диске
+INDEX_CHECK_INTERVAL = 1.0
+
+# ---------------------------
+# IN-MEMORY SHORT CODE INDEX
+# ---------------------------
+
+class IndexLayers(NamedTuple):
+    """Состояние индекса; читатели берут его одним обращением к атрибуту"""
+    base: Optional[UrlSnapshot]  # снимок через mmap (только чтение)
+    store: CompactUrlStore       # изменения после снимка или весь набор без снимка
+    hidden: Set[str]             # коды снимка, удалённые или изменённые после него
+    redirects: Dict[str, int]    # политика редиректа ссылок из store
+    expires: Dict[str, int]      # срок жизни ссылок из store (unix-время)
+
+
+def empty_layers(base: Optional[UrlSnapshot] = None) -> IndexLayers:
+    return IndexLayers(base, CompactUrlStore(), set(), {}, {})
+
+
+class UrlIndex:
+    """Резидентный индекс short_code -> original_url для горячего пути редиректа
+    и обратный индекс normalize_url(original_url) -> short_code для дедупликации.
+
+    Данные лежат в CompactUrlStore - без объекта Python на каждую ссылку. Если задан
+    snapshot_path, основной набор читается на месте из бинарного снимка (mmap), а в
+    CompactUrlStore остаются только изменения файла после него.
+    """
+
+    def __init__(self, backend=file_backend, check_interval: float = INDEX_CHECK_INTERVAL,
+                 snapshot_path: Optional[str] = None):
+        self._backend = backend
+        self._check_interval = check_interval
+        self._snapshot_path = snapshot_path
+        self._layers = empty_layers()
+        # Лок только для писателей: читатели хранилища обходятся без него (см. CompactUrlStore)
+        self._write_lock = threading.Lock()
+        self._cursor = None
+        self._next_check = 0.0
+        self._loaded = False
+        # Занят, пока идёт фоновая перезагрузка: запросы не ждут чтения файла
+        self._reloading = threading.Lock()
+        # Есть изменения, которых нет в снимке на диске
+        self._dirty = False
+        # Очередь истечения: куча (expires_at, code), строится при первом pop_expired()
+        self._expiry_heap: Optional[List[Tuple[int, str]]] = None
+        # Ссылки, которые уже в индексе, но ещё ждут записи в файл (см. file_writer)
+        self._pending: Dict[str, Tuple[str, Optional[int], Optional[int]]] = {}
+
+    def reload(self):
+        """Применяем к индексу только изменения файла (полностью - если бэкенд не умеет иначе)"""
+        with self._write_lock:
+            if not self._loaded and self._cursor is None:
+                self._open_snapshot()
+            try:
+                records, cursor, full = self._backend.read_changes(self._cursor)
+            except Exception as e:
+                print(f"[INDEX ERROR] Failed to reload index: {e}")
+                return
+
+            self._cursor = cursor
+            if records is None:
+                self._loaded = True
+                return
+
+            # Первая загрузка сразу превращается в новый снимок; дальше полное чтение
+            # применяется разницей, а снимок перезаписывает save_snapshot при остановке
+            if full and not self._loaded:
+                self._replace_all(records)
+                self._restore_pending()
+                self._loaded = True
+                return
+
+            added = removed = 0
+            if full:
+                fresh = {item["id"]: item for item in records}
+                base, store, hidden, _, _ = self._layers
+                stale = [c for c, _ in store.items() if c not in fresh]
+                if base is not None:
+                    stale.extend(row[0] for row in base.rows() if row[0] not in fresh and row[0] not in hidden)
+                for code in stale:
+                    if self._remove(code):
+                        removed += 1
+                records = list(fresh.values())
+
+            for item in records:
+                code = item["id"]
+                if item.get("deleted"):
+                    if self._remove(code):
+                        removed += 1
+                elif self._lookup(code) != (item["original_url"], item.get("redirect"), item.get("expires_at")):
+                    self._set(code, item["original_url"], item.get("redirect"), item.get("expires_at"))
+                    added += 1
+            if full:
+                self._restore_pending()
+
+            # Только после применения записей: иначе параллельный get() пропустит
+            # проверку и увидит наполовину загруженный индекс
+            self._loaded = True
+            if added or removed:
+                self._dirty = True
+                print(f"[INDEX] Reloaded: +{added} -{removed}, total={self._count()}")
+
+    def _open_snapshot(self):
+        """Первая загрузка: снимок, снятый с этого же файла, и курсор, на котором он снят"""
+        if not self._snapshot_path:
+            return
+        snapshot = UrlSnapshot.open(self._snapshot_path)
+        cursor = snapshot.source_cursor(self._backend) if snapshot else None
+        if cursor is None:
+            return
+        self._layers = empty_layers(snapshot)
+        self._expiry_heap = None
+        self._cursor = cursor
+        print(f"[INDEX] Opened snapshot {self._snapshot_path}: {len(snapshot)} URLs")
+
+    def _restore_pending(self):
+        """Полная перезагрузка не должна терять ссылки, которых ещё нет в файле"""
+        for code, (original_url, redirect, expires_at) in self._pending.items():
+            if self._lookup(code) != (original_url, redirect, expires_at):
+                self._set(code, original_url, redirect, expires_at)
+
+    def _replace_all(self, records):
+        """Полная загрузка: новый снимок (если включён) или CompactUrlStore целиком.
+
+        Новое состояние собирается в стороне и подменяется одним присваиванием.
+        """
+        live = list({item["id"]: item for item in records if not item.get("deleted")}.values())
+        self._expiry_heap = None
+        if self._snapshot_path:
+            try:
+                write_snapshot(self._snapshot_path, records_to_rows(live),
+                               backend_source(self._backend, self._cursor))
+                snapshot = UrlSnapshot.open(self._snapshot_path)
+                if snapshot is not None:
+                    self._layers = empty_layers(snapshot)
+                    self._dirty = False
+                    print(f"[INDEX] Loaded {len(snapshot)} URLs, snapshot saved to {self._snapshot_path}")
+                    return
+            except Exception as e:
+                print(f"[INDEX ERROR] Failed to write snapshot: {e}")
+
+        layers = empty_layers()
+        for item in live:
+            layers.store.put(item["id"], item["original_url"], not item.get("expires_at"))
+            if item.get("redirect"):
+                layers.redirects[item["id"]] = item["redirect"]
+            if item.get("expires_at"):
+                layers.expires[item["id"]] = item["expires_at"]
+        self._layers = layers
+        self._dirty = True
+        print(f"[INDEX] Loaded {len(layers.store)} URLs")
+
+    def _set(self, code: str, original_url: str, redirect: Optional[int] = None, expires_at: Optional[int] = None):
+        layers = self._layers
+        # Ссылка со сроком жизни не участвует в дедупликации
+        layers.store.put(code, original_url, not expires_at)
+        if redirect:
+            layers.redirects[code] = redirect
+        else:
+            layers.redirects.pop(code, None)
+        if expires_at:
+            layers.expires[code] = expires_at
+            if self._expiry_heap is not None:
+                heapq.heappush(self._expiry_heap, (expires_at, code))
+        else:
+            layers.expires.pop(code, None)
+        if layers.base is not None and code in layers.base:
+            layers.hidden.add(code)
+
+    def _remove(self, code: str) -> bool:
+        layers = self._layers
+        layers.redirects.pop(code, None)
+        layers.expires.pop(code, None)
+        removed = layers.store.remove(code)
+        if layers.base is not None and code not in layers.hidden and code in layers.base:
+            layers.hidden.add(code)
+            removed = True
+        return removed
+
+    def _lookup(self, code: str) -> Tuple[Optional[str], Optional[int], Optional[int]]:
+        """(original_url, redirect, expires_at): сначала изменения, потом снимок"""
+        base, store, hidden, redirects, expires = self._layers
+        original_url = store.get(code)
+        if original_url is not None:
+            return original_url, redirects.get(code), expires.get(code)
+        if base is None or code in hidden:
+            return None, None, None
+        return base.lookup(code)
+
+    def _count(self) -> int:
+        base, store, hidden, _, _ = self._layers
+        return (len(base) - len(hidden) if base is not None else 0) + len(store)
+
+    def _maybe_reload(self):
+        """Проверяем файл не чаще одного раза в check_interval секунд.
+
+        Ждёт чтения только первая загрузка; дальше на запросе лишь stat(), а
+        изменённый файл перечитывает фоновый поток - до его окончания запросы
+        отвечают по прежнему состоянию индекса.
+        """
+        now = time.monotonic()
+        if self._loaded and now < self._next_check:
+            return
+        self._next_check = now + self._check_interval
+        if not self._loaded:
+            self.reload()
+            return
+        if self._backend.current_cursor() == self._cursor or not self._reloading.acquire(blocking=False):
+            return
+        threading.Thread(target=self._reload_in_background, daemon=True, name="url-index-reload").start()
+
+    def _reload_in_background(self):
+        try:
+            self.reload()
+        finally:
+            self._reloading.release()
+
+    @property
+    def loaded(self) -> bool:
+        """Первая загрузка выполнена: дальше поиск не читает файл"""
+        return self._loaded
+
+    def get(self, code: str) -> Optional[str]:
+        self._maybe_reload()
+        return self._lookup(code)[0]
+
+    def lookup(self, code: str) -> Tuple[Optional[str], Optional[int], Optional[int]]:
+        """(original_url, redirect, expires_at) одним поиском - для редиректа"""
+        self._maybe_reload()
+        return self._lookup(code)
+
+    def find_code(self, original_url: str) -> Optional[str]:
+        """Код, под которым этот URL (после нормализации) уже сокращён"""
+        self._maybe_reload()
+        base, store, hidden, _, _ = self._layers
+        code = store.find_code(original_url)
+        if code is None and base is not None:
+            code = base.find_code(original_url)
+            if code in hidden:
+                return None
+        return code
+
+    def page(self, cursor: int, limit: int) -> Tuple[List[Tuple[str, str]], Optional[int]]:
+        """Страница (code, original_url) и следующий курсор (None - конец).
+        Курсор идёт сначала по снимку, затем по изменениям после него."""
+        self._maybe_reload()
+        base, store, hidden, _, _ = self._layers
+        base_end = base.positions if base is not None else 0
+        items = []
+        while cursor < base_end and len(items) < limit:
+            chunk, next_cursor = base.page(cursor, limit - len(items))
+            items.extend(item for item in chunk if item[0] not in hidden)
+            cursor = base_end if next_cursor is None else next_cursor
+        if len(items) < limit:
+            chunk, next_cursor = store.page(cursor - base_end, limit - len(items))
+            items.extend(chunk)
+            return items, None if next_cursor is None else base_end + next_cursor
+        return items, cursor if cursor < base_end or len(store) else None
+
+    def __contains__(self, code: str) -> bool:
+        self._maybe_reload()
+        return self._lookup(code)[0] is not None
+
+    @property
+    def size(self) -> int:
+        """Текущий размер без повторной проверки файла - для health-проб"""
+        if not self._loaded:
+            self.reload()
+        return self._count()
+
+    def __len__(self) -> int:
+        self._maybe_reload()
+        return self._count()
+
+    def put(self, code: str, original_url: str, redirect: Optional[int] = None, written=None,
+            expires_at: Optional[int] = None, pending: bool = False):
+        """Обновляем индекс на месте после записи в файл.
+
+        written - (курсор до, курсор после), которые вернул бэкенд без инкрементального
+        чтения: если до нашей записи файл был на нашем курсоре, полная перезагрузка
+        не нужна. Иначе между ними писал другой процесс - перечитаем файл.
+        pending=True - запись в файл ещё впереди (file_writer), до неё ссылку
+        не убирает и полная перезагрузка индекса.
+        """
+        with self._write_lock:
+            self._set(code, original_url, redirect, expires_at)
+            if pending:
+                self._pending[code] = (original_url, redirect, expires_at)
+            self._dirty = True
+            self._advance_cursor(written)
+
+    def persisted(self, urls: List[Url], written=None):
+        """file_writer записал эти ссылки: индекс больше не держит их отдельно"""
+        with self._write_lock:
+            for url in urls:
+                if self._pending.get(url.id) == (url.original_url, url.redirect or None, url.expires_at or None):
+                    del self._pending[url.id]
+            self._advance_cursor(written)
+
+    def remove(self, code: str, written=None):
+        """Убираем ссылку из индекса после удаления из файла (written - как в put)"""
+        with self._write_lock:
+            self._pending.pop(code, None)
+            if self._remove(code):
+                self._dirty = True
+            self._advance_cursor(written)
+
+    def _advance_cursor(self, written):
+        if self._loaded and not self._backend.incremental and written and self._cursor == written[0]:
+            self._cursor = written[1]
+
+    def pop_expired(self, now: Optional[float] = None, limit: int = 1000) -> List[str]:
+        """Коды ссылок, срок которых истёк к now (не больше limit), в порядке истечения.
+
+        Куча строится один раз (снимок + изменения), дальше пополняется в _set(); записи
+        изменённых и удалённых ссылок не вычищаются, а пропускаются при извлечении.
+        Из индекса коды не убираются - это делает remove() после записи в файл.
+        """
+        now = time.time() if now is None else now
+        self._maybe_reload()
+        with self._write_lock:
+            if self._expiry_heap is None:
+                base, store, hidden, _, expires = self._layers
+                heap = [(expires_at, code) for code, expires_at in expires.items()]
+                if base is not None:
+                    heap.extend(item for item in base.expiring() if item[1] not in hidden)
+                heapq.heapify(heap)
+                self._expiry_heap = heap
+            heap = self._expiry_heap
+            due = []
+            while heap and heap[0][0] <= now and len(due) < limit:
+                expires_at, code = heapq.heappop(heap)
+                if self._lookup(code)[2] == expires_at:
+                    due.append(code)
+            return due
+
+    def reset_expiry_queue(self):
+        """Очередь соберётся заново при следующем pop_expired(): извлечённые коды,
+        которые не удалось удалить из файла, вернутся в неё"""
+        with self._write_lock:
+            self._expiry_heap = None
+
+    def save_snapshot(self):
+        """Сохраняем текущее состояние в снимок (при остановке), чтобы следующий старт
+        применял к нему только хвост файла"""
+        if not self._snapshot_path or not self._dirty or self._cursor is None:
+            return
+        with self._write_lock:
+            base, store, hidden, redirects, expires = self._layers
+            overlay = sorted((code, url, redirects.get(code), None, expires.get(code))
+                             for code, url in store.items())
+            rows = overlay
+            if base is not None:
+                kept = (row for row in base.rows() if row[0] not in hidden)
+                rows = heapq.merge(kept, overlay, key=lambda row: row[0])
+            try:
+                count = write_snapshot(self._snapshot_path, rows, backend_source(self._backend, self._cursor))
+                self._dirty = False
+                print(f"[INDEX] Snapshot saved: {count} URLs")
+            except Exception as e:
+                print(f"[INDEX ERROR] Failed to write snapshot: {e}")
+
+
+# Глобальный индекс
+url_index = UrlIndex(snapshot_path=default_snapshot_path() if SNAPSHOT_ENABLED else None)
+atexit.register(url_index.save_snapshot)
+
+# Групповая запись новых ссылок в файл (режим file); flush при выходе - раньше
+# save_snapshot (atexit вызывает в обратном порядке), чтобы снимок включал их
+file_writer = BackgroundFileWriter(file_backend, name="primary", on_written=url_index.persisted)
@@ -1,16 +1,52 @@
 import os
-import json
-import threading
+import time
+import hashlib
 import asyncio
-from typing import List, Dict, Any
+from dataclasses import fields
+from typing import List, Dict, Any, Optional, Set, Tuple
+from ashredis import MISSING, DefaultKeys
 from BANNED_FILES.config import redis_manager, DATA_FILE
+from config.redis_manager import redis_shards
 from redis_storage.url import Url
+from protocol.file_backends import file_backend, record_to_url
+from protocol.compact_store import CompactUrlStore
+from protocol.code_filter import code_filter
+from protocol.sharding import pipeline_by_key, read_by_key, write_by_key, gather_shards, move_keys
+from protocol.url_index import url_index, file_writer
+from protocol.analytics import REDIS_CLICKS_PREFIX
+from protocol.change_feed import ChangeFeed
+from config.settings import (
+    STORAGE_MODE, LEADER_LOCK_FILE, LEADER_RETRY_INTERVAL,
+    SAVE_CHUNK_SIZE, SAVE_CONCURRENCY, SAVE_RETRIES, SAVE_RETRY_DELAY, SAVE_PROGRESS_INTERVAL,
+    EXPIRY_SWEEP_INTERVAL, EXPIRY_SWEEP_BATCH, CHANGE_FEED_RETRY_INTERVAL, CHANGE_FEED_MAXLEN,
+    CHANGE_FEED_TRIM_INTERVAL, FILE_MONITOR_INTERVAL, REDIS_MONITOR_FALLBACK_INTERVAL,
+)
+from utils.helpers import url_digest, is_expired
+from utils.metrics import SyncRun
+from utils.process_lock import HostLeader
 
-lock = threading.Lock()
-
-# Константа для stream key
+# Константа для stream key (свой stream на каждом шарде - рядом с хешами ссылок).
+# Это лента изменений: событие на каждое создание, изменение и удаление ссылки
 REDIS_STREAM_KEY = "urls_stream"
 
+# Хеш url_digest(original_url) -> short_code для дедупликации (на шарде-владельце digest)
+REDIS_DIGEST_KEY = "urls_by_digest"
+
+# Ключи ниже - одни на систему, всегда на redis_manager
+
+# Счётчик для выдачи коротких кодов (INCRBY)
+REDIS_COUNTER_KEY = "urls_code_counter"
+
+# Поддерживаемое число ссылок: health и мониторы не перебирают данные
+REDIS_COUNT_KEY = "urls_count"
+
+# Версия набора данных: INCR при каждом изменении, мониторы сравнивают только её
+REDIS_VERSION_KEY = "urls_version"
+
+# Очередь истечения: sorted set code -> expires_at. Хеши Url:<code> удаляет сам Redis
+# по TTL, а по очереди фоновый проход снимает их со счётчика и удаляет клики
+REDIS_EXPIRING_KEY = "urls_expiring"
+
 # ---------------------------
 # GLOBAL STATE MANAGEMENT
 # ---------------------------
@@ -35,6 +71,21 @@ class AppState:
     def set_monitoring_active(cls, active: bool):
         cls._monitoring_active = active
 
+# ---------------------------
+# SYNC STATE
+# ---------------------------
+
+# code -> sync_digest ссылок, которые уже одинаковы в файле и в Redis.
+# Оба монитора сверяются с ним, поэтому запись, пришедшая с одной стороны,
+# не отправляется обратно. Поиск по URL здесь не нужен - без обратного индекса.
+sync_view = CompactUrlStore(index_originals=False)
+
+def sync_digest(url: Url) -> str:
+    """Отпечаток всех синхронизируемых полей: изменение редиректа или срока
+    жизни тоже должно дойти до другой стороны, а не только смена URL"""
+    data = f"{url.original_url}\n{url.redirect or ''}\n{url.expires_at or ''}"
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=8).hexdigest()
+
 # ---------------------------
 # OPTIMIZED FILE MONITORING
 # ---------------------------
@@ -44,16 +95,11 @@ class OptimizedFileMonitor:
         self._last_modified = 0
         self._file_size = 0
         self._monitoring = False
+        self._cursor = None  # позиция файла, до которой всё уже в Redis
         
     def get_file_info(self) -> tuple:
         """Получаем базовую информацию о файле (быстрее чем хеш)"""
-        if not os.path.exists(DATA_FILE):
-            return (0, 0)
-        try:
-            stat = os.stat(DATA_FILE)
-            return (stat.st_mtime, stat.st_size)
-        except Exception:
-            return (0, 0)
+        return file_backend.get_file_info()
     
     def has_file_changed(self) -> bool:
         """Быстрая проверка изменений файла"""
@@ -66,14 +112,18 @@ class OptimizedFileMonitor:
             return True
         return False
     
-    async def start_monitoring(self, interval: int = 10):  # Увеличил интервал до 10 сек
-        """Запускаем мониторинг с оптимизацией"""
+    async def start_monitoring(self, interval: float = FILE_MONITOR_INTERVAL):
+        """Запускаем мониторинг с оптимизацией.
+
+        Ленты у локального файла нет, поэтому опрос остаётся, но это stat()
+        раз в interval секунд; файл читается только после изменения.
+        """
         if self._monitoring:
             return
             
         self._monitoring = True
         AppState.set_monitoring_active(True)
-        print("[FILE MONITOR] Started optimized monitoring (10s interval)")
+        print(f"[FILE MONITOR] Started optimized monitoring ({interval:g}s interval)")
         
         consecutive_errors = 0
         max_errors = 3
@@ -98,6 +148,14 @@ class OptimizedFileMonitor:
                     
                 await asyncio.sleep(interval)
     
+    def skip_own_write(self, written):
+        """Запись монитора Redis - не внешнее изменение, если до неё монитор видел
+        файл таким же; иначе между ними была чужая запись, и файл нужно прочитать.
+        written - курсоры (до, после) от JSON-бэкенда; лог их не возвращает, но его
+        хвост читается инкрементально, и свои записи отсекает sync_view"""
+        if written and (self._last_modified, self._file_size) == written[0]:
+            self._last_modified, self._file_size = written[1]
+
     def stop_monitoring(self):
         """Останавливаем мониторинг"""
         self._monitoring = False
@@ -105,44 +163,79 @@ class OptimizedFileMonitor:
         print("[FILE MONITOR] Stopped monitoring")
 
     async def sync_file_to_redis(self):
-        """Оптимизированная синхронизация файла в Redis"""
-        try:
-            file_urls = load_file()
-            if not file_urls:
-                return
-                
-            redis_urls = await load_all()
-            
-            # Быстрое сравнение по количеству
-            if len(file_urls) != len(redis_urls):
-                print(f"[SYNC] Different count: file={len(file_urls)}, redis={len(redis_urls)}")
-                await save_many(file_urls)
-                return
-            
-            # Детальное сравнение только если количество совпадает
-            file_dict = {url.id: url for url in file_urls}
-            redis_dict = {url.id: url for url in redis_urls}
-            
-            changes_found = False
-            
-            # Проверяем только изменения
-            for url_id in file_dict:
-                if url_id not in redis_dict:
-                    changes_found = True
-                    break
-                if (file_dict[url_id].original_url != redis_dict[url_id].original_url or 
-                    file_dict[url_id].short_id != redis_dict[url_id].short_id):
-                    changes_found = True
-                    break
-            
-            if changes_found:
-                print("[SYNC] Changes detected, updating Redis")
-                await save_many(file_urls)
+        """Отправляем в Redis только записи, изменившиеся в файле с прошлого раза.
+
+        Курсор файла - offset в логе (или mtime/size для JSON, тогда файл читается
+        целиком, но в Redis всё равно уходит только разница с sync_view
+        по всем синхронизируемым полям, см. sync_digest).
+        Возвращает число отправленных записей.
+        """
+        with SyncRun("file_to_redis") as run:
+            try:
+                records, cursor, full = file_backend.read_changes(self._cursor)
+                if records is None:
+                    self._cursor = cursor
+                    return 0
+
+                urls = [record_to_url(r) for r in records if not r.get("deleted")]
+                changed = [url for url in urls if sync_view.get(url.id) != sync_digest(url)]
+                deleted = [r["id"] for r in records if r.get("deleted") and r["id"] in sync_view]
+
+                if changed:
+                    # sync_view обновляем до записи: событие ленты будит монитор Redis
+                    # сразу после XADD, и наши записи не должны вернуться в файл второй раз
+                    previous = self._mark_synced(changed)
+                    try:
+                        saved = await save_many(changed)
+                    except Exception:
+                        self._restore(previous, previous)
+                        raise
+                    self._restore(previous, saved.failed)
+                    if not saved:
+                        # Курсор не двигаем и повторяем на следующей проверке:
+                        # уйдут только несохранённые записи (остальные уже в sync_view)
+                        self._last_modified = 0
+                        run.failed = True
+                        return 0
+                if deleted:
+                    previous = {code: sync_view.get(code) for code in deleted}
+                    for code in deleted:
+                        sync_view.remove(code)
+                    try:
+                        await delete_many(deleted)
+                    except Exception:
+                        self._restore(previous, previous)
+                        raise
+
+                self._cursor = cursor
+                run.records = len(changed) + len(deleted)
+                if changed or deleted:
+                    print(f"[SYNC] File -> Redis: {len(changed)} changed, {len(deleted)} deleted")
+                else:
+                    print("[SYNC] No changes detected")
+                return run.records
+
+            except Exception as e:
+                run.failed = True
+                print(f"[SYNC ERROR] Failed to sync file to Redis: {e}")
+                return 0
+
+    @staticmethod
+    def _mark_synced(urls: List[Url]) -> Dict[str, Optional[str]]:
+        """Заносим ссылки в sync_view; возвращаем прежние отпечатки для отката"""
+        previous = {url.id: sync_view.get(url.id) for url in urls}
+        for url in urls:
+            sync_view.put(url.id, sync_digest(url))
+        return previous
+
+    @staticmethod
+    def _restore(previous: Dict[str, Optional[str]], codes):
+        """Откат sync_view для кодов, которые не дошли до Redis"""
+        for code in codes:
+            if previous[code] is None:
+                sync_view.remove(code)
             else:
-                print("[SYNC] No changes detected")
-                
-        except Exception as e:
-            print(f"[SYNC ERROR] Failed to sync file to Redis: {e}")
+                sync_view.put(code, previous[code])
 
 # Создаем оптимизированный монитор
 file_monitor = OptimizedFileMonitor()
@@ -154,113 +247,154 @@ file_monitor = OptimizedFileMonitor()
 class LazyRedisMonitor:
     def __init__(self):
         self._monitoring = False
-        self._last_url_count = 0
+        self._last_stream_id = {}  # шард -> последнее событие его urls_stream, уже записанное в файл
+        self._last_version = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._full_sync = False
         
-    async def start_monitoring(self, interval: int = 15):  # Увеличил интервал до 15 сек
-        """Ленивый мониторинг Redis - только при изменениях"""
+    async def start_monitoring(self, fallback_interval: float = REDIS_MONITOR_FALLBACK_INTERVAL):
+        """Синхронизация Redis -> файл по событиям ленты изменений.
+
+        Раз в fallback_interval секунд без событий сверяем версию набора:
+        страховка на случай, если чтение ленты отвалилось.
+        """
         if self._monitoring:
             return
             
         self._monitoring = True
-        print("[REDIS MONITOR] Started lazy monitoring (15s interval)")
+        self._wakeup = asyncio.Event()
+        change_feed.subscribe(self.on_changes)
+        change_feed.start()
+        print(f"[REDIS MONITOR] Following change feed ({fallback_interval:g}s fallback check)")
         
         while self._monitoring:
             try:
-                current_count = await get_url_count()
-                
-                # Синхронизируем только если количество изменилось
-                if current_count != self._last_url_count:
-                    print(f"[REDIS MONITOR] Count changed: {self._last_url_count} -> {current_count}")
-                    await self.sync_redis_to_file()
-                    self._last_url_count = current_count
-                # Или если мониторинг файла не активен (на случай если файл изменился вне системы)
-                elif not AppState.is_monitoring_active():
-                    await self.sync_redis_to_file()
-                
-                await asyncio.sleep(interval)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), fallback_interval)
+                except asyncio.TimeoutError:
+                    # GET одного ключа вместо чтения stream
+                    if await get_version() == self._last_version:
+                        continue
+                    print("[REDIS MONITOR] Version changed without feed events")
+                self._wakeup.clear()
+                # Версию запоминаем до синхронизации: изменения во время неё придут событием
+                self._last_version = await get_version()
+                await self.sync_redis_to_file()
                 
             except Exception as e:
                 print(f"[REDIS MONITOR ERROR] {e}")
-                await asyncio.sleep(interval)
+                await asyncio.sleep(CHANGE_FEED_RETRY_INTERVAL)
+
+    async def on_changes(self, changes: Optional[List[Tuple[str, str]]]):
+        """Подписчик ленты: будим цикл монитора; changes = None - лента подрезана"""
+        if changes is None:
+            self._full_sync = True
+        if self._wakeup is not None:
+            self._wakeup.set()
     
     def stop_monitoring(self):
         """Останавливаем мониторинг"""
         self._monitoring = False
         print("[REDIS MONITOR] Stopped monitoring")
     
-    async def sync_redis_to_file(self):
-        """Синхронизируем Redis в файл только при необходимости"""
-        try:
-            redis_urls = await load_all()
-            save_file(redis_urls)
-            print(f"[REDIS SYNC] Synced {len(redis_urls)} URLs to file")
-        except Exception as e:
-            print(f"[REDIS SYNC ERROR] {e}")
+    async def sync_redis_to_file(self, batch: int = 1000):
+        """Переносим в файл изменения из событий stream после _last_stream_id:
+        изменённые записи заменяем по id, пропавшие из Redis (удаление, истечение) удаляем.
+        Возвращает число перенесённых записей."""
+        with SyncRun("redis_to_file") as run:
+            try:
+                if self._full_sync:
+                    # Непрочитанные события подрезаны: сверяем с файлом весь набор
+                    self._full_sync = False
+                    position = await get_last_stream_id()
+                    run.records += self.apply_to_file(await load_all(), [])
+                    self._last_stream_id = position
+
+                while True:
+                    codes, position = await read_stream_since(self._last_stream_id, batch)
+                    if position == self._last_stream_id:
+                        break
+
+                    urls = await load_many(codes)
+                    found = {url.id for url in urls}
+                    # Уже удалённое из файла (проход истечения) второй раз не удаляем
+                    removed = [code for code in codes if code not in found and code in sync_view and code in url_index]
+                    run.records += self.apply_to_file(urls, removed)
+                    self._last_stream_id = position
+
+                if run.records:
+                    print(f"[REDIS SYNC] Applied {run.records} URL changes to file")
+            except Exception as e:
+                run.failed = True
+                print(f"[REDIS SYNC ERROR] {e}")
+            return run.records
+
+    def apply_to_file(self, urls: List[Url], removed: List[str]) -> int:
+        changed = [u for u in urls if sync_view.get(u.id) != sync_digest(u)]
+        if changed:
+            # Запись уже может быть в файле (изменился редирект или срок) - заменяем по id
+            written = file_backend.upsert_many(changed)
+            file_monitor.skip_own_write(written)
+            for url in changed:
+                sync_view.put(url.id, sync_digest(url))
+                # Индекс узнаёт о ссылке сразу, а не со следующей перезагрузкой: иначе
+                # удаление вслед за созданием не прошло бы проверку code in url_index
+                url_index.put(url.id, url.original_url, url.redirect or None, written, url.expires_at or None)
+        if removed:
+            written = file_backend.delete_many(removed)
+            file_monitor.skip_own_write(written)
+            for code in removed:
+                sync_view.remove(code)
+                url_index.remove(code, written)
+        return len(changed) + len(removed)
 
 # Создаем ленивый монитор Redis
 redis_monitor = LazyRedisMonitor()
 
 # ---------------------------
-# FILE OPERATIONS (без изменений)
+# REDIS OPERATIONS
 # ---------------------------
 
-def load_file() -> List[Url]:
-    """Загрузка URL из файла"""
-    if not os.path.exists(DATA_FILE):
-        return []
-    with lock:
-        try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                urls = []
-                for item in data:
-                    url = Url(
-                        id=item["id"],
-                        original_url=item["original_url"],
-                        short_id=item.get("short_id", f"https://url.muhamedlabs.pro/{item['id']}")
-                    )
-                    urls.append(url)
-                return urls
-        except Exception as e:
-            print("[FILE LOAD ERROR]", e)
-            return []
+async def load_sync_baseline():
+    """Заливаем файл в Redis и ставим точки отсчёта мониторов (только лидер на машине)"""
+    records, cursor, _ = file_backend.read_changes(None)
+    # Истёкшие, но ещё не удалённые из файла ссылки в Redis не нужны
+    urls = [record_to_url(r) for r in records or [] if not is_expired(r.get("expires_at"))]
+    failed = set()
 
-def save_file(urls: List[Url]):
-    """Сохраняем URL в файл"""
-    with lock:
-        try:
-            # Обновляем метки монитора чтобы избежать цикла
-            file_monitor._last_modified, file_monitor._file_size = file_monitor.get_file_info()
-            
-            with open(DATA_FILE, "w", encoding="utf-8") as f:
-                data_to_save = []
-                for url in urls:
-                    data_to_save.append({
-                        "id": url.id,
-                        "original_url": url.original_url,
-                        "short_id": url.short_id
-                    })
-                
-                json.dump(data_to_save, f, ensure_ascii=False, indent=4)
-            
-            print(f"[FILE] Saved {len(urls)} URLs to file")
-        except Exception as e:
-            print("[FILE SAVE ERROR]", e)
+    # В режиме redis файл - лишь бэкап: заливаем его только в пустой Redis
+    if STORAGE_MODE == "redis" and await get_url_count() > 0:
+        print("[SYNC] Redis is primary store, skipping file -> Redis load")
+    else:
+        if urls:
+            # Совпадающие с Redis записи save_many пропускает: после перезапуска
+            # посреди загрузки уходит только то, что не успело сохраниться
+            failed = (await save_many(urls)).failed
+        print(f"[SYNC] Loaded {len(urls) - len(failed)} URLs from file into Redis.")
 
-# ---------------------------
-# REDIS OPERATIONS
-# ---------------------------
+    # Точки отсчёта для инкрементальной синхронизации
+    sync_view.clear()
+    for url in urls:
+        if url.id not in failed:
+            sync_view.put(url.id, sync_digest(url))
+    if failed:
+        # Несохранённое дошлёт монитор файла: полное чтение, разница с sync_view
+        file_monitor._cursor = None
+        file_monitor._last_modified, file_monitor._file_size = 0, 0
+    else:
+        file_monitor._cursor = cursor
+        file_monitor._last_modified, file_monitor._file_size = file_monitor.get_file_info()
+    redis_monitor._last_stream_id = await get_last_stream_id()
+    redis_monitor._last_version = await get_version()
 
-async def initialize_system():
-    """Инициализация системы"""
+async def initialize_system(leader: bool = True):
+    """Инициализация системы; воркеру, который не лидер, хватает соединения с Redis"""
     try:
-        await redis_manager.init_connection()
+        await redis_shards.init_connection()
         print("[REDIS] Redis is ready")
-        
-        urls = load_file()
-        if urls:
-            await save_many(urls)
-        print(f"[SYNC] Loaded {len(urls)} URLs from file into Redis.")
+
+        if leader:
+            await load_sync_baseline()
         
         AppState.set_initialized()
         print("[SYSTEM] System initialized and ready")
@@ -270,92 +404,575 @@ async def initialize_system():
         print(f"[SYSTEM INIT ERROR] {e}")
         return False
 
-async def load_file_to_redis():
-    """Для обратной совместимости"""
-    return await initialize_system()
+# ---------------------------
+# HOST LEADERSHIP
+# ---------------------------
+
+# Мониторы и обслуживание ленты нужны одни на машину, а не на каждый воркер gunicorn
+host_leader = HostLeader(LEADER_LOCK_FILE or os.path.splitext(DATA_FILE)[0] + ".leader.lock")
+
+async def lead_background_sync(retry_interval: float = LEADER_RETRY_INTERVAL):
+    """Фоновая синхронизация файл <-> Redis в процессе-лидере.
+
+    Остальные воркеры ждут лок и перехватывают работу, если лидер завершится.
+    """
+    if not host_leader.is_leader:
+        print(f"[MONITOR] Worker {os.getpid()}: background sync runs in another process")
+        while not host_leader.try_acquire():
+            await asyncio.sleep(retry_interval)
+        print(f"[MONITOR] Worker {os.getpid()} took over background sync")
+        try:
+            await load_sync_baseline()
+        except Exception as e:
+            # Мониторы всё равно запускаем: они дошлют разницу со следующей проверкой
+            print(f"[SYNC ERROR] Failed to load sync baseline: {e}")
+
+    if STORAGE_MODE == "redis":
+        # Redis - основное хранилище, файл пишется в него сам как бэкап
+        print("[SYNC] Redis storage mode, file -> Redis sync disabled")
+        await asyncio.gather(expiry_sweeper(), trim_change_feed())
+        return
+
+    print("[MONITOR] Background monitoring started")
+    await asyncio.gather(
+        file_monitor.start_monitoring(), redis_monitor.start_monitoring(), expiry_sweeper(), trim_change_feed()
+    )
+
+# ---------------------------
+# LINK EXPIRATION
+# ---------------------------
+
+async def expiry_sweeper(interval: float = EXPIRY_SWEEP_INTERVAL, batch: int = EXPIRY_SWEEP_BATCH):
+    """Удаляем истёкшие ссылки порциями по batch (только лидер на машине).
+    Редирект их уже не отдаёт (см. find_by_code), здесь освобождается место"""
+    print(f"[EXPIRY] Sweeping expired URLs every {interval}s")
+    while True:
+        try:
+            # Полная порция - возможно, истёкших больше: дочищаем без паузы
+            while await sweep_expired(batch=batch) >= batch:
+                await asyncio.sleep(0)
+        except Exception as e:
+            print(f"[EXPIRY ERROR] {e}")
+        await asyncio.sleep(interval)
+
+async def sweep_expired(now: Optional[float] = None, batch: int = EXPIRY_SWEEP_BATCH) -> int:
+    """Один проход; возвращает число удалённых ссылок.
+
+    file:  коды из очереди истечения индекса (куча по expires_at), одна запись
+           в файл на порцию (в логе - строки-надгробия); монитор файла донесёт
+           удаление до Redis
+    redis: ключи уже удалил TTL; из очереди urls_expiring - счётчик и клики,
+           а в файле-бэкапе - те же надгробия
+    """
+    now = time.time() if now is None else now
+    if STORAGE_MODE == "redis":
+        codes = await expire_due(now, batch)
+        if codes:
+            await asyncio.to_thread(file_backend.delete_many, codes)
+    else:
+        codes = url_index.pop_expired(now, batch)
+        if codes:
+            try:
+                # Ещё не записанная ссылка легла бы в файл после своего удаления
+                await asyncio.to_thread(file_writer.flush)
+                written = await asyncio.to_thread(file_backend.delete_many, codes)
+            except Exception:
+                url_index.reset_expiry_queue()
+                raise
+            for code in codes:
+                url_index.remove(code, written)
+        if AppState.is_initialized():
+            await expire_due(now, batch)
+    if codes:
+        print(f"[EXPIRY] Removed {len(codes)} expired URLs")
+    return len(codes)
+
+async def expire_due(now: float, batch: int = EXPIRY_SWEEP_BATCH) -> List[str]:
+    """Снимаем с учёта ссылки из urls_expiring со сроком до now (не больше batch).
+
+    ZREM каждого кода: при нескольких машинах-лидерах счётчик уменьшает только
+    тот, чей ZREM удалил запись. Возвращает эти коды.
+    """
+    codes = await redis_manager.client.zrangebyscore(REDIS_EXPIRING_KEY, "-inf", int(now), start=0, num=batch)
+    if not codes:
+        return []
+    pipeline = redis_manager.client.pipeline()
+    for code in codes:
+        pipeline.zrem(REDIS_EXPIRING_KEY, code)
+    expired = [code for code, removed in zip(codes, await pipeline.execute()) if removed]
+    if expired:
+        await write_by_key(expired, lambda pipeline, i: pipeline.delete(f"{REDIS_CLICKS_PREFIX}:{expired[i]}"))
+        await append_changes(expired, "expire")
+        await mark_changed(-len(expired))
+    return expired
+
+async def apply_expiry(urls: List[Url], keys: List[str], new: Set[str]):
+    """TTL хешей Url:<code> по expires_at (EXPIREAT) и очередь urls_expiring.
+
+    У обновлённой бессрочной ссылки срок снимается (PERSIST): HSET его не сбрасывает.
+    Новым бессрочным ссылкам ничего делать не нужно.
+    """
+    targets = [i for i, (url, key) in enumerate(zip(urls, keys)) if url.expires_at or key not in new]
+    if not targets:
+        return
+    target_keys = [keys[i] for i in targets]
+
+    def command(pipeline, j):
+        url = urls[targets[j]]
+        if url.expires_at:
+            pipeline.expireat(url_key(target_keys[j]), url.expires_at)
+        else:
+            pipeline.persist(url_key(target_keys[j]))
+
+    await pipeline_by_key(target_keys, command)
+    expiring = {keys[i]: urls[i].expires_at for i in targets if urls[i].expires_at}
+    cleared = [keys[i] for i in targets if not urls[i].expires_at]
+    pipeline = redis_manager.client.pipeline()
+    if expiring:
+        pipeline.zadd(REDIS_EXPIRING_KEY, expiring)
+    if cleared:
+        pipeline.zrem(REDIS_EXPIRING_KEY, *cleared)
+    await pipeline.execute()
+
+# ---------------------------
+# CODE FILTER
+# ---------------------------
+
+async def rebuild_code_filter(count: int = 1000) -> str:
+    """Собираем фильтр по ключам Url:* (SCAN, без чтения хешей).
+
+    Возвращает позицию stream, снятую до обхода: созданное во время SCAN
+    фильтр дочитает из stream. Шарды обходятся параллельно.
+    """
+    position = await get_last_stream_id()
+    bloom = code_filter.new_filter(await get_url_count())
+
+    async def fill(manager):
+        async for code in scan_codes(manager, count):
+            bloom.add(code)
+
+    await gather_shards(fill)
+    code_filter.install(bloom)
+    return position
+
+async def maintain_code_filter():
+    """Фильтр кодов в каждом воркере (режим redis): сборка при старте, затем коды,
+    сохранённые другими процессами, - из ленты изменений, сразу после записи"""
+    if STORAGE_MODE != "redis" or not code_filter.enabled:
+        return
+    while True:
+        try:
+            position = await rebuild_code_filter()
+            break
+        except Exception as e:
+            print(f"[CODE FILTER ERROR] {e}")
+            await asyncio.sleep(CHANGE_FEED_RETRY_INTERVAL)
+    change_feed.subscribe(update_code_filter)
+    change_feed.start(position)
+
+def code_filter_rejects(code: str) -> bool:
+    """Код заведомо не существует. Фильтру и кешу промахов верим, только пока лента
+    изменений дочитана: иначе код, только что созданный другим процессом, получил бы
+    404 до того, как о нём узнает фильтр, - тогда спрашиваем Redis"""
+    return change_feed.live and code_filter.rejects(code)
+
+async def update_code_filter(changes: Optional[List[Tuple[str, str]]]):
+    """Подписчик ленты; удалённые коды остаются в фильтре до пересборки"""
+    if changes is None or code_filter.needs_rebuild:
+        await rebuild_code_filter()
+        return
+    for event, code in changes:
+        if event in ("save", "update"):
+            code_filter.add(code)
 
 # Остальные функции без изменений...
 async def save(url: Url) -> bool:
     try:
-        result = await redis_manager.save(url)
+        new_count = await count_new([url])
+        await redis_shards.for_key(url.id).save(url, key=url.id, stream_key=REDIS_STREAM_KEY)
+        await apply_expiry([url], [url.id], {url.id} if new_count else set())
+        await index_originals([url])
+        await mark_changed(new_count)
+        code_filter.add(url.id)
         print(f"[REDIS] Saved URL: {url.id}")
-        return result
+        return True
     except Exception as e:
         print(f"[REDIS SAVE ERROR] {e}")
         return False
 
-async def save_many(urls: List[Url], keys: List[str] = None) -> bool:
+async def save_many(urls: List[Url], keys: List[str] = None, chunk_size: int = SAVE_CHUNK_SIZE,
+                    concurrency: int = SAVE_CONCURRENCY) -> "SaveResult":
+    """Сохраняем пачками по chunk_size, не больше concurrency пачек одновременно.
+
+    Записи, которые уже лежат в Redis в том же виде, пропускаются, поэтому повторный
+    вызов после частичного сбоя дошлёт только остаток. Результат ложен, если хоть
+    одна пачка не сохранилась и после повторов (коды - в result.failed).
+    """
+    if keys is None:
+        keys = [u.id for u in urls]
+    result = SaveResult(len(urls))
+    starts = iter(range(0, len(urls), chunk_size))
+    next_report = time.monotonic() + SAVE_PROGRESS_INTERVAL
+
+    async def worker():
+        nonlocal next_report
+        # Общий итератор: каждую пачку берёт ровно один воркер
+        for start in starts:
+            await save_chunk(urls[start:start + chunk_size], keys[start:start + chunk_size], result)
+            if time.monotonic() >= next_report and result.done < result.total:
+                next_report = time.monotonic() + SAVE_PROGRESS_INTERVAL
+                print(f"[REDIS] save_many: {result.done}/{result.total} URLs")
+
+    workers = min(max(concurrency, 1), -(-len(urls) // chunk_size))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+    print(f"[REDIS] Saved {result.written} URLs, {result.skipped} unchanged")
+    if result.failed:
+        print(f"[REDIS SAVE_MANY ERROR] {len(result.failed)} URLs not saved")
+    return result
+
+# ---------------------------
+# BULK SAVE
+# ---------------------------
+
+# Поля хеша Url:<code>, по которым сохраняемая запись сравнивается с Redis
+URL_HASH_FIELDS = [f.name for f in fields(Url)]
+
+class SaveResult:
+    """Итог save_many; истинен, если сохранено всё"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.written = 0   # отправлено в Redis
+        self.skipped = 0   # уже были в Redis в том же виде
+        self.failed: Set[str] = set()  # коды из пачек, не сохранённых и после повторов
+
+    @property
+    def done(self) -> int:
+        return self.written + self.skipped + len(self.failed)
+
+    def __bool__(self) -> bool:
+        return not self.failed
+
+async def diff_chunk(urls: List[Url], keys: List[str]) -> Tuple[List[Url], List[str], Set[str]]:
+    """Отбрасываем записи, совпадающие с Redis (по pipeline HMGET на шард).
+
+    Возвращает (urls, keys) к записи и ключи тех из них, которых в Redis ещё нет.
+    """
+    stored = await read_by_key(
+        keys, lambda pipeline, i: pipeline.hmget(url_key(keys[i]), URL_HASH_FIELDS),
+        missing=lambda values: all(value is None for value in values)
+    )
+
+    pending, pending_keys, new = [], [], set()
+    for url, key, values in zip(urls, keys, stored):
+        data = url.to_hash()
+        expected = [None if data.get(name) is None else str(data[name]) for name in URL_HASH_FIELDS]
+        if values == expected:
+            continue
+        if all(value is None for value in values):
+            new.add(key)
+        pending.append(url)
+        pending_keys.append(key)
+    return pending, pending_keys, new
+
+async def save_chunk(urls: List[Url], keys: List[str], result: SaveResult) -> bool:
+    """Одна пачка: сравнение с Redis, запись одним pipeline, обратный индекс и счётчики.
+
+    Сравнение делается один раз: при повторе после сбоя пишется тот же набор,
+    иначе уже записанные хеши выглядели бы неизменными и не попали бы в счётчик.
+    """
+    diff = None
+    delay = SAVE_RETRY_DELAY
+    attempts = max(SAVE_RETRIES, 1)
+    for attempt in range(1, attempts + 1):
+        try:
+            if diff is None:
+                diff = await diff_chunk(urls, keys)
+            pending, pending_keys, new = diff
+            if pending:
+                await save_by_shard(pending, pending_keys)
+                await apply_expiry(pending, pending_keys, new)
+                await index_originals(pending)
+                await mark_changed(len(new))
+            for key in keys:
+                code_filter.add(key)
+            result.written += len(pending)
+            result.skipped += len(urls) - len(pending)
+            return True
+        except Exception as e:
+            print(f"[REDIS SAVE_MANY ERROR] Chunk of {len(urls)} URLs, attempt {attempt}/{attempts}: {e}")
+            if attempt < attempts:
+                await asyncio.sleep(delay)
+                delay *= 2
+    result.failed.update(keys)
+    return False
+
+async def save_by_shard(urls: List[Url], keys: List[str]):
+    """ashredis save_many на шарде каждой ссылки: хеш и событие stream - в одном pipeline шарда"""
+    groups: Dict[Any, Tuple[List[Url], List[str]]] = {}
+    for url, key in zip(urls, keys):
+        group = groups.setdefault(redis_shards.for_key(key), ([], []))
+        group[0].append(url)
+        group[1].append(key)
+    await asyncio.gather(*(
+        manager.save_many(group_urls, group_keys, stream_key=REDIS_STREAM_KEY)
+        for manager, (group_urls, group_keys) in groups.items()
+    ))
+
+async def count_new(urls: List[Url]) -> int:
+    """Сколько из этих ссылок ещё нет в Redis (по pipeline EXISTS на шард)"""
+    codes = [url.id for url in urls]
+    results = await read_by_key(codes, lambda pipeline, i: pipeline.exists(url_key(codes[i])))
+    return sum(1 for exists in results if not exists)
+
+async def existing_codes(codes: List[str]) -> Set[str]:
+    """Какие из кодов уже заняты: pipeline EXISTS на шард, коды, отсечённые
+    code_filter, в Redis не спрашиваем"""
+    candidates = [code for code in codes if not code_filter_rejects(code)]
+    if not candidates:
+        return set()
+    results = await read_by_key(candidates, lambda pipeline, i: pipeline.exists(url_key(candidates[i])))
+    return {code for code, exists in zip(candidates, results) if exists}
+
+async def mark_changed(count_delta: int = 0):
+    """Сдвигаем счётчик ссылок и версию набора данных одним pipeline"""
+    pipeline = redis_manager.client.pipeline()
+    if count_delta:
+        pipeline.incrby(REDIS_COUNT_KEY, count_delta)
+    pipeline.incr(REDIS_VERSION_KEY)
+    await pipeline.execute()
+
+async def get_version() -> int:
+    """O(1) признак изменений: монитору не нужно ничего загружать, если версия та же"""
+    value = await redis_manager.client.get(REDIS_VERSION_KEY)
+    return int(value or 0)
+
+async def recount_urls() -> int:
+    """Полный пересчёт через SCAN (шарды параллельно) - только если счётчика ещё нет"""
+    async def count(manager):
+        return sum([1 async for _ in scan_codes(manager)])
+
+    total = sum(await gather_shards(count))
+    await redis_manager.client.set(REDIS_COUNT_KEY, total)
+    print(f"[REDIS] Recounted {total} URLs")
+    return total
+
+async def ping() -> bool:
+    """Готовы, только если отвечают все шарды"""
+    async def ping_shard(manager):
+        return bool(manager.client and await manager.client.ping())
+
+    try:
+        return all(await gather_shards(ping_shard))
+    except Exception:
+        return False
+
+async def index_originals(urls: List[Url]):
+    """Заносим URL в обратный индекс; HSETNX не перезаписывает уже существующий код.
+    Индекс шардирован по digest: поле лежит в urls_by_digest шарда-владельца digest.
+    Ссылки со сроком жизни в индекс не попадают - дедупликация их не выдаёт."""
+    urls = [url for url in urls if not url.expires_at]
+    digests = [url_digest(url.original_url) for url in urls]
+    await pipeline_by_key(digests, lambda pipeline, i: pipeline.hsetnx(REDIS_DIGEST_KEY, digests[i], urls[i].id))
+
+async def find_code_by_original(original_url: str) -> Optional[str]:
+    """O(1) поиск уже сокращённого URL (с учётом нормализации)"""
     try:
-        if keys is None:
-            keys = [u.id for u in urls]
-        result = await redis_manager.save_many(urls, keys)
-        print(f"[REDIS] Saved {len(urls)} URLs")
-        return result
+        digest = url_digest(original_url)
+        code = await redis_shards.for_key(digest).client.hget(REDIS_DIGEST_KEY, digest)
+        previous = redis_shards.previous_for_key(digest)
+        if code is None and previous is not None:
+            code = await previous.client.hget(REDIS_DIGEST_KEY, digest)
+        return code
     except Exception as e:
-        print(f"[REDIS SAVE_MANY ERROR] {e}")
-        return False
+        print(f"[REDIS DIGEST ERROR] {e}")
+        return None
+
+async def reserve_codes(size: int = 1) -> int:
+    """Атомарно резервируем size значений счётчика кодов, возвращаем первое"""
+    end = await redis_manager.client.incrby(REDIS_COUNTER_KEY, size)
+    return end - size
 
-async def load(key: str) -> Url:
+async def load_url(code: str) -> Optional[Url]:
+    """HGETALL на шарде-владельце; на время переезда - ещё и у прежнего владельца"""
+    url = await redis_shards.for_key(code).load(Url, code)
+    previous = redis_shards.previous_for_key(code)
+    if url is None and previous is not None:
+        url = await previous.load(Url, code)
+    return url
+
+async def load_existing(code: str) -> Optional[Url]:
+    """load_url() для поиска по коду из запроса: заведомо несуществующие коды
+    отсекает code_filter, промах запоминается в его кеше"""
+    if code_filter_rejects(code):
+        return None
     try:
-        return await redis_manager.load(key, Url)
+        url = await load_url(code)
     except Exception as e:
         print(f"[REDIS LOAD ERROR] {e}")
         return None
+    if url is None:
+        code_filter.remember_miss(code)
+    return url
+
+async def set_redirect(code: str, redirect: Optional[int]):
+    """Меняем политику редиректа ссылки; None - вернуть глобальный REDIRECT_STATUS"""
+    owner = redis_shards.for_key(code)
+    previous = redis_shards.previous_for_key(code)
+    if previous is not None:
+        # Иначе HSET создал бы у нового владельца хеш из одного поля redirect
+        await move_keys(previous, owner, [url_key(code)])
+    if redirect:
+        await owner.client.hset(url_key(code), "redirect", redirect)
+    else:
+        await owner.client.hdel(url_key(code), "redirect")
+    await append_changes([code], "update")
+    await mark_changed()
+
+def stream_name() -> str:
+    """Полное имя stream, в который ashredis пишет события save/update"""
+    return f"{Url.category()}:{REDIS_STREAM_KEY}:{DefaultKeys.STREAM_KEY.value}"
+
+# Лента изменений процесса: читается с первого start() (мониторы, фильтр кодов)
+change_feed = ChangeFeed(stream_name())
+
+async def append_changes(codes: List[str], event: str):
+    """События в ленту для изменений мимо ashredis save (редирект, удаление, истечение)"""
+    await pipeline_by_key(
+        codes, lambda pipeline, i: pipeline.xadd(stream_name(), {"event": event, "hash_key": url_key(codes[i])})
+    )
+
+async def trim_change_feed(interval: float = CHANGE_FEED_TRIM_INTERVAL, maxlen: int = CHANGE_FEED_MAXLEN):
+    """Лидер держит ленту каждого шарда примерно в maxlen событий (XTRIM ~).
+
+    Отставший сильнее читатель заметит разрыв и перечитает набор целиком.
+    """
+    while True:
+        try:
+            await gather_shards(lambda manager: manager.client.xtrim(stream_name(), maxlen=maxlen, approximate=True))
+        except Exception as e:
+            print(f"[CHANGE FEED ERROR] Trim failed: {e}")
+        await asyncio.sleep(interval)
+
+async def get_last_stream_id() -> Dict[str, str]:
+    """Позиция stream: шард -> id его последнего события"""
+    async def last_id(manager):
+        entries = await manager.client.xrevrange(stream_name(), count=1)
+        return manager.name, entries[0][0] if entries else "0-0"
+
+    return dict(await gather_shards(last_id))
+
+async def read_stream_since(position: Dict[str, str], count: Optional[int] = 1000) -> Tuple[List[str], Dict[str, str]]:
+    """Коды из событий stream строго после position (до count событий с каждого шарда,
+    шарды параллельно; шарда нет в position - читаем с начала).
+
+    Возвращает (codes, новая позиция); позиция не сдвинулась - событий больше нет.
+    """
+    async def read(manager):
+        last_id = position.get(manager.name, "0-0")
+        return manager.name, await manager.client.xrange(stream_name(), f"({last_id}", "+", count=count)
+
+    position = dict(position)
+    codes, seen = [], set()
+    for name, entries in await gather_shards(read):
+        if not entries:
+            continue
+        position[name] = entries[-1][0]
+        for _, data in entries:
+            code = data.get("hash_key", "").split(":", 1)[-1]
+            if code and code not in seen:
+                seen.add(code)
+                codes.append(code)
+    return codes, position
+
+async def load_many(codes: List[str]) -> List[Url]:
+    """HGETALL по списку кодов (по pipeline на шард); отсутствующие пропускаются"""
+    results = await read_by_key(codes, lambda pipeline, i: pipeline.hgetall(url_key(codes[i])))
+    return [hash_to_url(data) for data in results if data]
+
+async def delete_many(codes: List[str]):
+    """Удаляем ссылки из Redis вместе с обратным индексом и счётчиком"""
+    urls = await load_many(codes)
+    if not urls:
+        return
+    found = [url.id for url in urls]
+    digests = [url_digest(url.original_url) for url in urls]
+    canonical = await read_by_key(digests, lambda pipeline, i: pipeline.hget(REDIS_DIGEST_KEY, digests[i]))
+    # Дубликат не должен снимать каноническую ссылку с обратного индекса
+    owned = [digest for digest, url, code in zip(digests, urls, canonical) if code == url.id]
+
+    await write_by_key(found, lambda pipeline, i: pipeline.delete(url_key(found[i])))
+    if owned:
+        await write_by_key(owned, lambda pipeline, i: pipeline.hdel(REDIS_DIGEST_KEY, owned[i]))
+    pipeline = redis_manager.client.pipeline()
+    pipeline.decrby(REDIS_COUNT_KEY, len(urls))
+    # Иначе проход истечения ещё раз уменьшил бы счётчик
+    pipeline.zrem(REDIS_EXPIRING_KEY, *found)
+    pipeline.incr(REDIS_VERSION_KEY)
+    await pipeline.execute()
+    await append_changes(found, "delete")
 
 async def load_all() -> List[Url]:
     try:
-        return await redis_manager.load_stream(REDIS_STREAM_KEY, Url)
+        # Коды по ключам Url:* всех шардов (SCAN) и их хеши у владельцев: лента подрезается
+        # и всех ссылок уже не содержит. На время переезда ключ бывает на двух шардах
+        async def collect(manager):
+            return [code async for code in scan_codes(manager)]
+
+        codes = list(dict.fromkeys(code for shard_codes in await gather_shards(collect) for code in shard_codes))
+        return await load_many(codes)
     except Exception as e:
         print(f"[REDIS LOAD_STREAM ERROR] {e}")
         return []
 
-async def get_url_count() -> int:
-    urls = await load_all()
-    return len(urls)
+def url_key(code: str) -> str:
+    return f"{Url.category()}:{code}"
 
-# ... остальные функции
+def hash_to_url(data: Dict[str, Any]) -> Url:
+    return Url(
+        id=data.get("id"),
+        original_url=data.get("original_url"),
+        short_id=data.get("short_id", MISSING),
+        redirect=int(data["redirect"]) if data.get("redirect") else MISSING,
+        expires_at=int(data["expires_at"]) if data.get("expires_at") else MISSING
+    )
 
-def create_url(short_id: str, original_url: str) -> Url:
-    full_short_url = f"https://url.muhamedlabs.pro/{short_id}"
-    return Url(id=short_id, original_url=original_url, short_id=full_short_url)
+async def scan_page(cursor: int = 0, count: int = 100) -> Tuple[List[Url], int]:
+    """Одна страница SCAN по хешам Url:* - без загрузки всего stream.
 
-async def get_original_url(short_id: str) -> str:
-    try:
-        url = await load(short_id)
-        return url.original_url if url else None
-    except Exception as e:
-        print(f"[REDIRECT ERROR] {e}")
-        return None
+    Возвращает (urls, next_cursor); next_cursor == 0 - обход завершён.
+    SCAN не гарантирует точный размер страницы. Шарды обходятся по очереди:
+    курсор = курсор SCAN шарда * число шардов + номер шарда.
+    """
+    shards = redis_shards.all
+    shard_cursor, index = divmod(cursor, len(shards))
+    client = shards[index].client
+    shard_cursor, keys = await client.scan(
+        shard_cursor, match=f"{Url.category()}:*", count=count, _type="hash"
+    )
+    if shard_cursor == 0:
+        index += 1
+        next_cursor = index if index < len(shards) else 0
+    else:
+        next_cursor = shard_cursor * len(shards) + index
+    if not keys:
+        return [], next_cursor
+    pipeline = client.pipeline()
+    for key in keys:
+        pipeline.hgetall(key)
+    results = await pipeline.execute()
+    return [hash_to_url(data) for data in results if data], next_cursor
 
-# ---------------------------
-# FLASK COMPATIBLE INITIALIZATION
-# ---------------------------
+async def scan_codes(manager, count: int = 1000):
+    """Коды всех ссылок шарда: SCAN только по ключам, без чтения хешей"""
+    prefix = f"{Url.category()}:"
+    async for key in manager.client.scan_iter(match=prefix + "*", count=count, _type="hash"):
+        yield key[len(prefix):]
 
-def init_sync():
-    """Синхронная инициализация для Flask"""
-    try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        success = loop.run_until_complete(initialize_system())
-        
-        # Запускаем мониторинг в фоне только если нужно
-        if success:
-            import threading
-            
-            def start_monitoring_async():
-                monitoring_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(monitoring_loop)
-                monitoring_loop.run_until_complete(file_monitor.start_monitoring())
-                monitoring_loop.run_until_complete(redis_monitor.start_monitoring())
-            
-            monitor_thread = threading.Thread(target=start_monitoring_async, daemon=True)
-            monitor_thread.start()
-            print("[MONITOR] Background monitoring started")
-        
-        loop.close()
-        return success
-        
-    except Exception as e:
-        print(f"[INIT SYNC ERROR] {e}")
-        return False
\ No newline at end of file
+async def get_url_count() -> int:
+    """O(1): читаем поддерживаемый счётчик вместо загрузки всех записей"""
+    value = await redis_manager.client.get(REDIS_COUNT_KEY)
+    if value is None:
+        return await recount_urls()
+    return int(value)
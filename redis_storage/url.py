@@ -7,3 +7,5 @@ class Url(RecordBase):
     id: str 
     short_id: Optional[str] = MISSING  # короткий ID как строка
     original_url: Optional[str] = MISSING  # URL как строка
+    redirect: Optional[int] = MISSING  # код редиректа 301/302/307/308, MISSING - глобальный REDIRECT_STATUS
+    expires_at: Optional[int] = MISSING  # unix-время (секунды), после которого ссылка не работает; MISSING - бессрочная
@@ -1,64 +1,342 @@
 import os
+import hmac
 import json
-import threading
-from flask import Blueprint, request, jsonify, redirect
-from utils.helpers import generate_short_code, is_valid_url
-from BANNED_FILES.config import RedisManager, DATA_FILE
+import time
+import hashlib
+from flask import Blueprint, Response, g, request, jsonify, redirect, stream_with_context
+from utils.helpers import is_valid_url, normalize_url, is_expired, CodeAllocator, LocalCounter
+from BANNED_FILES.config import DATA_FILE
+from ashredis import MISSING
 from redis_storage.url import Url  
+from protocol.file_backends import file_backend, file_backup
+from protocol.url_index import url_index, file_writer
+from protocol import url_storage as redis_store
+from protocol.analytics import click_aggregator
+from config.redis_manager import redis_bridge
+from utils.cdn import purge_urls
+from utils.static_assets import is_not_modified
+from utils.metrics import metrics, observe_request, REDIRECTS, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from config.settings import (
+    STORAGE_MODE, WRITE_BEHIND_ENABLED, CODE_ALLOCATOR, CODE_BLOCK_SIZE, CODE_PERMUTATION_KEY, CODE_COUNTER_FILE,
+    BATCH_MAX_URLS, STATS_PAGE_SIZE, STATS_MAX_PAGE_SIZE, READINESS_TIMEOUT,
+    REDIRECT_STATUS, REDIRECT_PERMANENT_MAX_AGE, REDIRECT_TEMPORARY_MAX_AGE, ADMIN_TOKEN
+)
 
 api_bp = Blueprint('api', __name__)
 
 # ---------------------------
-# FILE STORAGE
+# STORAGE
 # ---------------------------
+# URL_STORAGE_MODE=file  - файл основной, редиректы из резидентного индекса
+# URL_STORAGE_MODE=redis - Redis основной (через общий пул redis_bridge),
+#                          файл пишется асинхронно как бэкап
 
-lock = threading.Lock()  # Для потокобезопасного доступа
+def is_redis_mode():
+    return STORAGE_MODE == "redis"
 
 def load_all_urls():
-    """Загрузка всех URL из файла"""
-    if not os.path.exists(DATA_FILE):
+    """Загрузка всех URL из основного хранилища"""
+    if is_redis_mode():
+        return redis_bridge.run(redis_store.load_all())
+    try:
+        return file_backend.load_all()
+    except Exception as e:
+        print(f"Error loading data file: {e}")
         return []
-    with lock:
-        try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [Url(**item) for item in data]
-        except Exception as e:
-            print(f"Error loading data file: {e}")
-            return []
 
 def save_all_urls(urls):
     """Сохраняем все URL в файл"""
-    with lock:
-        try:
-            with open(DATA_FILE, 'w', encoding='utf-8') as f:
-                json.dump([{'id': u.id, 'original_url': u.original_url} for u in urls],
-                          f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            print(f"Error saving data file: {e}")
+    try:
+        file_backend.write_all(urls)
+    except Exception as e:
+        print(f"Error saving data file: {e}")
 
 def save_url(record):
-    """Добавляем новый URL и сохраняем"""
-    urls = load_all_urls()
-    urls.append(record)
-    save_all_urls(urls)
+    """Добавляем новый URL (в режиме log - одна дописанная строка)"""
+    if is_redis_mode():
+        if not redis_bridge.run(redis_store.save(record)):
+            raise RuntimeError(f"Failed to save {record.id} to Redis")
+        file_backup.submit(record)
+        return
+    write_file([record])
+
+def save_urls(records):
+    """Сохраняем пачку новых URL одной записью в файл или одним pipeline в Redis"""
+    if not records:
+        return
+    if is_redis_mode():
+        if not redis_bridge.run(redis_store.save_many(records)):
+            raise RuntimeError(f"Failed to save {len(records)} URLs to Redis")
+        file_backup.submit_many(records)
+        return
+    write_file(records)
+
+def write_file(records):
+    """Режим file: ссылки сразу попадают в индекс, а в файл их пишет file_writer -
+    одной записью за всё, что накопилось в процессе, так что запрос не ждёт файла.
+    Другие воркеры увидят ссылки после этой записи. URL_WRITE_BEHIND=0 - пишем сами"""
+    if not WRITE_BEHIND_ENABLED:
+        written = file_backend.append_many(records)
+        for record in records:
+            url_index.put(record.id, record.original_url, record.redirect or None, written, record.expires_at or None)
+        return
+    for record in records:
+        url_index.put(record.id, record.original_url, record.redirect or None,
+                      expires_at=record.expires_at or None, pending=True)
+    file_writer.submit_many(records)
+
+def update_redirect(record):
+    """Сохраняем новую политику редиректа существующей ссылки"""
+    if is_redis_mode():
+        redis_bridge.run(redis_store.set_redirect(record.id, record.redirect or None))
+        file_backup.submit(record)
+        return
+    # Обновление должно лечь в файл после ещё не записанного создания ссылки
+    file_writer.flush()
+    written = file_backend.update(record)
+    url_index.put(record.id, record.original_url, record.redirect or None, written, record.expires_at or None)
 
 def find_by_code(code):
-    """Поиск URL по короткому коду"""
-    urls = load_all_urls()
-    for url in urls:
-        if url.id == code:
-            return url
-    return None
+    """Поиск URL по короткому коду: индекс в памяти или один HGETALL в Redis.
+    Истёкшая ссылка не находится, даже если её ещё не удалил фоновый проход"""
+    if is_redis_mode():
+        # Промахи сканеров отсекаются фильтром без перехода в loop redis_bridge
+        if redis_store.code_filter_rejects(code):
+            return None
+        record = redis_bridge.run(redis_store.load_existing(code))
+        return None if record and is_expired(record.expires_at) else record
+    original_url, redirect_status, expires_at = url_index.lookup(code)
+    if original_url is None or is_expired(expires_at):
+        return None
+    return Url(id=code, original_url=original_url, redirect=redirect_status or MISSING,
+               expires_at=expires_at or MISSING)
 
 def find_by_original(original_url):
-    """Поиск URL по оригинальному адресу"""
-    urls = load_all_urls()
-    for url in urls:
-        if url.original_url == original_url:
-            return url
+    """Поиск уже сокращённого URL по нормализованному адресу (O(1))"""
+    if is_redis_mode():
+        code = redis_bridge.run(redis_store.find_code_by_original(original_url))
+        return find_by_code(code) if code else None
+    code = url_index.find_code(original_url)
+    return find_by_code(code) if code else None
+
+def find_taken_codes(codes):
+    """Какие коды пачки уже заняты: одним обращением к Redis или по индексу в памяти"""
+    if is_redis_mode():
+        return redis_bridge.run(redis_store.existing_codes(codes))
+    return {code for code in codes if url_index.get(code) is not None}
+
+def count_urls():
+    """Число ссылок из поддерживаемого счётчика (Redis) или размера индекса (file)"""
+    if is_redis_mode():
+        return redis_bridge.run(redis_store.get_url_count())
+    return url_index.size
+
+def stats_page(cursor, limit):
+    """Страница (code, original_url) для /api/stats. Возвращает (items, next_cursor | None).
+
+    file:  cursor - номер слота в резидентном индексе
+    redis: cursor - курсор SCAN
+    """
+    if is_redis_mode():
+        urls, next_cursor = redis_bridge.run(redis_store.scan_page(cursor, limit))
+        return [(u.id, u.original_url) for u in urls], next_cursor or None
+    return url_index.page(cursor, limit)
+
+# ---------------------------
+# SHORT CODES
+# ---------------------------
+
+local_counter = LocalCounter(CODE_COUNTER_FILE or os.path.splitext(DATA_FILE)[0] + ".counter")
+
+def reserve_codes(size):
+    """Резервируем диапазон счётчика: INCRBY в Redis или локальный файл-счётчик"""
+    if is_redis_mode():
+        return redis_bridge.run(redis_store.reserve_codes(size))
+    return local_counter.reserve(size)
+
+code_allocator = CodeAllocator(
+    reserve_codes,
+    strategy=CODE_ALLOCATOR,
+    block_size=CODE_BLOCK_SIZE,
+    key=CODE_PERMUTATION_KEY,
+    # Коды, выданные случайной генерацией до перехода на счётчик
+    is_taken=lambda code: find_by_code(code) is not None,
+    taken_many=find_taken_codes
+)
+
+# ---------------------------
+# VALIDATION
+# ---------------------------
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl')
+
+REDIRECT_STATUSES = (301, 302, 307, 308)
+PERMANENT_REDIRECTS = (301, 308)
+REDIRECT_ALIASES = {'permanent': 301, 'temporary': 302}
+
+# Срок хранится в u32 снимка индекса
+MAX_EXPIRES_AT = 2 ** 32 - 1
+
+def prepare_url(raw_url):
+    """Очищаем и проверяем URL из запроса. Возвращает (url, error)"""
+    if not isinstance(raw_url, str):
+        return None, 'URL is required'
+    original_url = raw_url.strip()
+    if not original_url:
+        return None, 'URL cannot be empty'
+
+    if not original_url.startswith(('http://', 'https://')):
+        original_url = 'https://' + original_url
+
+    if not is_valid_url(original_url):
+        return None, 'Invalid URL format'
+    return original_url, None
+
+def parse_redirect(value):
+    """Политика редиректа из запроса. Возвращает (status | None, error); None - глобальная"""
+    if value is None or value == 'default':
+        return None, None
+    status = REDIRECT_ALIASES.get(value, value) if isinstance(value, str) else value
+    if isinstance(status, str) and status.isdigit():
+        status = int(status)
+    # 301.0 == 301, но снимок и Redis хранят код целым числом
+    if isinstance(status, bool) or not isinstance(status, int) or status not in REDIRECT_STATUSES:
+        return None, 'Invalid redirect, expected 301, 302, 307, 308, permanent or temporary'
+    return status, None
+
+def parse_expiration(data):
+    """Срок жизни ссылки из запроса: expires_at (unix-время) или expires_in (секунды).
+    Возвращает (expires_at | None, error); None - бессрочная"""
+    expires_at, expires_in = data.get('expires_at'), data.get('expires_in')
+    if expires_at is None and expires_in is None:
+        return None, None
+    if expires_at is not None and expires_in is not None:
+        return None, 'Use either expires_at or expires_in'
+    value = expires_at if expires_at is not None else expires_in
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None, 'expires_at and expires_in must be numbers of seconds'
+    expires_at = int(value) if expires_in is None else int(time.time() + value)
+    if expires_at <= time.time():
+        return None, 'Expiration must be in the future'
+    if expires_at > MAX_EXPIRES_AT:
+        return None, 'Expiration is too far in the future'
+    return expires_at, None
+
+def link_json(code, original_url, host_url, expires_at=None):
+    result = {
+        'short_code': code,
+        'original_url': original_url,
+        'short_url': host_url + code
+    }
+    if expires_at:
+        result['expires_at'] = expires_at
+    return result
+
+def url_response(record):
+    return link_json(record.id, record.original_url, request.host_url, record.expires_at or None)
+
+def parse_ndjson_items(lines):
+    """NDJSON-строки пакета -> элементы (битая строка -> None, т.е. ошибка элемента)"""
+    items = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(None)
+        if len(items) > BATCH_MAX_URLS:
+            break
+    return items
+
+def plan_batch(items):
+    """Валидация и дедупликация пакета внутри себя, без обращения к хранилищу.
+
+    Возвращает (errors, pending): errors - {index: результат с ошибкой},
+    pending - [(original_url, [indexes])] по одному на нормализованный URL.
+    """
+    errors = {}
+    pending = {}
+    for i, item in enumerate(items):
+        raw_url = item.get('url') if isinstance(item, dict) else item
+        original_url, error = prepare_url(raw_url)
+        if error:
+            errors[i] = {'index': i, 'url': raw_url, 'error': error}
+            continue
+        key = normalize_url(original_url)
+        if key in pending:
+            pending[key][1].append(i)
+        else:
+            pending[key] = (original_url, [i])
+    return errors, list(pending.values())
+
+def batch_response(total, errors, existing, created, host_url):
+    """Собираем ответ пакета; existing и created - [(Url, indexes)]"""
+    results = [None] * total
+    for i, error in errors.items():
+        results[i] = error
+    for record, indexes in existing:
+        for i in indexes:
+            results[i] = {'index': i, 'status': 'existing', **link_json(record.id, record.original_url, host_url)}
+    for record, (first, *duplicates) in created:
+        results[first] = {'index': first, 'status': 'created', **link_json(record.id, record.original_url, host_url)}
+        for i in duplicates:
+            results[i] = {'index': i, 'status': 'existing', **link_json(record.id, record.original_url, host_url)}
+    return {
+        'total': total,
+        'created': len(created),
+        'errors': len(errors),
+        'results': results
+    }
+
+# ---------------------------
+# REDIRECTS
+# ---------------------------
+# 301/308 кешируются на REDIRECT_PERMANENT_MAX_AGE: повторные клики обслуживает кеш
+# браузера/CDN и до нас не доходят (в аналитике их не будет). 302/307 по умолчанию
+# no-cache: кеш хранит ответ, но перепроверяет его по ETag и получает 304.
+
+def redirect_policy(record):
+    """(status, etag, cache_control) редиректа: код ссылки или глобальный REDIRECT_STATUS"""
+    status = record.redirect or REDIRECT_STATUS
+    max_age = REDIRECT_PERMANENT_MAX_AGE if status in PERMANENT_REDIRECTS else REDIRECT_TEMPORARY_MAX_AGE
+    if record.expires_at:
+        # Кеш не должен отдавать редирект дольше, чем живёт ссылка
+        max_age = min(max_age, max(int(record.expires_at - time.time()), 0))
+    cache_control = f'public, max-age={max_age}' if max_age > 0 else 'no-cache'
+    # ETag меняется вместе с адресом или кодом редиректа
+    etag = hashlib.sha1(f'{status} {record.original_url}'.encode('utf-8')).hexdigest()[:16]
+    return status, etag, cache_control
+
+def redirect_response(record):
+    status, etag, cache_control = redirect_policy(record)
+    if is_not_modified(request.headers.get('If-None-Match'), etag):
+        response = Response(status=304)
+    else:
+        response = redirect(record.original_url, code=status)
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+def admin_error(authorization):
+    """None - доступ разрешён, иначе (сообщение, HTTP-код)"""
+    if not ADMIN_TOKEN:
+        return 'Admin endpoints are disabled', 403
+    if not hmac.compare_digest((authorization or '').encode('utf-8'), f'Bearer {ADMIN_TOKEN}'.encode('utf-8')):
+        return 'Unauthorized', 401
     return None
 
+def purge_response(record, purged, host_url):
+    status, etag, cache_control = redirect_policy(record)
+    return {
+        **link_json(record.id, record.original_url, host_url, record.expires_at or None),
+        'redirect': status,
+        'cache_control': cache_control,
+        'etag': etag,
+        'cdn_purged': purged
+    }
+
 # ---------------------------
 # ROUTES
 # ---------------------------
@@ -70,92 +348,258 @@ def shorten_url():
         if not data or 'url' not in data:
             return jsonify({'error': 'URL is required'}), 400
 
-        original_url = data['url'].strip()
-        if not original_url:
-            return jsonify({'error': 'URL cannot be empty'}), 400
-
-        if not original_url.startswith(('http://', 'https://')):
-            original_url = 'https://' + original_url
+        original_url, error = prepare_url(data['url'])
+        if error:
+            return jsonify({'error': error}), 400
+        redirect_status, error = parse_redirect(data.get('redirect'))
+        if error:
+            return jsonify({'error': error}), 400
+        expires_at, error = parse_expiration(data)
+        if error:
+            return jsonify({'error': error}), 400
 
-        if not is_valid_url(original_url):
-            return jsonify({'error': 'Invalid URL format'}), 400
-
-        existing = find_by_original(original_url)
-        if existing:
-            return jsonify({
-                'short_code': existing.id,
-                'original_url': existing.original_url,
-                'short_url': request.host_url + existing.id
-            }), 200
+        # Ссылка со сроком жизни всегда новая: чужая бессрочная (или истекающая
+        # раньше) ей не замена. В обратный индекс она тоже не попадает
+        if not expires_at:
+            existing = find_by_original(original_url)
+            if existing:
+                return jsonify(url_response(existing)), 200
 
         # Генерация уникального кода
-        urls = load_all_urls()
-        short_code = generate_short_code()
-        existing_codes = [url.id for url in urls]
-        attempts = 0
-        while short_code in existing_codes and attempts < 10:
-            short_code = generate_short_code()
-            attempts += 1
-        if attempts >= 10:
+        try:
+            short_code = code_allocator.allocate()
+        except RuntimeError as e:
+            print("Code allocation error:", e)
             return jsonify({'error': 'Could not generate unique code'}), 500
 
-        new_url = Url(id=short_code, original_url=original_url)
+        new_url = Url(id=short_code, original_url=original_url, redirect=redirect_status or MISSING,
+                      expires_at=expires_at or MISSING)
         save_url(new_url)
 
-        return jsonify({
-            'short_code': short_code,
-            'original_url': original_url,
-            'short_url': request.host_url + short_code
-        }), 201
+        return jsonify(url_response(new_url)), 201
 
     except Exception as e:
         print("Error in /shorten:", e)
         return jsonify({'error': 'Internal server error'}), 500
 
+def read_batch_items():
+    """URL пакета: JSON-массив ({"urls": [...]} или [...]) либо NDJSON по строке на URL"""
+    if request.mimetype in NDJSON_MIMETYPES:
+        return parse_ndjson_items(request.stream)
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('urls')
+    return data if isinstance(data, list) else None
+
+@api_bp.route('/api/shorten/batch', methods=['POST'])
+def shorten_batch():
+    try:
+        items = read_batch_items()
+        if items is None:
+            return jsonify({'error': 'Array of URLs is required'}), 400
+        if len(items) > BATCH_MAX_URLS:
+            return jsonify({'error': f'Too many URLs, max {BATCH_MAX_URLS} per batch'}), 413
+
+        # Один проход: валидация и дедупликация внутри пакета, затем по хранилищу
+        errors, pending = plan_batch(items)
+        existing, missing = [], []
+        for original_url, indexes in pending:
+            record = find_by_original(original_url)
+            if record:
+                existing.append((record, indexes))
+            else:
+                missing.append((original_url, indexes))
+
+        # Коды выделяются одним резервированием, запись - одной операцией
+        codes = code_allocator.allocate_many(len(missing))
+        created = [
+            (Url(id=code, original_url=original_url), indexes)
+            for code, (original_url, indexes) in zip(codes, missing)
+        ]
+        save_urls([record for record, _ in created])
+
+        return jsonify(batch_response(len(items), errors, existing, created, request.host_url)), 200
+
+    except Exception as e:
+        print("Error in /shorten/batch:", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
 @api_bp.route('/<string:short_code>')
 def redirect_to_url(short_code):
     try:
         if len(short_code) != 7:
+            REDIRECTS.inc('invalid')
             return "Invalid short code", 404
 
         record = find_by_code(short_code)
         if record:
-            return redirect(record.original_url, code=302)
+            REDIRECTS.inc('hit')
+            click_aggregator.record(short_code, request.referrer)
+            return redirect_response(record)
+        REDIRECTS.inc('miss')
         return "Short URL not found", 404
     except Exception as e:
+        REDIRECTS.inc('error')
         print("Redirect error:", e)
         return "Short URL not found", 404
 
+@api_bp.route('/api/links/<string:short_code>/purge', methods=['POST'])
+def purge_link(short_code):
+    """Сбрасываем ссылку из кешей CDN; {"redirect": ...} заодно меняет её политику"""
+    denied = admin_error(request.headers.get('Authorization'))
+    if denied:
+        return jsonify({'error': denied[0]}), denied[1]
+    try:
+        data = request.get_json(silent=True) or {}
+        record = find_by_code(short_code)
+        if not record:
+            return jsonify({'error': 'Short URL not found'}), 404
+
+        if 'redirect' in data:
+            redirect_status, error = parse_redirect(data['redirect'])
+            if error:
+                return jsonify({'error': error}), 400
+            record.redirect = redirect_status or MISSING
+            update_redirect(record)
+
+        purged = purge_urls([request.host_url + short_code])
+        return jsonify(purge_response(record, purged, request.host_url))
+    except Exception as e:
+        print("Purge error:", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+def stats_item(code, original_url):
+    return link_json(code, original_url, request.host_url)
+
+def parse_stats_args(args):
+    """(cursor, limit) из query-параметров; cursor = None - параметры неверны"""
+    try:
+        cursor = int(args.get('cursor') or 0)
+        limit = int(args['limit']) if args.get('limit') else None
+    except ValueError:
+        return None, None
+    if cursor < 0 or (limit is not None and limit < 1):
+        return None, None
+    return cursor, limit
+
+def wants_ndjson(req):
+    return req.args.get('format') == 'ndjson' or req.accept_mimetypes.best in NDJSON_MIMETYPES
+
 @api_bp.route('/api/stats')
 def get_stats():
+    """Статистика постранично.
+
+    ?summary=1          - только счётчики, без записей
+    ?cursor=&limit=     - страница записей и next_cursor для следующей
+    ?format=ndjson      - потоковая выдача записей (по строке JSON на ссылку)
+    """
     try:
-        urls = load_all_urls()
+        if request.args.get('summary') in ('1', 'true'):
+            return jsonify({'total_urls': count_urls()})
+
+        cursor, limit = parse_stats_args(request.args)
+        if cursor is None:
+            return jsonify({'error': 'Invalid cursor or limit'}), 400
+
+        if wants_ndjson(request):
+            return Response(
+                stream_with_context(stream_stats(cursor, limit)),
+                mimetype='application/x-ndjson'
+            )
+
+        items, next_cursor = stats_page(cursor, min(limit or STATS_PAGE_SIZE, STATS_MAX_PAGE_SIZE))
         return jsonify({
-            'total_urls': len(urls),
-            'urls': [
-                {
-                    'short_code': u.id,
-                    'original_url': u.original_url,
-                    'short_url': request.host_url + u.id
-                } for u in urls
-            ]
+            'total_urls': count_urls(),
+            'urls': [stats_item(code, original_url) for code, original_url in items],
+            'next_cursor': next_cursor
         })
     except Exception as e:
         print("Stats error:", e)
         return jsonify({'error': 'Internal server error'}), 500
 
+@api_bp.route('/api/stats/<string:short_code>')
+def get_link_stats(short_code):
+    """Клики по одной ссылке: всего, по дням и по источникам (уже сброшенные из буфера).
+    Файл счётчиков get_clicks читает в пуле потоков, а не в loop redis_bridge"""
+    try:
+        record = find_by_code(short_code)
+        if not record:
+            return jsonify({'error': 'Short URL not found'}), 404
+        clicks = redis_bridge.run(click_aggregator.get_clicks(short_code))
+        return jsonify({**url_response(record), **clicks})
+    except Exception as e:
+        print("Link stats error:", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+def stream_stats(cursor, limit=None):
+    """Генератор NDJSON: страницы читаются по мере отправки, весь набор в памяти не держим"""
+    sent = 0
+    while cursor is not None and (limit is None or sent < limit):
+        page_size = STATS_MAX_PAGE_SIZE if limit is None else min(STATS_MAX_PAGE_SIZE, limit - sent)
+        items, cursor = stats_page(cursor, page_size)
+        for code, original_url in items:
+            yield json.dumps(stats_item(code, original_url), ensure_ascii=False) + '\n'
+        sent += len(items)
+
+# Health-пробы не трогают хранилище: счётчики поддерживаются при записи
+
 @api_bp.route('/api/health')
 def health():
+    storage = 'redis' if is_redis_mode() else 'file'
     try:
-        urls = load_all_urls()
         return jsonify({
             'status': 'healthy',
-            'storage': 'file',
-            'total_urls': len(urls)
+            'storage': storage,
+            'total_urls': count_urls(),
+            'initialized': redis_store.AppState.is_initialized()
         })
     except Exception as e:
         return jsonify({
             'status': 'unhealthy',
-            'storage': 'file',
+            'storage': storage,
             'error': str(e)
         }), 500
+
+# ---------------------------
+# METRICS
+# ---------------------------
+
+@api_bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@api_bp.after_app_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Шаблон маршрута, а не путь: /<string:short_code> - одна серия, а не серия на код
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+    return response
+
+@api_bp.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@api_bp.route('/api/health/live')
+def liveness():
+    """Процесс жив и обслуживает запросы"""
+    return jsonify({'status': 'alive'})
+
+@api_bp.route('/api/health/ready')
+def readiness():
+    """Готов принимать трафик: система инициализирована и основное хранилище доступно"""
+    initialized = redis_store.AppState.is_initialized()
+    try:
+        redis_ok = redis_bridge.run(redis_store.ping(), timeout=READINESS_TIMEOUT)
+    except Exception:
+        redis_ok = False
+
+    # В режиме file Redis - лишь зеркало, его недоступность не мешает работе
+    ready = initialized and (redis_ok or not is_redis_mode())
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'initialized': initialized,
+        'redis': redis_ok
+    }), 200 if ready else 503
@@ -0,0 +1,346 @@
+import time
+import asyncio
+import json
+from quart import Blueprint, Response, g, request, jsonify, redirect
+from ashredis import MISSING
+from redis_storage.url import Url
+from protocol.file_backends import file_backup
+from protocol.url_index import url_index
+from protocol import url_storage as redis_store
+from protocol.analytics import click_aggregator
+from config.settings import STATS_PAGE_SIZE, STATS_MAX_PAGE_SIZE, READINESS_TIMEOUT, BATCH_MAX_URLS
+from utils.helpers import is_expired
+from utils.cdn import purge_urls
+from utils.static_assets import is_not_modified
+from utils.metrics import metrics, observe_request, REDIRECTS, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from routes import api as sync_api
+from routes.api import (
+    is_redis_mode, prepare_url, link_json, plan_batch, batch_response, parse_ndjson_items,
+    parse_stats_args, wants_ndjson, code_allocator, local_counter, NDJSON_MIMETYPES,
+    parse_redirect, parse_expiration, redirect_policy, admin_error, purge_response
+)
+
+# Те же маршруты, что и в routes/api.py, но асинхронные: Redis вызывается через await
+# в loop сервера, а не через redis_bridge. Проверки и форматы ответов общие с api.py.
+async_api_bp = Blueprint('async_api', __name__)
+
+# ---------------------------
+# STORAGE
+# ---------------------------
+# file:  индекс в памяти читается напрямую, запись в файл уходит в пул потоков
+# redis: await в общий пул соединений redis_manager
+
+async def read_index(function, *args):
+    """Загруженный индекс отвечает из памяти: изменённый файл он перечитывает
+    в своём фоновом потоке. Первая загрузка читает весь файл - в пуле потоков"""
+    if url_index.loaded:
+        return function(*args)
+    return await asyncio.to_thread(function, *args)
+
+async def find_by_code(code):
+    if is_redis_mode():
+        record = await redis_store.load_existing(code)
+        return None if record and is_expired(record.expires_at) else record
+    return await read_index(sync_api.find_by_code, code)
+
+async def find_by_original(original_url):
+    if is_redis_mode():
+        code = await redis_store.find_code_by_original(original_url)
+        return await find_by_code(code) if code else None
+    return await read_index(sync_api.find_by_original, original_url)
+
+async def save_url(record):
+    if is_redis_mode():
+        if not await redis_store.save(record):
+            raise RuntimeError(f"Failed to save {record.id} to Redis")
+        await submit_backup([record])
+        return
+    await asyncio.to_thread(sync_api.save_url, record)
+
+async def save_urls(records):
+    if not records:
+        return
+    if is_redis_mode():
+        if not await redis_store.save_many(records):
+            raise RuntimeError(f"Failed to save {len(records)} URLs to Redis")
+        await submit_backup(records)
+        return
+    await asyncio.to_thread(sync_api.save_urls, records)
+
+async def update_redirect(record):
+    if is_redis_mode():
+        await redis_store.set_redirect(record.id, record.redirect or None)
+        await submit_backup([record])
+        return
+    await asyncio.to_thread(sync_api.update_redirect, record)
+
+async def submit_backup(records):
+    """Очередь бэкапа полна - ждём её в потоке, а не в loop сервера"""
+    if file_backup.has_room(len(records)):
+        file_backup.submit_many(records)
+    else:
+        await asyncio.to_thread(file_backup.submit_many, records)
+
+async def count_urls():
+    if is_redis_mode():
+        return await redis_store.get_url_count()
+    return await read_index(lambda: url_index.size)
+
+async def stats_page(cursor, limit):
+    if is_redis_mode():
+        urls, next_cursor = await redis_store.scan_page(cursor, limit)
+        return [(u.id, u.original_url) for u in urls], next_cursor or None
+    return await read_index(sync_api.stats_page, cursor, limit)
+
+async def reserve_codes(size):
+    if is_redis_mode():
+        return await redis_store.reserve_codes(size)
+    return await asyncio.to_thread(local_counter.reserve, size)
+
+async def is_taken(code):
+    return await find_by_code(code) is not None
+
+async def taken_codes(codes):
+    if is_redis_mode():
+        return await redis_store.existing_codes(codes)
+    return await read_index(sync_api.find_taken_codes, codes)
+
+# ---------------------------
+# ROUTES
+# ---------------------------
+
+def url_response(record):
+    return link_json(record.id, record.original_url, request.host_url, record.expires_at or None)
+
+def redirect_response(record):
+    status, etag, cache_control = redirect_policy(record)
+    if is_not_modified(request.headers.get('If-None-Match'), etag):
+        response = Response('', status=304)
+    else:
+        response = redirect(record.original_url, code=status)
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+@async_api_bp.route('/api/shorten', methods=['POST'])
+async def shorten_url():
+    try:
+        data = await request.get_json(silent=True)
+        if not data or 'url' not in data:
+            return jsonify({'error': 'URL is required'}), 400
+
+        original_url, error = prepare_url(data['url'])
+        if error:
+            return jsonify({'error': error}), 400
+        redirect_status, error = parse_redirect(data.get('redirect'))
+        if error:
+            return jsonify({'error': error}), 400
+        expires_at, error = parse_expiration(data)
+        if error:
+            return jsonify({'error': error}), 400
+
+        if not expires_at:
+            existing = await find_by_original(original_url)
+            if existing:
+                return jsonify(url_response(existing)), 200
+
+        try:
+            short_code = await code_allocator.allocate_async(reserve_codes, is_taken)
+        except RuntimeError as e:
+            print("Code allocation error:", e)
+            return jsonify({'error': 'Could not generate unique code'}), 500
+
+        new_url = Url(id=short_code, original_url=original_url, redirect=redirect_status or MISSING,
+                      expires_at=expires_at or MISSING)
+        await save_url(new_url)
+
+        return jsonify(url_response(new_url)), 201
+
+    except Exception as e:
+        print("Error in /shorten:", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+async def read_batch_items():
+    if request.mimetype in NDJSON_MIMETYPES:
+        body = await request.get_data(as_text=True)
+        return parse_ndjson_items(body.splitlines())
+
+    data = await request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('urls')
+    return data if isinstance(data, list) else None
+
+@async_api_bp.route('/api/shorten/batch', methods=['POST'])
+async def shorten_batch():
+    try:
+        items = await read_batch_items()
+        if items is None:
+            return jsonify({'error': 'Array of URLs is required'}), 400
+        if len(items) > BATCH_MAX_URLS:
+            return jsonify({'error': f'Too many URLs, max {BATCH_MAX_URLS} per batch'}), 413
+
+        errors, pending = plan_batch(items)
+        existing, missing = [], []
+        for original_url, indexes in pending:
+            record = await find_by_original(original_url)
+            if record:
+                existing.append((record, indexes))
+            else:
+                missing.append((original_url, indexes))
+
+        codes = await code_allocator.allocate_many_async(len(missing), reserve_codes, is_taken, taken_codes)
+        created = [
+            (Url(id=code, original_url=original_url), indexes)
+            for code, (original_url, indexes) in zip(codes, missing)
+        ]
+        await save_urls([record for record, _ in created])
+
+        return jsonify(batch_response(len(items), errors, existing, created, request.host_url)), 200
+
+    except Exception as e:
+        print("Error in /shorten/batch:", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@async_api_bp.route('/<string:short_code>')
+async def redirect_to_url(short_code):
+    try:
+        if len(short_code) != 7:
+            REDIRECTS.inc('invalid')
+            return "Invalid short code", 404
+
+        record = await find_by_code(short_code)
+        if record:
+            REDIRECTS.inc('hit')
+            click_aggregator.record(short_code, request.referrer)
+            return redirect_response(record)
+        REDIRECTS.inc('miss')
+        return "Short URL not found", 404
+    except Exception as e:
+        REDIRECTS.inc('error')
+        print("Redirect error:", e)
+        return "Short URL not found", 404
+
+@async_api_bp.route('/api/links/<string:short_code>/purge', methods=['POST'])
+async def purge_link(short_code):
+    denied = admin_error(request.headers.get('Authorization'))
+    if denied:
+        return jsonify({'error': denied[0]}), denied[1]
+    try:
+        data = await request.get_json(silent=True) or {}
+        record = await find_by_code(short_code)
+        if not record:
+            return jsonify({'error': 'Short URL not found'}), 404
+
+        if 'redirect' in data:
+            redirect_status, error = parse_redirect(data['redirect'])
+            if error:
+                return jsonify({'error': error}), 400
+            record.redirect = redirect_status or MISSING
+            await update_redirect(record)
+
+        purged = await asyncio.to_thread(purge_urls, [request.host_url + short_code])
+        return jsonify(purge_response(record, purged, request.host_url))
+    except Exception as e:
+        print("Purge error:", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@async_api_bp.route('/api/stats')
+async def get_stats():
+    try:
+        if request.args.get('summary') in ('1', 'true'):
+            return jsonify({'total_urls': await count_urls()})
+
+        cursor, limit = parse_stats_args(request.args)
+        if cursor is None:
+            return jsonify({'error': 'Invalid cursor or limit'}), 400
+
+        host_url = request.host_url
+        if wants_ndjson(request):
+            return Response(stream_stats(cursor, limit, host_url), mimetype='application/x-ndjson')
+
+        items, next_cursor = await stats_page(cursor, min(limit or STATS_PAGE_SIZE, STATS_MAX_PAGE_SIZE))
+        return jsonify({
+            'total_urls': await count_urls(),
+            'urls': [link_json(code, original_url, host_url) for code, original_url in items],
+            'next_cursor': next_cursor
+        })
+    except Exception as e:
+        print("Stats error:", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@async_api_bp.route('/api/stats/<string:short_code>')
+async def get_link_stats(short_code):
+    try:
+        record = await find_by_code(short_code)
+        if not record:
+            return jsonify({'error': 'Short URL not found'}), 404
+        clicks = await click_aggregator.get_clicks(short_code)
+        return jsonify({**url_response(record), **clicks})
+    except Exception as e:
+        print("Link stats error:", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+async def stream_stats(cursor, limit, host_url):
+    sent = 0
+    while cursor is not None and (limit is None or sent < limit):
+        page_size = STATS_MAX_PAGE_SIZE if limit is None else min(STATS_MAX_PAGE_SIZE, limit - sent)
+        items, cursor = await stats_page(cursor, page_size)
+        for code, original_url in items:
+            yield (json.dumps(link_json(code, original_url, host_url), ensure_ascii=False) + '\n').encode('utf-8')
+        sent += len(items)
+
+@async_api_bp.route('/api/health')
+async def health():
+    storage = 'redis' if is_redis_mode() else 'file'
+    try:
+        return jsonify({
+            'status': 'healthy',
+            'storage': storage,
+            'total_urls': await count_urls(),
+            'initialized': redis_store.AppState.is_initialized()
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'unhealthy',
+            'storage': storage,
+            'error': str(e)
+        }), 500
+
+# ---------------------------
+# METRICS
+# ---------------------------
+
+@async_api_bp.before_app_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@async_api_bp.after_app_request
+async def record_request_metrics(response):
+    started = getattr(g, 'request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+    return response
+
+@async_api_bp.route('/metrics')
+async def metrics_endpoint():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@async_api_bp.route('/api/health/live')
+async def liveness():
+    return jsonify({'status': 'alive'})
+
+@async_api_bp.route('/api/health/ready')
+async def readiness():
+    initialized = redis_store.AppState.is_initialized()
+    try:
+        redis_ok = await asyncio.wait_for(redis_store.ping(), READINESS_TIMEOUT)
+    except Exception:
+        redis_ok = False
+
+    ready = initialized and (redis_ok or not is_redis_mode())
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'initialized': initialized,
+        'redis': redis_ok
+    }), 200 if ready else 503
@@ -1,7 +1,22 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, Response, abort, request, send_file
+from utils.static_assets import static_assets, is_not_modified
 
 views_bp = Blueprint('views', __name__)
 
+def send_static(asset):
+    if asset is None:
+        abort(404)
+    if is_not_modified(request.headers.get('If-None-Match'), asset.etag):
+        response = Response(status=304)
+    else:
+        response = send_file(asset.path, mimetype=asset.mimetype, etag=False, conditional=False)
+    response.headers.update(asset.headers())
+    return response
+
 @views_bp.route('/')
 def index():
-    return render_template("home.html")
+    return send_static(static_assets.home(request.headers.get('Accept-Encoding')))
+
+@views_bp.route('/static/<path:filename>')
+def static_file(filename):
+    return send_static(static_assets.resolve(filename, request.headers.get('Accept-Encoding')))
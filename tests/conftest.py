@@ -0,0 +1,87 @@
+import os
+import sys
+import types
+import tempfile
+import pytest
+
+# Тесты запускаются из корня репозитория: python -m pytest tests
+# (зависимости - tests/requirements.txt). Redis - fakeredis из benchmarks.common,
+# данные - во временном каталоге.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+# ---------------------------
+# ENVIRONMENT
+# ---------------------------
+
+# Настройки читаются при импорте модулей, поэтому окружение задаётся до них
+WORKDIR = tempfile.mkdtemp(prefix="urlmuhameda-tests-")
+DATA_FILE = os.path.join(WORKDIR, "data.json")
+
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("NUMBER_BD", "0")
+os.environ.update({
+    "URL_STORAGE_MODE": "file",
+    "URL_STORAGE_BACKEND": "json",
+    "URL_LOG_FILE": os.path.join(WORKDIR, "data.jsonl"),
+    "URL_SNAPSHOT_FILE": os.path.join(WORKDIR, "data.snap"),
+    "URL_CODE_COUNTER_FILE": os.path.join(WORKDIR, "data.counter"),
+    "URL_ANALYTICS_FILE": os.path.join(WORKDIR, "data.clicks.json"),
+    "URL_LEADER_LOCK_FILE": os.path.join(WORKDIR, "data.leader.lock"),
+    "URL_FILE_MONITOR_INTERVAL": "0.05",
+    "URL_WRITE_BEHIND_INTERVAL_MS": "10",
+    "URL_ANALYTICS_FLUSH_INTERVAL_MS": "50",
+})
+
+with open(DATA_FILE, "w", encoding="utf-8") as f:
+    f.write("[]")
+
+from benchmarks.common import fake_redis
+
+fake_redis()
+
+try:
+    import BANNED_FILES.config as private_config
+except ImportError:
+    # Приватный конфиг в репозиторий не входит; модулям хранилища из него нужны
+    # только путь к файлу данных и менеджер Redis
+    from config.redis_manager import RedisManager, redis_manager
+
+    private_config = types.ModuleType("BANNED_FILES.config")
+    private_config.RedisManager = RedisManager
+    private_config.redis_manager = redis_manager
+    sys.modules["BANNED_FILES"] = types.ModuleType("BANNED_FILES")
+    sys.modules["BANNED_FILES.config"] = private_config
+    sys.modules["BANNED_FILES"].config = private_config
+
+private_config.DATA_FILE = DATA_FILE
+
+# ---------------------------
+# FIXTURES
+# ---------------------------
+
+@pytest.fixture(scope="session")
+def app():
+    """Flask-приложение, поднятое как в main.py: режим file, бэкенд json"""
+    import main
+    main.init_sync()
+    return main.app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def redis_mode(monkeypatch, app):
+    """Маршруты и хранилище - в режиме redis (режим читается при импорте)"""
+    import routes.api
+    import protocol.url_storage
+    from support import run
+    monkeypatch.setattr(routes.api, "STORAGE_MODE", "redis")
+    monkeypatch.setattr(protocol.url_storage, "STORAGE_MODE", "redis")
+    # Коды, выданные в режиме file, уже в Redis: счётчик Redis продолжает локальный
+    issued = routes.api.local_counter.reserve(0) - run(protocol.url_storage.reserve_codes(0))
+    if issued > 0:
+        run(protocol.url_storage.reserve_codes(issued))
@@ -0,0 +1,33 @@
+import time
+import itertools
+from redis_storage.url import Url
+
+# Общие помощники тестов (не фикстуры): импортируются как from support import ...
+
+_sites = itertools.count()
+
+def new_site():
+    """Адрес, который ещё не сокращали: приложение и данные общие на всю сессию"""
+    return f"https://site{next(_sites)}.example.com"
+
+def shorten(client, url=None, **fields):
+    response = client.post("/api/shorten", json={"url": url or new_site(), **fields})
+    assert response.status_code in (200, 201), response.get_json()
+    return response
+
+def make_url(code, original_url, **fields):
+    return Url(id=code, original_url=original_url, short_id="s/" + code, **fields)
+
+def run(coro):
+    """Выполняем корутину в loop redis_bridge - там живёт пул соединений Redis"""
+    from config.redis_manager import redis_bridge
+    return redis_bridge.run(coro, timeout=30)
+
+def wait_for(condition, timeout=5.0, interval=0.02):
+    """Ждём, пока фоновая работа (мониторы, запись в файл) дойдёт до condition()"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return condition()
@@ -0,0 +1,73 @@
+import asyncio
+from config.redis_manager import RedisManager, parse_shard, redis_shards
+from protocol.analytics import ClickAggregator, referrer_host, format_clicks
+from utils.metrics import CLICKS_DROPPED
+from support import run, shorten, wait_for
+
+# ---------------------------
+# CLICK ANALYTICS (user-012)
+# ---------------------------
+
+def test_file_counters_merge_between_flushes(tmp_path):
+    path = str(tmp_path / "clicks.json")
+    aggregator = ClickAggregator(backend="file", path=path)
+    for referrer in ("https://a.example.org/x", "https://a.example.org/y", None):
+        aggregator.record("aaaaaaa", referrer)
+    assert asyncio.run(aggregator.flush()) == 3
+
+    aggregator.record("aaaaaaa")
+    assert asyncio.run(aggregator.flush()) == 1
+    assert asyncio.run(aggregator.flush()) == 0
+
+    # Другой воркер читает тот же файл счётчиков
+    clicks = asyncio.run(ClickAggregator(backend="file", path=path).get_clicks("aaaaaaa"))
+    assert clicks["total_clicks"] == 4
+    assert clicks["referrers"] == {"direct": 2, "a.example.org": 2}
+    assert sum(clicks["days"].values()) == 4
+
+def test_full_buffer_counts_dropped_clicks(tmp_path):
+    aggregator = ClickAggregator(backend="file", flush_events=1, path=str(tmp_path / "clicks.json"))
+    dropped = CLICKS_DROPPED._values.get((), 0)
+
+    for _ in range(25):
+        aggregator.record("aaaaaaa")
+
+    assert CLICKS_DROPPED._values.get((), 0) - dropped == 5
+    assert asyncio.run(aggregator.flush()) == 20
+
+def test_failed_shard_requeues_only_its_clicks(app, monkeypatch):
+    # Шард кода "xx..." недоступен: его pipeline падает, остальные применяются
+    broken = RedisManager(parse_shard("redis://localhost:6379/3"))
+    owner = redis_shards.for_key
+    monkeypatch.setattr(redis_shards, "for_key", lambda key: broken if key.startswith("xx") else owner(key))
+    aggregator = ClickAggregator(backend="redis")
+    aggregator.record("shard01")
+    aggregator.record("xxshard")
+
+    assert run(aggregator.flush()) == 1
+    monkeypatch.setattr(redis_shards, "for_key", owner)
+    assert run(aggregator.flush()) == 1
+
+    assert run(aggregator.get_clicks("shard01"))["total_clicks"] == 1
+    assert run(aggregator.get_clicks("xxshard"))["total_clicks"] == 1
+
+def test_link_stats_count_flushed_clicks(client):
+    code = shorten(client).get_json()["short_code"]
+    for _ in range(3):
+        client.get("/" + code, headers={"Referer": "https://news.example.org/item"})
+
+    def clicks():
+        return client.get(f"/api/stats/{code}").get_json()
+
+    assert wait_for(lambda: clicks()["total_clicks"] == 3)
+    assert clicks()["referrers"] == {"news.example.org": 3}
+    assert client.get("/api/stats/zzzzzzz").status_code == 404
+
+def test_referrer_host_and_format():
+    assert referrer_host("https://News.Example.org:8443/a?b") == "news.example.org"
+    assert referrer_host("") == "direct"
+    assert format_clicks({"total": "3", "day:2024-01-02": "1", "day:2024-01-01": "2", "ref:x.com": "3"}) == {
+        "total_clicks": 3,
+        "days": {"2024-01-01": 2, "2024-01-02": 1},
+        "referrers": {"x.com": 3},
+    }
@@ -0,0 +1,100 @@
+import json
+from protocol import file_backends
+from protocol.file_backends import AppendLogBackend, create_file_backend, migrate_json_to_log
+from support import make_url, wait_for
+
+def log_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+# ---------------------------
+# APPEND-ONLY LOG (user-002)
+# ---------------------------
+
+def test_last_record_wins_and_tombstones_delete(tmp_path):
+    backend = AppendLogBackend(str(tmp_path / "data.jsonl"), fsync_batch=1)
+    backend.append_many([make_url("aaaaaaa", "https://a.com"), make_url("bbbbbbb", "https://b.com")])
+    backend.update(make_url("aaaaaaa", "https://a2.com"))
+    backend.delete_many(["bbbbbbb"])
+
+    records = backend.read_records()
+    assert {code: r["original_url"] for code, r in records.items()} == {"aaaaaaa": "https://a2.com"}
+    assert len(log_lines(backend.path)) == 4
+    backend.close()
+
+def test_recovery_truncates_torn_tail(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    with open(path, "wb") as f:
+        f.write(b'{"id": "aaaaaaa", "original_url": "https://a.com"}\n')
+        f.write(b'{"id": "bbbbbbb", "original_u')
+
+    backend = AppendLogBackend(path)
+    backend.append(make_url("ccccccc", "https://c.com"))
+    backend.close()
+
+    assert [r["id"] for r in log_lines(path)] == ["aaaaaaa", "ccccccc"]
+
+def test_compaction_keeps_live_records_and_tail(tmp_path):
+    backend = AppendLogBackend(str(tmp_path / "data.jsonl"), fsync_batch=1)
+    for i in range(5):
+        backend.update(make_url("aaaaaaa", f"https://a.com/{i}"))
+    backend.append(make_url("bbbbbbb", "https://b.com"))
+    backend.delete_many(["bbbbbbb"])
+
+    backend.compact()
+    backend.append(make_url("ccccccc", "https://c.com"))
+
+    assert [r["id"] for r in log_lines(backend.path)] == ["aaaaaaa", "ccccccc"]
+    assert backend.read_records()["aaaaaaa"]["original_url"] == "https://a.com/4"
+    backend.close()
+
+def test_compaction_counts_lines_of_every_writer(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    seed = AppendLogBackend(path)
+    seed.append_many([make_url(f"c{i:06d}", f"https://x.com/{i}") for i in range(10)])
+    seed.compact()
+    seed.close()
+    # Два экземпляра - как два воркера: каждый сам по себе дописал меньше, чем нужно
+    # для компакции, но вместе лог вырос больше чем вдвое
+    first = AppendLogBackend(path, fsync_batch=1, compact_min_bytes=0)
+    second = AppendLogBackend(path, fsync_batch=1, compact_min_bytes=0)
+    first.update(make_url("c000000", "https://y.com/0"))
+    second.update(make_url("c000001", "https://y.com/1"))
+    for i in range(2, 6):
+        first.update(make_url(f"c{i:06d}", f"https://y.com/{i}"))
+    for i in range(6, 10):
+        second.update(make_url(f"c{i:06d}", f"https://y.com/{i}"))
+    assert len(log_lines(path)) == 20
+
+    second.update(make_url("c000000", "https://z.com/0"))
+
+    assert wait_for(lambda: len(log_lines(path)) == 10)
+    first.append(make_url("d000000", "https://d.com"))
+    assert len(first.read_records()) == 11
+    first.close()
+    second.close()
+
+def test_incremental_read_changes(tmp_path):
+    backend = AppendLogBackend(str(tmp_path / "data.jsonl"), fsync_batch=1)
+    backend.append(make_url("aaaaaaa", "https://a.com"))
+    records, cursor, full = backend.read_changes(None)
+    assert full and [r["id"] for r in records] == ["aaaaaaa"]
+
+    assert backend.read_changes(cursor)[0] is None
+    backend.append(make_url("bbbbbbb", "https://b.com"))
+    records, _, full = backend.read_changes(cursor)
+    assert not full and [r["id"] for r in records] == ["bbbbbbb"]
+    backend.close()
+
+def test_migration_is_not_run_on_backend_creation(tmp_path, monkeypatch):
+    json_path, log_path = tmp_path / "data.json", tmp_path / "data.jsonl"
+    json_path.write_text('[{"id": "aaaaaaa", "original_url": "https://a.com"}]')
+    monkeypatch.setattr(file_backends, "DATA_FILE", str(json_path))
+    monkeypatch.setattr(file_backends, "LOG_FILE", str(log_path))
+
+    backend = create_file_backend("log")
+    assert backend.path == str(log_path) and not log_path.exists()
+
+    assert migrate_json_to_log(str(json_path), str(log_path)) == 1
+    assert list(backend.read_records()) == ["aaaaaaa"]
+    assert migrate_json_to_log(str(json_path), str(log_path)) == 0
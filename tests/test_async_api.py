@@ -0,0 +1,52 @@
+import asyncio
+import multiprocessing
+
+# ---------------------------
+# ASGI MODE (user-011)
+# ---------------------------
+
+# Пул соединений Redis принадлежит loop, в котором открыт (redis_bridge у Flask-тестов),
+# поэтому Quart-приложение поднимается в отдельном процессе: conftest даёт ему свои
+# каталог данных и fakeredis. spawn, а не fork - потоки родителя могут держать локи
+
+async def asgi_scenario():
+    import asgi
+    results = {}
+    async with asgi.app.test_app() as test_app:
+        client = test_app.test_client()
+        response = await client.post("/api/shorten", json={"url": "https://asgi.example.com"})
+        code = (await response.get_json())["short_code"]
+        results["created"] = response.status_code
+        results["again"] = (await (await client.post("/api/shorten", json={"url": "asgi.example.com/"})).get_json())["short_code"] == code
+        response = await client.get("/" + code)
+        results["redirect"] = (response.status_code, response.headers["Location"])
+        results["missing"] = (await client.get("/zzzzzzz")).status_code
+        response = await client.post("/api/shorten/batch", json={"urls": ["https://asgi-batch.example.com", "bad url"]})
+        results["batch"] = (await response.get_json())["created"]
+        results["health"] = (await (await client.get("/api/health")).get_json())["status"]
+    return results
+
+def run_asgi_scenario(pipe):
+    import conftest  # noqa: F401 - окружение, fakeredis и DATA_FILE до импорта приложения
+    try:
+        pipe.send(asyncio.run(asgi_scenario()))
+    except Exception as e:
+        pipe.send({"error": repr(e)})
+
+def test_asgi_app_serves_the_same_api():
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_asgi_scenario, args=(sender,))
+    process.start()
+    assert receiver.poll(60), "ASGI scenario did not finish"
+    results = receiver.recv()
+    process.join(10)
+
+    assert results == {
+        "created": 201,
+        "again": True,
+        "redirect": (302, "https://asgi.example.com"),
+        "missing": 404,
+        "batch": 1,
+        "health": "healthy",
+    }
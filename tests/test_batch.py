@@ -0,0 +1,62 @@
+import json
+import routes.api as api
+from protocol import url_storage as redis_store
+from utils.helpers import encode_base62, LocalCounter, CodeAllocator
+from support import make_url, new_site, run, shorten
+
+# ---------------------------
+# BATCH SHORTENING (user-006)
+# ---------------------------
+
+def test_batch_dedupes_and_reports_errors(client):
+    existing = new_site()
+    shorten(client, existing)
+    fresh = new_site()
+
+    response = client.post("/api/shorten/batch", json={"urls": [fresh, fresh + "/", existing, "bad url"]})
+    body = response.get_json()
+
+    assert response.status_code == 200
+    assert (body["total"], body["created"], body["errors"]) == (4, 1, 1)
+    statuses = [item.get("status", "error") for item in body["results"]]
+    assert statuses == ["created", "existing", "existing", "error"]
+    assert body["results"][0]["short_code"] == body["results"][1]["short_code"]
+
+def test_batch_accepts_ndjson(client):
+    lines = "\n".join(json.dumps({"url": new_site()}) for _ in range(3))
+    response = client.post("/api/shorten/batch", data=lines, content_type="application/x-ndjson")
+
+    assert response.get_json()["created"] == 3
+
+def test_plan_batch_groups_equivalent_urls():
+    errors, pending = api.plan_batch(["a.com", "https://A.com/", {"url": "b.com"}, 42])
+    assert list(errors) == [3]
+    assert [indexes for _, indexes in pending] == [[0, 1], [2]]
+
+def test_batch_codes_are_checked_in_one_call(tmp_path):
+    counter = LocalCounter(str(tmp_path / "counter"))
+    checked = []
+
+    def taken_many(codes):
+        checked.append(list(codes))
+        return {encode_base62(1)}
+
+    allocator = CodeAllocator(counter.reserve, strategy="counter", taken_many=taken_many)
+    codes = allocator.allocate_many(50)
+
+    assert len(checked) == 1 and len(checked[0]) == 50
+    assert encode_base62(1) not in codes and len(set(codes)) == 50
+
+def test_existing_codes_reads_redis_for_the_whole_batch(app):
+    url = make_url("batch00", "https://batch.example.com")
+    run(redis_store.save(url))
+
+    assert run(redis_store.existing_codes(["batch00", "batch01", "batch02"])) == {"batch00"}
+
+def test_batch_in_redis_mode(client, redis_mode):
+    urls = [new_site() for _ in range(5)]
+    body = client.post("/api/shorten/batch", json={"urls": urls}).get_json()
+
+    codes = [item["short_code"] for item in body["results"]]
+    assert body["created"] == 5
+    assert [u.original_url for u in run(redis_store.load_many(codes))] == urls
@@ -0,0 +1,31 @@
+import json
+from benchmarks.common import dataset_codes, percentile, summarize, write_dataset
+from protocol.file_backends import AppendLogBackend, JsonFileBackend
+
+# ---------------------------
+# BENCHMARK SUITE (user-015)
+# ---------------------------
+
+def test_dataset_is_reproducible():
+    codes = dataset_codes(500)
+    assert codes == dataset_codes(500)
+    assert len(set(codes)) == 500 and all(len(code) == 7 for code in codes)
+    assert codes != dataset_codes(500, seed=1)
+
+def test_written_dataset_loads_in_both_backends(tmp_path):
+    codes = dataset_codes(50)
+    write_dataset(str(tmp_path / "data.json"), codes, "json")
+    write_dataset(str(tmp_path / "data.jsonl"), codes, "log")
+
+    with open(tmp_path / "data.json", encoding="utf-8") as f:
+        assert [item["id"] for item in json.load(f)] == codes
+    assert sorted(JsonFileBackend(str(tmp_path / "data.json")).read_records()) == codes
+    assert sorted(AppendLogBackend(str(tmp_path / "data.jsonl")).read_records()) == codes
+
+def test_summary_in_milliseconds():
+    latencies = [i / 1000 for i in range(1, 101)]
+    summary = summarize(latencies, elapsed=2.0, errors=1)
+
+    assert (summary["requests"], summary["errors"], summary["throughput_rps"]) == (100, 1, 50.0)
+    assert (summary["p50_ms"], summary["p99_ms"], summary["max_ms"]) == (51.0, 99.0, 100.0)
+    assert percentile([], 0.5) == 0.0
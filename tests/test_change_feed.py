@@ -0,0 +1,98 @@
+import asyncio
+from protocol import url_storage as redis_store
+from protocol.change_feed import ChangeFeed
+from protocol.file_backends import AppendLogBackend, file_backend
+from protocol.url_index import UrlIndex, file_writer
+from utils.metrics import SYNC_RECORDS
+from support import make_url, run, shorten, wait_for
+
+# ---------------------------
+# CHANGE FEED (user-025)
+# ---------------------------
+
+def test_change_feed_delivers_every_event(app):
+    url = make_url("feed001", "https://feed.example.com")
+
+    async def scenario():
+        received = []
+        delivered = asyncio.Event()
+
+        async def handler(changes):
+            received.append(changes)
+            if changes and ("delete", url.id) in changes:
+                delivered.set()
+
+        feed = ChangeFeed(redis_store.stream_name(), block_ms=200)
+        feed.subscribe(handler)
+        feed.start()
+        await asyncio.sleep(0.1)
+        try:
+            await redis_store.save(url)
+            await redis_store.set_redirect(url.id, 301)
+            await redis_store.delete_many([url.id])
+            await asyncio.wait_for(delivered.wait(), 5)
+        finally:
+            feed.stop()
+        return [change for changes in received if changes for change in changes if change[1] == url.id]
+
+    assert [event for event, _ in run(scenario())] == ["save", "update", "delete"]
+
+def test_change_feed_reports_trimmed_gap(app):
+    async def scenario():
+        received = []
+        reported = asyncio.Event()
+
+        async def handler(changes):
+            received.append(changes)
+            if changes is None:
+                reported.set()
+
+        for i in range(3):
+            await redis_store.save(make_url(f"trim{i:03d}", f"https://trim.example.com/{i}"))
+        client = redis_store.redis_manager.client
+        [(first_id, _)] = await client.xrange(redis_store.stream_name(), "-", "+", count=1)
+        milliseconds, _, _ = first_id.partition("-")
+        # Позиция до начала ленты: всё между ней и первым событием подрезано
+        position = {manager.name: f"{int(milliseconds) - 1}-0" for manager in redis_store.redis_shards.all}
+        await client.xtrim(redis_store.stream_name(), maxlen=2, approximate=False)
+
+        feed = ChangeFeed(redis_store.stream_name(), block_ms=200)
+        feed.subscribe(handler)
+        feed.start(position)
+        try:
+            await asyncio.wait_for(reported.wait(), 5)
+        finally:
+            feed.stop()
+        return received
+
+    assert run(scenario())[0] is None
+
+def test_file_mode_links_reach_redis_once(client):
+    redis_to_file = ("redis_to_file",)
+    echoes_before = SYNC_RECORDS._values.get(redis_to_file, 0)
+    codes = [shorten(client).get_json()["short_code"] for _ in range(20)]
+    file_writer.flush()
+
+    assert wait_for(lambda: len(run(redis_store.load_many(codes))) == len(codes))
+    # Даём монитору Redis проснуться на события ленты от этих записей
+    wait_for(lambda: False, timeout=0.5)
+
+    ids = [record["id"] for record in file_backend.read_changes(None)[0] or []]
+    assert len(ids) == len(set(ids))
+    assert sum(ids.count(code) for code in codes) == len(codes)
+    assert SYNC_RECORDS._values.get(redis_to_file, 0) == echoes_before
+
+def test_worker_without_feed_sees_new_links_after_index_check(tmp_path):
+    # Воркер-не-лидер в режиме file: ленту не читает, ссылки другого процесса
+    # приходят через файл при следующей проверке индекса (INDEX_CHECK_INTERVAL)
+    backend = AppendLogBackend(str(tmp_path / "data.jsonl"), fsync_batch=1)
+    other = AppendLogBackend(backend.path, fsync_batch=1)
+    index = UrlIndex(backend=backend, check_interval=0.2)
+    assert index.get("late001") is None
+
+    other.append(make_url("late001", "https://late.example.com"))
+
+    assert index.get("late001") is None
+    assert wait_for(lambda: index.get("late001") == "https://late.example.com", timeout=1.0)
+    backend.close()
+    other.close()
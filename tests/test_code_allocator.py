@@ -0,0 +1,58 @@
+import threading
+import pytest
+from utils.helpers import encode_base62, permute_code_number, LocalCounter, CodeAllocator, CODE_LENGTH, CODE_SPACE
+
+# ---------------------------
+# CODE ALLOCATION (user-005)
+# ---------------------------
+
+def test_permutation_is_injective():
+    outputs = {permute_code_number(n, key=7) for n in range(20000)}
+    assert len(outputs) == 20000
+    assert all(0 <= n < CODE_SPACE for n in outputs)
+
+def test_encode_base62_bounds():
+    assert encode_base62(0) == "0" * CODE_LENGTH
+    assert len(encode_base62(CODE_SPACE - 1)) == CODE_LENGTH
+    with pytest.raises(ValueError):
+        encode_base62(CODE_SPACE)
+
+@pytest.mark.parametrize("strategy", ["permutation", "counter", "block"])
+def test_codes_are_unique(tmp_path, strategy):
+    counter = LocalCounter(str(tmp_path / "counter"))
+    allocator = CodeAllocator(counter.reserve, strategy=strategy, block_size=100, key=42)
+
+    codes = [allocator.allocate() for _ in range(5000)]
+
+    assert len(set(codes)) == 5000
+    assert all(len(code) == CODE_LENGTH for code in codes)
+
+def test_codes_are_unique_across_threads(tmp_path):
+    counter = LocalCounter(str(tmp_path / "counter"))
+    allocator = CodeAllocator(counter.reserve, strategy="block", block_size=50)
+    codes, lock = [], threading.Lock()
+
+    def worker():
+        batch = [allocator.allocate() for _ in range(500)]
+        with lock:
+            codes.extend(batch)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(codes)) == 4000
+
+def test_taken_codes_are_skipped(tmp_path):
+    counter = LocalCounter(str(tmp_path / "counter"))
+    taken = {encode_base62(0), encode_base62(1)}
+    allocator = CodeAllocator(counter.reserve, strategy="counter", is_taken=taken.__contains__)
+
+    assert allocator.allocate() == encode_base62(2)
+
+def test_local_counter_persists_between_instances(tmp_path):
+    path = str(tmp_path / "counter")
+    assert LocalCounter(path).reserve(10) == 0
+    assert LocalCounter(path).reserve(1) == 10
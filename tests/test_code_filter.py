@@ -0,0 +1,46 @@
+import time
+import types
+from protocol import url_storage as redis_store
+from protocol.code_filter import BloomFilter, CodeFilter, NegativeCache
+from support import wait_for
+
+# ---------------------------
+# CODE FILTER (user-021)
+# ---------------------------
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(10000)
+    added = [f"b{i:06d}" for i in range(10000)]
+    for code in added:
+        bloom.add(code)
+
+    assert all(code in bloom for code in added)
+    false_positives = sum(f"x{i:06d}" in bloom for i in range(10000))
+    assert false_positives < 500
+
+def test_negative_cache_expires_entries():
+    cache = NegativeCache(ttl=0.05, max_size=10)
+    cache.add("aaaaaaa")
+    assert "aaaaaaa" in cache
+    time.sleep(0.06)
+    assert "aaaaaaa" not in cache
+
+def test_saved_code_leaves_negative_cache():
+    code_filter = CodeFilter(enabled=True)
+    code_filter.remember_miss("fresh00")
+    assert code_filter.rejects("fresh00")
+
+    code_filter.add("fresh00")
+    assert not code_filter.rejects("fresh00")
+
+def test_filter_is_trusted_only_while_feed_is_live(app, monkeypatch):
+    code_filter = CodeFilter(enabled=True)
+    code_filter.rebuild(["known00"])
+    monkeypatch.setattr(redis_store, "code_filter", code_filter)
+    assert wait_for(lambda: redis_store.change_feed.live)
+
+    assert redis_store.code_filter_rejects("unknown")
+    assert not redis_store.code_filter_rejects("known00")
+
+    monkeypatch.setattr(redis_store, "change_feed", types.SimpleNamespace(live=False))
+    assert not redis_store.code_filter_rejects("unknown")
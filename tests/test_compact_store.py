@@ -0,0 +1,38 @@
+from protocol.compact_store import CompactUrlStore
+
+# ---------------------------
+# COMPACT STORE (user-017)
+# ---------------------------
+
+def test_put_get_remove():
+    store = CompactUrlStore()
+    for i in range(5000):
+        store.put(f"c{i:06d}", f"https://site.com/{i}")
+    store.put("c000001", "https://site.com/changed")
+    store.remove("c000002")
+
+    assert len(store) == 4999
+    assert store.get("c000001") == "https://site.com/changed"
+    assert store.get("c000002") is None
+    assert store.find_code("https://site.com/3/") == "c000003"
+    assert store.find_code("https://site.com/1") is None
+    assert "c000004" in store and "c000002" not in store
+
+def test_pages_cover_all_items():
+    store = CompactUrlStore()
+    for i in range(250):
+        store.put(f"c{i:06d}", f"https://site.com/{i}")
+
+    seen, cursor = [], 0
+    while cursor is not None:
+        items, cursor = store.page(cursor, 100)
+        seen.extend(code for code, _ in items)
+
+    assert sorted(seen) == sorted(code for code, _ in store.items())
+    assert len(seen) == 250
+
+def test_non_standard_codes():
+    store = CompactUrlStore()
+    store.put("custom-alias", "https://a.com")
+    assert store.get("custom-alias") == "https://a.com"
+    assert store.remove("custom-alias") and store.get("custom-alias") is None
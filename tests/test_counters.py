@@ -0,0 +1,24 @@
+from protocol import url_storage as redis_store
+from support import make_url, run
+
+# ---------------------------
+# MAINTAINED COUNTERS (user-010)
+# ---------------------------
+
+def test_count_and_version_follow_writes(app):
+    count, version = run(redis_store.get_url_count()), run(redis_store.get_version())
+    url = make_url("count01", "https://count.example.com")
+
+    run(redis_store.save(url))
+    run(redis_store.save(url))
+    assert run(redis_store.get_url_count()) == count + 1
+    assert run(redis_store.get_version()) > version
+
+    run(redis_store.delete_many([url.id]))
+    assert run(redis_store.get_url_count()) == count
+
+def test_missing_counter_is_rebuilt(app):
+    count = run(redis_store.get_url_count())
+    run(redis_store.redis_manager.client.delete(redis_store.REDIS_COUNT_KEY))
+
+    assert run(redis_store.get_url_count()) == count
@@ -0,0 +1,55 @@
+import json
+import routes.api as api
+from protocol.file_backends import AppendLogBackend, JsonFileBackend, migrate_json_to_log
+from protocol.url_index import UrlIndex
+from support import make_url, new_site, shorten
+
+# ---------------------------
+# LINK EXPIRATION (user-023)
+# ---------------------------
+
+def test_expiring_link(client, monkeypatch):
+    url = new_site()
+    body = shorten(client, url, expires_in=60, redirect="permanent").get_json()
+    assert body["expires_at"]
+    # Ссылка со сроком не подменяет бессрочную и не дедуплицируется
+    assert shorten(client, url).status_code == 201
+
+    # Кеш не держит редирект дольше срока жизни ссылки
+    response = client.get("/" + body["short_code"])
+    assert response.status_code == 301
+    assert 0 < int(response.headers["Cache-Control"].rsplit("=", 1)[1]) <= 60
+
+    monkeypatch.setattr(api, "is_expired", lambda expires_at: bool(expires_at))
+    assert client.get("/" + body["short_code"]).status_code == 404
+
+def test_expiration_validation():
+    assert api.parse_expiration({"expires_in": -5})[1]
+    assert api.parse_expiration({"expires_in": 10, "expires_at": 10})[1]
+    assert api.parse_expiration({"expires_in": True})[1]
+    assert api.parse_expiration({}) == (None, None)
+
+def test_pop_expired_returns_due_codes_in_order(tmp_path):
+    backend = JsonFileBackend(str(tmp_path / "data.json"))
+    backend.append_many([
+        make_url("aaaaaaa", "https://a.com", expires_at=300),
+        make_url("bbbbbbb", "https://b.com", expires_at=100),
+        make_url("ccccccc", "https://c.com"),
+        make_url("ddddddd", "https://d.com", expires_at=900),
+    ])
+    index = UrlIndex(backend=backend, check_interval=0)
+
+    assert index.pop_expired(now=500) == ["bbbbbbb", "aaaaaaa"]
+    assert index.pop_expired(now=500) == []
+    assert index.pop_expired(now=1000) == ["ddddddd"]
+
+def test_migration_keeps_expiry_and_redirect(tmp_path):
+    json_path, log_path = str(tmp_path / "data.json"), str(tmp_path / "data.jsonl")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump([{"id": "aaaaaaa", "original_url": "https://a.com", "short_id": "s/aaaaaaa",
+                    "redirect": 308, "expires_at": 4000000000}], f)
+
+    assert migrate_json_to_log(json_path, log_path) == 1
+
+    [migrated] = AppendLogBackend(log_path).load_all()
+    assert (migrated.redirect, migrated.expires_at) == (308, 4000000000)
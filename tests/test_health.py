@@ -0,0 +1,13 @@
+# ---------------------------
+# HEALTH PROBES (user-008)
+# ---------------------------
+
+def test_health_reports_storage_state(client):
+    health = client.get("/api/health").get_json()
+    assert (health["status"], health["storage"], health["initialized"]) == ("healthy", "file", True)
+
+def test_liveness_and_readiness(client):
+    assert client.get("/api/health/live").get_json() == {"status": "alive"}
+
+    ready = client.get("/api/health/ready")
+    assert ready.status_code == 200 and ready.get_json()["redis"] is True
@@ -0,0 +1,62 @@
+from protocol import url_storage as redis_store
+from protocol.file_backends import file_backend
+from utils.metrics import MetricsRegistry, Histogram, SyncRun, SYNC_RECORDS, SYNC_ERRORS
+from support import make_url, run, wait_for
+
+# ---------------------------
+# METRICS (user-016)
+# ---------------------------
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "/x")
+
+    assert histogram.render() == [
+        'test_seconds_bucket{route="/x",le="0.1"} 1',
+        'test_seconds_bucket{route="/x",le="1.0"} 3',
+        'test_seconds_bucket{route="/x",le="+Inf"} 4',
+        'test_seconds_sum{route="/x"} 6.05',
+        'test_seconds_count{route="/x"} 4',
+    ]
+
+def test_registry_renders_help_type_and_escaped_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Things", ("name",))
+    counter.inc('a"b')
+    counter.inc('a"b', amount=2)
+
+    body = registry.render()
+    assert "# HELP test_total Things\n# TYPE test_total counter\n" in body
+    assert 'test_total{name="a\\"b"} 3' in body
+
+def test_sync_run_records_records_and_errors():
+    records = SYNC_RECORDS._values.get(("test_job",), 0)
+    errors = SYNC_ERRORS._values.get(("test_job",), 0)
+
+    with SyncRun("test_job") as run:
+        run.records = 7
+    with SyncRun("test_job") as run:
+        run.failed = True
+
+    assert SYNC_RECORDS._values[("test_job",)] - records == 7
+    assert SYNC_ERRORS._values[("test_job",)] - errors == 1
+
+def test_metrics_endpoint_exposes_request_counters(client):
+    client.get("/api/health/live")
+    body = client.get("/metrics").get_data(as_text=True)
+
+    assert 'urlmuhameda_http_requests_total{method="GET",route="/api/health/live",status="200"}' in body
+    assert "urlmuhameda_http_request_duration_seconds_bucket" in body
+
+def test_metrics_endpoint_exposes_sync_monitor_runs(client):
+    # Запись в файл будит монитор файла, запись в Redis - монитор Redis (через ленту)
+    file_backend.upsert_many([make_url("metric1", "https://metric1.example.com")])
+    run(redis_store.save(make_url("metric2", "https://metric2.example.com")))
+    assert wait_for(lambda: SYNC_RECORDS._values.get(("file_to_redis",)) and SYNC_RECORDS._values.get(("redis_to_file",)))
+
+    body = client.get("/metrics").get_data(as_text=True)
+    for job in ("file_to_redis", "redis_to_file"):
+        assert f'urlmuhameda_sync_records_total{{job="{job}"}}' in body
+        assert f'urlmuhameda_sync_duration_seconds_count{{job="{job}"}}' in body
+        assert f'urlmuhameda_sync_last_records{{job="{job}"}}' in body
@@ -0,0 +1,39 @@
+import pytest
+from protocol.file_backends import JsonFileBackend
+from protocol.url_index import UrlIndex
+from utils.helpers import normalize_url, url_digest
+from support import make_url, new_site, shorten
+
+# ---------------------------
+# URL NORMALIZATION (user-004)
+# ---------------------------
+
+@pytest.mark.parametrize("variant", [
+    "https://Example.com", "https://example.com/", "https://EXAMPLE.com:443/", "example.com", "  example.com  ",
+])
+def test_equivalent_forms_normalize_to_one_url(variant):
+    assert normalize_url(variant) == "https://example.com"
+    assert url_digest(variant) == url_digest("https://example.com")
+
+def test_meaningful_differences_are_kept():
+    assert normalize_url("https://a.com/?b=2&a=1") == normalize_url("https://a.com?a=1&b=2")
+    assert normalize_url("http://a.com") != normalize_url("https://a.com")
+    assert normalize_url("https://a.com:8443") == "https://a.com:8443"
+    assert normalize_url("https://a.com/Path") != normalize_url("https://a.com/path")
+
+def test_index_finds_code_by_normalized_url(tmp_path):
+    backend = JsonFileBackend(str(tmp_path / "data.json"))
+    backend.append(make_url("aaaaaaa", "https://Example.com/"))
+    index = UrlIndex(backend=backend, check_interval=0)
+
+    assert index.find_code("example.com") == "aaaaaaa"
+    index.remove("aaaaaaa")
+    assert index.find_code("example.com") is None
+
+def test_same_url_in_another_form_returns_existing_code(client):
+    host = new_site()
+    first = shorten(client, host + "/path?b=2&a=1")
+    again = shorten(client, "https://" + host[len("https://"):].upper() + ":443/path/?a=1&b=2")
+
+    assert again.status_code == 200
+    assert again.get_json()["short_code"] == first.get_json()["short_code"]
@@ -0,0 +1,57 @@
+import threading
+import time
+import multiprocessing
+import conftest  # noqa: F401 - для процессов, запущенных через spawn: окружение тестов до импорта модулей
+from protocol.file_backends import JsonFileBackend
+from utils.process_lock import FileLock, HostLeader
+from support import make_url
+
+# ---------------------------
+# CROSS-PROCESS LOCKS (user-019)
+# ---------------------------
+
+def test_only_one_host_leader(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    leader, follower = HostLeader(path), HostLeader(path)
+
+    assert leader.try_acquire() and leader.is_leader
+    assert not follower.try_acquire() and not follower.is_leader
+    assert leader.try_acquire()
+
+def test_file_lock_serializes_threads(tmp_path):
+    lock = FileLock(str(tmp_path / "data.lock"), "test")
+    inside, overlaps = [], []
+
+    def worker():
+        for _ in range(20):
+            with lock:
+                inside.append(1)
+                if len(inside) > 1:
+                    overlaps.append(1)
+                time.sleep(0.0005)
+                inside.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not overlaps
+    assert not lock.locked()
+
+def append_from_process(path, worker):
+    backend = JsonFileBackend(path)
+    for i in range(20):
+        backend.append(make_url(f"w{worker}{i:05d}", f"https://w{worker}.com/{i}"))
+
+def test_json_appends_from_several_processes_are_not_lost(tmp_path):
+    path = str(tmp_path / "data.json")
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=append_from_process, args=(path, w)) for w in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+
+    assert len(JsonFileBackend(path).read_records()) == 80
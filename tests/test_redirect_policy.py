@@ -0,0 +1,38 @@
+import pytest
+import routes.api as api
+from support import shorten
+
+# ---------------------------
+# REDIRECT POLICY (user-014)
+# ---------------------------
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None), ("default", None), ("permanent", 301), ("temporary", 302), (308, 308), ("307", 307),
+])
+def test_parse_redirect_accepts(value, expected):
+    assert api.parse_redirect(value) == (expected, None)
+
+@pytest.mark.parametrize("value", [301.0, True, 303, "forever", [301]])
+def test_parse_redirect_rejects(value):
+    status, error = api.parse_redirect(value)
+    assert status is None and error
+
+def test_permanent_redirect_is_cacheable(client):
+    code = shorten(client, redirect="permanent").get_json()["short_code"]
+    response = client.get("/" + code)
+
+    assert response.status_code == 301
+    assert response.headers["Cache-Control"].startswith("public, max-age=")
+    assert client.get("/" + code, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+def test_purge_requires_admin_token(client, monkeypatch):
+    code = shorten(client).get_json()["short_code"]
+    monkeypatch.setattr(api, "ADMIN_TOKEN", None)
+    assert client.post(f"/api/links/{code}/purge").status_code == 403
+
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "secret")
+    assert client.post(f"/api/links/{code}/purge", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.post(f"/api/links/{code}/purge", json={"redirect": 308},
+                           headers={"Authorization": "Bearer secret"})
+    assert response.get_json()["redirect"] == 308
+    assert client.get("/" + code).status_code == 308
@@ -0,0 +1,19 @@
+from protocol import url_storage as redis_store
+from support import run
+
+# ---------------------------
+# REDIS AS PRIMARY (user-003)
+# ---------------------------
+
+def test_shorten_and_redirect_from_redis(client, redis_mode):
+    url = "https://redis-mode.example.com/page"
+    response = client.post("/api/shorten", json={"url": url})
+    code = response.get_json()["short_code"]
+
+    assert response.status_code == 201
+    assert run(redis_store.load_url(code)).original_url == url
+    assert client.get("/" + code).headers["Location"] == url
+    assert client.get("/api/health").get_json()["storage"] == "redis"
+
+def test_unknown_code_in_redis_is_404(client, redis_mode):
+    assert client.get("/zzzzzzz").status_code == 404
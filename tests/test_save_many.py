@@ -0,0 +1,17 @@
+from protocol import url_storage as redis_store
+from support import make_url, run
+
+# ---------------------------
+# BULK SAVE (user-020)
+# ---------------------------
+
+def test_save_many_skips_unchanged_records(app):
+    urls = [make_url(f"bulk{i:03d}", f"https://bulk.example.com/{i}") for i in range(25)]
+    first = run(redis_store.save_many(urls, chunk_size=10))
+    assert (first.written, first.skipped, bool(first)) == (25, 0, True)
+
+    urls[0].original_url += "/changed"
+    again = run(redis_store.save_many(urls, chunk_size=10))
+    assert (again.written, again.skipped) == (1, 24)
+    assert run(redis_store.load_url(urls[0].id)).original_url.endswith("/changed")
+    assert run(redis_store.find_code_by_original(urls[1].original_url)) == urls[1].id
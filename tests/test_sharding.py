@@ -0,0 +1,56 @@
+from collections import Counter
+from config.redis_manager import HashRing, RedisManager, parse_shard
+from protocol.sharding import move_keys, pipeline_by_key
+from support import run
+
+# ---------------------------
+# SHARDING (user-022)
+# ---------------------------
+
+def test_hash_ring_moves_only_keys_of_the_new_shard():
+    keys = [f"k{i:06d}" for i in range(20000)]
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+
+    moved = [key for key in keys if before.node(key) != after.node(key)]
+    assert all(after.node(key) == "d" for key in moved)
+    assert 0.15 < len(moved) / len(keys) < 0.35
+    assert max(Counter(after.node(key) for key in keys).values()) < len(keys) * 0.35
+
+def test_parse_shard():
+    params = parse_shard("redis://:secret@cache.local:6380/2")
+    assert (params.host, params.port, params.password, params.db) == ("cache.local", 6380, "secret", 2)
+
+def test_pipeline_by_key_can_keep_results_of_healthy_shards(app):
+    healthy = RedisManager(parse_shard("redis://localhost:6379/4"))
+    broken = RedisManager(parse_shard("redis://localhost:6379/5"))
+    run(healthy.init_connection())
+    keys = ["good:1", "bad:1", "good:2"]
+
+    results = run(pipeline_by_key(
+        keys, lambda pipeline, i: pipeline.set(keys[i], i),
+        route=lambda key: healthy if key.startswith("good") else broken, return_exceptions=True
+    ))
+
+    assert results[0] is True and results[2] is True
+    assert isinstance(results[1], Exception)
+
+def test_move_keys_between_shards(app):
+    source = RedisManager(parse_shard("redis://localhost:6379/1"))
+    target = RedisManager(parse_shard("redis://localhost:6379/2"))
+
+    async def scenario():
+        await source.init_connection()
+        await target.init_connection()
+        await source.client.hset("Url:move001", mapping={"id": "move001", "original_url": "https://m.com"})
+        await source.client.hset("clicks:move001", mapping={"total": 2})
+        await target.client.hset("clicks:move001", mapping={"total": 3})
+        moved = await move_keys(source, target, ["Url:move001", "clicks:move001", "Url:absent"], merge=True)
+        return (moved, await target.client.hgetall("Url:move001"),
+                await target.client.hget("clicks:move001", "total"), await source.client.exists("Url:move001"))
+
+    moved, url, clicks, left = run(scenario())
+    assert moved == 2
+    assert url["original_url"] == "https://m.com"
+    assert int(clicks) == 5
+    assert left == 0
@@ -0,0 +1,66 @@
+import os
+from protocol.file_backends import JsonFileBackend, AppendLogBackend
+from protocol.snapshot import UrlSnapshot, write_snapshot, records_to_rows, build_snapshot
+from protocol.url_index import UrlIndex
+from support import make_url
+
+# ---------------------------
+# SNAPSHOT (user-018)
+# ---------------------------
+
+def test_snapshot_roundtrip(tmp_path):
+    path = str(tmp_path / "data.snap")
+    records = [
+        {"id": "bbbbbbb", "original_url": "https://b.com", "redirect": 308},
+        {"id": "aaaaaaa", "original_url": "https://a.com", "expires_at": 4000000000},
+        {"id": "odd-code", "original_url": "https://odd.com"},
+    ]
+    assert write_snapshot(path, records_to_rows(records), {"backend": "json"}) == 3
+
+    snapshot = UrlSnapshot.open(path)
+    assert snapshot.lookup("aaaaaaa") == ("https://a.com", None, 4000000000)
+    assert snapshot.lookup("bbbbbbb") == ("https://b.com", 308, None)
+    assert snapshot.get("odd-code") == "https://odd.com"
+    assert snapshot.find_code("b.com") == "bbbbbbb"
+    assert [row[0] for row in snapshot.rows()] == ["aaaaaaa", "bbbbbbb", "odd-code"]
+
+def test_records_to_rows_keeps_last_record_per_code():
+    rows = records_to_rows([
+        {"id": "aaaaaaa", "original_url": "https://old.com"},
+        {"id": "bbbbbbb", "original_url": "https://b.com"},
+        {"id": "aaaaaaa", "original_url": "https://new.com"},
+        {"id": "bbbbbbb", "deleted": True},
+    ])
+    assert [(row[0], row[1]) for row in rows] == [("aaaaaaa", "https://new.com")]
+
+def test_index_starts_from_snapshot_and_applies_log_tail(tmp_path):
+    backend = AppendLogBackend(str(tmp_path / "data.jsonl"), fsync_batch=1)
+    snap_path = str(tmp_path / "data.snap")
+    backend.append_many([make_url("aaaaaaa", "https://a.com"), make_url("bbbbbbb", "https://b.com")])
+    build_snapshot(backend, snap_path)
+    backend.append(make_url("ccccccc", "https://c.com"))
+    backend.delete_many(["aaaaaaa"])
+
+    index = UrlIndex(backend=backend, check_interval=0, snapshot_path=snap_path)
+
+    assert index.get("bbbbbbb") == "https://b.com"
+    assert index.get("ccccccc") == "https://c.com"
+    assert index.get("aaaaaaa") is None
+    assert index.size == 2
+    backend.close()
+
+def test_full_reload_does_not_rewrite_snapshot(tmp_path):
+    backend = JsonFileBackend(str(tmp_path / "data.json"))
+    snap_path = str(tmp_path / "data.snap")
+    backend.append_many([make_url("aaaaaaa", "https://a.com"), make_url("bbbbbbb", "https://b.com")])
+    index = UrlIndex(backend=backend, check_interval=0, snapshot_path=snap_path)
+    assert index.size == 2
+    written_at = os.stat(snap_path).st_mtime_ns
+
+    backend.write_all([make_url("bbbbbbb", "https://b.com"), make_url("ccccccc", "https://c.com")])
+    index.reload()
+
+    assert os.stat(snap_path).st_mtime_ns == written_at
+    assert index.get("aaaaaaa") is None
+    assert index.get("ccccccc") == "https://c.com"
+    assert sorted(code for code, _ in index.page(0, 10)[0]) == ["bbbbbbb", "ccccccc"]
@@ -0,0 +1,39 @@
+from utils import static_assets
+from utils.static_assets import StaticBuilder, StaticAssets, is_not_modified, parse_accept_encoding
+
+# ---------------------------
+# STATIC ASSETS (user-013)
+# ---------------------------
+
+def test_build_hashes_and_compresses(tmp_path):
+    static_dir = tmp_path / "static"
+    static_dir.mkdir()
+    (static_dir / "app.css").write_text("body {\n  color: red;\n}\n" * 40)
+    home = tmp_path / "home.html"
+    home.write_text('<link href="/static/app.css" rel="stylesheet">')
+
+    manifest = StaticBuilder(str(static_dir), str(static_dir / "dist"), str(home)).build()
+    assets = StaticAssets(str(static_dir), str(static_dir / "dist"), str(home))
+
+    built = manifest["app.css"]
+    assert built != "app.css" and built.endswith(".css")
+    with open(assets.home().path, encoding="utf-8") as f:
+        assert built in f.read()
+    asset = assets.resolve("dist/" + built, "gzip, br")
+    # .br собирается, только если установлен brotli
+    assert asset.encoding == ("br" if static_assets.brotli else "gzip")
+    assert asset.vary and "immutable" in asset.cache_control
+    assert assets.resolve("dist/" + built).encoding is None
+    assert assets.resolve("../home.html") is None
+
+def test_accept_encoding_and_etag_matching():
+    assert parse_accept_encoding("gzip;q=0, br") == {"br"}
+    assert is_not_modified('W/"abc", "def"', "abc")
+    assert not is_not_modified(None, "abc")
+
+def test_home_revalidates_with_etag(client):
+    first = client.get("/")
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "no-cache"
+
+    again = client.get("/", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
@@ -0,0 +1,30 @@
+import json
+from support import shorten
+
+# ---------------------------
+# PAGINATED STATS (user-007)
+# ---------------------------
+
+def test_pages_cover_every_link_once(client):
+    created = {shorten(client).get_json()["short_code"] for _ in range(5)}
+
+    seen, cursor = [], 0
+    while cursor is not None:
+        body = client.get(f"/api/stats?cursor={cursor}&limit=3").get_json()
+        assert len(body["urls"]) <= 3
+        seen.extend(item["short_code"] for item in body["urls"])
+        cursor = body["next_cursor"]
+
+    assert len(seen) == len(set(seen))
+    assert created <= set(seen)
+    assert client.get("/api/stats?summary=1").get_json()["total_urls"] == len(seen)
+
+def test_ndjson_stream(client):
+    code = shorten(client).get_json()["short_code"]
+    response = client.get("/api/stats?format=ndjson")
+
+    assert response.mimetype == "application/x-ndjson"
+    assert code in {json.loads(line)["short_code"] for line in response.get_data(as_text=True).splitlines()}
+
+def test_bad_cursor_is_rejected(client):
+    assert client.get("/api/stats?cursor=-1").status_code == 400
@@ -0,0 +1,57 @@
+import json
+from protocol import url_storage as redis_store
+from protocol.file_backends import JsonFileBackend, file_backend
+from support import make_url, run, wait_for
+
+# ---------------------------
+# FILE <-> REDIS SYNC (user-009)
+# ---------------------------
+
+def test_json_upsert_replaces_records_by_id(tmp_path):
+    backend = JsonFileBackend(str(tmp_path / "data.json"))
+    backend.append_many([make_url("aaaaaaa", "https://a.com"), make_url("bbbbbbb", "https://b.com")])
+    backend.upsert_many([make_url("aaaaaaa", "https://a.com", redirect=301), make_url("ccccccc", "https://c.com")])
+
+    with open(backend.path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    assert sorted(item["id"] for item in data) == ["aaaaaaa", "bbbbbbb", "ccccccc"]
+    assert backend.read_records()["aaaaaaa"]["redirect"] == 301
+
+def test_json_upsert_collapses_repeated_ids(tmp_path):
+    backend = JsonFileBackend(str(tmp_path / "data.json"))
+    with open(backend.path, "w", encoding="utf-8") as f:
+        json.dump([{"id": "aaaaaaa", "original_url": "https://a.com"}] * 2, f)
+
+    backend.upsert_many([make_url("aaaaaaa", "https://a2.com")])
+
+    with open(backend.path, "r", encoding="utf-8") as f:
+        assert [item["original_url"] for item in json.load(f)] == ["https://a2.com"]
+
+def test_redis_changes_reach_the_file(app):
+    url = make_url("sync001", "https://sync.example.com")
+    assert run(redis_store.save(url))
+    assert wait_for(lambda: url.id in file_backend.read_records())
+
+    run(redis_store.set_redirect(url.id, 308))
+    assert wait_for(lambda: file_backend.read_records()[url.id].get("redirect") == 308)
+
+    run(redis_store.delete_many([url.id]))
+    assert wait_for(lambda: url.id not in file_backend.read_records())
+
+def test_file_changes_reach_redis(app):
+    file_backend.upsert_many([make_url("sync002", "https://sync2.example.com")])
+    assert wait_for(lambda: run(redis_store.load_many(["sync002"])))
+
+    file_backend.upsert_many([make_url("sync002", "https://sync2.example.com", redirect=301)])
+    assert wait_for(lambda: run(redis_store.load_url("sync002")).redirect == 301)
+
+def test_monitor_skips_only_its_own_file_write():
+    monitor = redis_store.OptimizedFileMonitor()
+    monitor._last_modified, monitor._file_size = 1.0, 10
+
+    monitor.skip_own_write(((1.0, 10), (2.0, 20)))
+    assert (monitor._last_modified, monitor._file_size) == (2.0, 20)
+
+    # Между увиденным состоянием и нашей записью файл менял кто-то ещё
+    monitor.skip_own_write(((3.0, 30), (4.0, 40)))
+    assert (monitor._last_modified, monitor._file_size) == (2.0, 20)
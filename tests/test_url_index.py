@@ -0,0 +1,49 @@
+from protocol.file_backends import JsonFileBackend, AppendLogBackend
+from protocol.url_index import UrlIndex
+from support import make_url, new_site, shorten
+
+# ---------------------------
+# IN-MEMORY INDEX (user-001)
+# ---------------------------
+
+def test_index_serves_lookups_from_json_file(tmp_path):
+    backend = JsonFileBackend(str(tmp_path / "data.json"))
+    backend.append_many([make_url("aaaaaaa", "https://a.com"), make_url("bbbbbbb", "https://b.com", redirect=301)])
+    index = UrlIndex(backend=backend, check_interval=0)
+
+    assert index.get("aaaaaaa") == "https://a.com"
+    assert index.lookup("bbbbbbb") == ("https://b.com", 301, None)
+    assert index.get("zzzzzzz") is None
+    assert index.size == 2
+
+def test_index_picks_up_writes_of_another_process(tmp_path):
+    backend = AppendLogBackend(str(tmp_path / "data.jsonl"), fsync_batch=1)
+    backend.append(make_url("aaaaaaa", "https://a.com"))
+    index = UrlIndex(backend=backend, check_interval=0)
+
+    # Запись мимо индекса, как из другого воркера
+    backend.append(make_url("ccccccc", "https://c.com"))
+    backend.delete_many(["aaaaaaa"])
+    index.reload()
+
+    assert index.get("ccccccc") == "https://c.com"
+    assert index.get("aaaaaaa") is None
+    backend.close()
+
+def test_shorten_and_redirect(client):
+    url = new_site() + "/page"
+    created = shorten(client, url)
+    code = created.get_json()["short_code"]
+
+    assert created.status_code == 201 and len(code) == 7
+    response = client.get("/" + code)
+    assert response.status_code == 302
+    assert response.headers["Location"] == url
+
+def test_unknown_and_invalid_codes_are_404(client):
+    assert client.get("/zzzzzzz").status_code == 404
+    assert client.get("/short").status_code == 404
+
+def test_shorten_rejects_bad_input(client):
+    assert client.post("/api/shorten", json={}).status_code == 400
+    assert client.post("/api/shorten", json={"url": "not a url"}).status_code == 400
@@ -0,0 +1,53 @@
+import threading
+from protocol.file_backends import BackgroundFileWriter, file_backend
+from protocol.url_index import file_writer
+from support import make_url, shorten
+
+# ---------------------------
+# GROUP COMMIT (user-024)
+# ---------------------------
+
+class RecordingBackend:
+    """upsert_many пишет в память; первые fail_times вызовов падают"""
+
+    def __init__(self, fail_times=0):
+        self.batches = []
+        self.fail_times = fail_times
+        self.lock = threading.Lock()
+
+    def upsert_many(self, urls):
+        with self.lock:
+            if self.fail_times:
+                self.fail_times -= 1
+                raise OSError("disk full")
+            self.batches.append([u.id for u in urls])
+            return len(self.batches)
+
+def test_background_writer_groups_submissions_into_one_write():
+    backend = RecordingBackend()
+    written = []
+    writer = BackgroundFileWriter(backend, interval=60, on_written=lambda batch, result: written.append(result))
+
+    writer.submit_many([make_url(f"a{i:06d}", f"https://a.com/{i}") for i in range(50)])
+    writer.flush()
+
+    assert sum(len(batch) for batch in backend.batches) == 50
+    assert len(backend.batches) <= 2
+    assert written
+
+def test_background_writer_retries_failed_batch():
+    backend = RecordingBackend(fail_times=1)
+    writer = BackgroundFileWriter(backend, interval=60)
+
+    writer.submit(make_url("aaaaaaa", "https://a.com"))
+    writer.flush()
+    writer.flush()
+
+    assert [code for batch in backend.batches for code in batch] == ["aaaaaaa"]
+
+def test_new_link_redirects_before_it_reaches_the_file(client):
+    code = shorten(client).get_json()["short_code"]
+    assert client.get("/" + code).status_code == 302
+
+    file_writer.flush()
+    assert code in file_backend.read_records()
@@ -0,0 +1,35 @@
+import json
+import urllib.request
+from typing import List, Optional
+from config.settings import CDN_PURGE_URL, CDN_PURGE_TOKEN
+
+# Сколько секунд ждём ответа API очистки CDN
+CDN_PURGE_TIMEOUT = 5
+
+def purge_urls(urls: List[str]) -> Optional[bool]:
+    """Просим CDN выбросить закешированные ответы для urls.
+
+    None - очистка не настроена (CDN_PURGE_URL пуст), иначе успех запроса.
+    Вызов блокирующий: из async-кода - через asyncio.to_thread.
+    """
+    if not CDN_PURGE_URL or not urls:
+        return None
+
+    headers = {"Content-Type": "application/json"}
+    if CDN_PURGE_TOKEN:
+        headers["Authorization"] = f"Bearer {CDN_PURGE_TOKEN}"
+    request = urllib.request.Request(
+        CDN_PURGE_URL,
+        data=json.dumps({"files": urls}).encode("utf-8"),
+        headers=headers,
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=CDN_PURGE_TIMEOUT) as response:
+            ok = 200 <= response.status < 300
+    except Exception as e:
+        print(f"[CDN ERROR] Purge failed: {e}")
+        return False
+
+    print(f"[CDN] Purged {len(urls)} URLs" if ok else f"[CDN ERROR] Purge returned {response.status}")
+    return ok
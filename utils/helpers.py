@@ -1,6 +1,18 @@
 import string
 import random
 import re
+import os
+import time
+import fcntl
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+CODE_LENGTH = 7
+CODE_ALPHABET = string.digits + string.ascii_letters
+CODE_SPACE = len(CODE_ALPHABET) ** CODE_LENGTH  # 62^7
 
 def generate_short_code():
     """Генерирует случайный код из 7 символов"""
@@ -17,3 +29,212 @@ def is_valid_url(url):
         r'(?::\d+)?'
         r'(?:/?|[/?]\S+)$', re.IGNORECASE)
     return url_pattern.match(url) is not None
+
+
+def normalize_url(url):
+    """Приводит URL к каноническому виду для поиска дубликатов.
+
+    https://A.com:443/, https://a.com и a.com дают один и тот же результат:
+    схема и хост в нижнем регистре, без порта по умолчанию, без завершающего
+    слэша, параметры запроса отсортированы.
+    """
+    url = url.strip()
+    if not url.lower().startswith(('http://', 'https://')):
+        url = 'https://' + url
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if ':' in host:
+        host = f'[{host}]'  # IPv6
+
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{host}:{port}'
+    if parts.username:
+        userinfo = parts.username + (f':{parts.password}' if parts.password else '')
+        netloc = f'{userinfo}@{netloc}'
+
+    path = parts.path.rstrip('/')
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, parts.fragment))
+
+def url_digest(url):
+    """Короткий ключ нормализованного URL для хеш-индекса в Redis"""
+    return hashlib.sha1(normalize_url(url).encode('utf-8')).hexdigest()
+
+def is_expired(expires_at, now=None):
+    """Истёк ли срок ссылки; expires_at - unix-время в секундах, пусто - бессрочная"""
+    return bool(expires_at) and expires_at <= (time.time() if now is None else now)
+
+# ---------------------------
+# SHORT CODE ALLOCATION
+# ---------------------------
+
+def encode_base62(number):
+    """Число из [0, 62^7) -> код ровно из 7 символов"""
+    if not 0 <= number < CODE_SPACE:
+        raise ValueError(f"Code number out of range: {number}")
+    chars = []
+    for _ in range(CODE_LENGTH):
+        number, rem = divmod(number, len(CODE_ALPHABET))
+        chars.append(CODE_ALPHABET[rem])
+    return ''.join(reversed(chars))
+
+def permute_code_number(number, key):
+    """Биекция [0, 62^7) -> [0, 62^7): сеть Фейстеля на 42 битах + cycle walking.
+
+    Соседние значения счётчика дают непохожие коды, но разные входы
+    гарантированно дают разные выходы.
+    """
+    half_bits = 21
+    mask = (1 << half_bits) - 1
+    while True:
+        left, right = number >> half_bits, number & mask
+        for round_no in range(4):
+            digest = hashlib.blake2b(f'{key}:{round_no}:{right}'.encode(), digest_size=4).digest()
+            left, right = right, left ^ (int.from_bytes(digest, 'big') & mask)
+        number = (left << half_bits) | right
+        if number < CODE_SPACE:
+            return number
+
+class LocalCounter:
+    """Персистентный счётчик в файле; fcntl-блокировка делает его общим для процессов"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def reserve(self, size=1):
+        """Атомарно резервирует size значений, возвращает первое"""
+        with self._lock, open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                start = int(f.read().strip() or 0)
+                f.seek(0)
+                f.truncate()
+                f.write(str(start + size))
+                f.flush()
+                os.fsync(f.fileno())
+                return start
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+class CodeAllocator:
+    """Выдаёт уникальные 7-символьные коды без чтения набора данных.
+
+    Стратегии:
+      counter     - атомарный счётчик (Redis INCR или LocalCounter), коды по порядку
+      permutation - тот же счётчик, пропущенный через биекцию permute_code_number
+      block       - воркер арендует блок из block_size значений счётчика одним
+                    обращением и раздаёт коды из него локально (тоже перемешанные)
+      random      - прежний generate_short_code с повторами
+
+    reserve(size) -> start резервирует диапазон [start, start + size) счётчика.
+    is_taken(code) отсекает коды, выданные до перехода на счётчик (случайные);
+    taken_many(codes) -> set - то же для пачки одним обращением к хранилищу.
+    """
+
+    STRATEGIES = ('counter', 'permutation', 'block', 'random')
+
+    def __init__(self, reserve, strategy='permutation', block_size=1000, key=0, is_taken=None, taken_many=None):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown code allocator strategy: {strategy}")
+        self._reserve = reserve
+        self._strategy = strategy
+        self._block_size = block_size if strategy == 'block' else 1
+        self._key = key
+        self._is_taken = is_taken or (lambda code: False)
+        self._taken_many = taken_many or (lambda codes: {code for code in codes if self._is_taken(code)})
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def _take_number(self):
+        """Следующее значение из арендованного диапазона; None - диапазон исчерпан"""
+        with self._lock:
+            if self._next >= self._end:
+                return None
+            number = self._next
+            self._next += 1
+        if number >= CODE_SPACE:
+            raise RuntimeError("Short code space exhausted")
+        return number
+
+    def _lease(self, start):
+        with self._lock:
+            self._next, self._end = start, start + self._block_size
+
+    def _code_for(self, number):
+        if self._strategy == 'counter':
+            return encode_base62(number)
+        return encode_base62(permute_code_number(number, self._key))
+
+    def _range_codes(self, start, count):
+        if start + count > CODE_SPACE:
+            raise RuntimeError("Short code space exhausted")
+        return [self._code_for(n) for n in range(start, start + count)]
+
+    def _candidate(self):
+        if self._strategy == 'random':
+            return generate_short_code()
+        number = self._take_number()
+        while number is None:
+            self._lease(self._reserve(self._block_size))
+            number = self._take_number()
+        return self._code_for(number)
+
+    def allocate_many(self, count):
+        """Коды для пакетного сокращения: диапазон счётчика резервируется одним вызовом,
+        занятость всей пачки проверяется одним taken_many"""
+        if count <= 0:
+            return []
+        if self._strategy in ('counter', 'permutation'):
+            codes = self._range_codes(self._reserve(count), count)
+        else:
+            codes = [self._candidate() for _ in range(count)]
+        taken = self._taken_many(codes)
+        return [code if code not in taken else self.allocate() for code in codes]
+
+    def allocate(self, max_attempts=10):
+        for _ in range(max_attempts):
+            code = self._candidate()
+            if not self._is_taken(code):
+                return code
+        raise RuntimeError("Could not generate unique code")
+
+    # --- асинхронный вариант (ASGI): reserve и is_taken - корутины ---
+
+    async def _candidate_async(self, reserve):
+        if self._strategy == 'random':
+            return generate_short_code()
+        number = self._take_number()
+        while number is None:
+            self._lease(await reserve(self._block_size))
+            number = self._take_number()
+        return self._code_for(number)
+
+    async def allocate_async(self, reserve, is_taken, max_attempts=10):
+        for _ in range(max_attempts):
+            code = await self._candidate_async(reserve)
+            if not await is_taken(code):
+                return code
+        raise RuntimeError("Could not generate unique code")
+
+    async def allocate_many_async(self, count, reserve, is_taken, taken_many):
+        if count <= 0:
+            return []
+        if self._strategy in ('counter', 'permutation'):
+            codes = self._range_codes(await reserve(count), count)
+        else:
+            codes = [await self._candidate_async(reserve) for _ in range(count)]
+        taken = await taken_many(codes)
+        return [
+            code if code not in taken else await self.allocate_async(reserve, is_taken)
+            for code in codes
+        ]
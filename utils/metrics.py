@@ -0,0 +1,293 @@
+import time
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+# Метрики в текстовом формате Prometheus (/metrics).
+# Без внешних зависимостей: счётчик - словарь под коротким локом, гистограмма -
+# bisect по границам корзин. Запись метрики - микросекунды, можно держать включённым.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Запросы и команды Redis: от долей миллисекунды до секунд
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Прогоны синхронизации: от миллисекунд до минут
+SYNC_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Удержание лока файла: запись строки - микросекунды, полная перезапись JSON - секунды
+LOCK_BUCKETS = (0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# ---------------------------
+# METRIC TYPES
+# ---------------------------
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}"
+                for labels, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._buckets = tuple(sorted(buckets))
+        # labels -> [счётчики корзин (последняя - +Inf), сумма, количество]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self._buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels) -> "Timer":
+        return Timer(self, labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(state[0]), state[1], state[2]) for labels, state in self._values.items()]
+
+        lines = []
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self._buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Timer:
+    """with histogram.time(labels...): - длительность блока в гистограмму"""
+
+    def __init__(self, histogram: Histogram, labels: Tuple):
+        self._histogram = histogram
+        self._labels = labels
+        self._started = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._started, *self._labels)
+        return False
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# ---------------------------
+# APPLICATION METRICS
+# ---------------------------
+
+metrics = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = metrics.histogram(
+    "urlmuhameda_http_request_duration_seconds", "Request latency by route", ("method", "route"))
+HTTP_REQUESTS = metrics.counter(
+    "urlmuhameda_http_requests_total", "Requests by route and status", ("method", "route", "status"))
+REDIRECTS = metrics.counter(
+    "urlmuhameda_redirects_total", "Short code lookups by result", ("result",))
+CODE_FILTER_REJECTS = metrics.counter(
+    "urlmuhameda_code_filter_rejects_total", "Lookups answered by the code filter without storage", ("source",))
+
+SYNC_DURATION = metrics.histogram(
+    "urlmuhameda_sync_duration_seconds", "Duration of sync runs", ("job",), SYNC_BUCKETS)
+SYNC_RECORDS = metrics.counter(
+    "urlmuhameda_sync_records_total", "Records moved by sync runs", ("job",))
+SYNC_LAST_RECORDS = metrics.gauge(
+    "urlmuhameda_sync_last_records", "Records moved by the last sync run", ("job",))
+SYNC_ERRORS = metrics.counter(
+    "urlmuhameda_sync_errors_total", "Failed sync runs", ("job",))
+
+REDIS_COMMAND_DURATION = metrics.histogram(
+    "urlmuhameda_redis_command_duration_seconds", "Redis command latency (PIPELINE - whole pipeline)", ("command",))
+REDIS_COMMAND_ERRORS = metrics.counter(
+    "urlmuhameda_redis_command_errors_total", "Failed Redis commands", ("command",))
+
+FILE_LOCK_HOLD = metrics.histogram(
+    "urlmuhameda_file_lock_hold_seconds", "Time the storage file lock is held", ("backend",), LOCK_BUCKETS)
+WRITE_BEHIND_WAITS = metrics.counter(
+    "urlmuhameda_write_behind_waits_total", "Submissions that waited for a full write-behind queue", ("writer",))
+CLICKS_DROPPED = metrics.counter(
+    "urlmuhameda_clicks_dropped_total", "Click events evicted from a full analytics buffer before a flush")
+
+
+def observe_request(method: str, route: str, status: int, duration: float):
+    HTTP_REQUEST_DURATION.observe(duration, method, route)
+    HTTP_REQUESTS.inc(method, route, str(status))
+
+
+class SyncRun:
+    """Один прогон синхронизации: длительность, число записей и ошибки.
+
+    with SyncRun("file_to_redis") as run:
+        ...
+        run.records = len(changed)
+    """
+
+    def __init__(self, job: str):
+        self.job = job
+        self.records = 0
+        self.failed = False
+        self._started = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        SYNC_DURATION.observe(time.perf_counter() - self._started, self.job)
+        if self.failed or exc_type is not None:
+            SYNC_ERRORS.inc(self.job)
+        SYNC_RECORDS.inc(self.job, amount=self.records)
+        SYNC_LAST_RECORDS.set(self.records, self.job)
+        return False
+
+
+class TimedLock:
+    """threading.Lock, который пишет время удержания в FILE_LOCK_HOLD"""
+
+    def __init__(self, backend: str):
+        self._lock = threading.Lock()
+        self._backend = backend
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._acquired_at = time.perf_counter()
+        return acquired
+
+    def release(self):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        FILE_LOCK_HOLD.observe(held, self._backend)
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+def instrument_redis(client):
+    """Оборачиваем команды клиента redis.asyncio (через него ходит и ashredis) таймером.
+
+    Отдельная команда меряется по имени (HGETALL, INCR...), pipeline - целиком.
+    """
+    if getattr(client, "_metrics_instrumented", False):
+        return client
+    execute_command = client.execute_command
+    make_pipeline = client.pipeline
+
+    async def timed_execute_command(*args, **options):
+        command = str(args[0]).upper() if args else "UNKNOWN"
+        started = time.perf_counter()
+        try:
+            return await execute_command(*args, **options)
+        except Exception:
+            REDIS_COMMAND_ERRORS.inc(command)
+            raise
+        finally:
+            REDIS_COMMAND_DURATION.observe(time.perf_counter() - started, command)
+
+    def timed_pipeline(*args, **kwargs):
+        pipeline = make_pipeline(*args, **kwargs)
+        execute = pipeline.execute
+
+        async def timed_execute(*exec_args, **exec_kwargs):
+            started = time.perf_counter()
+            try:
+                return await execute(*exec_args, **exec_kwargs)
+            except Exception:
+                REDIS_COMMAND_ERRORS.inc("PIPELINE")
+                raise
+            finally:
+                REDIS_COMMAND_DURATION.observe(time.perf_counter() - started, "PIPELINE")
+
+        pipeline.execute = timed_execute
+        return pipeline
+
+    client.execute_command = timed_execute_command
+    client.pipeline = timed_pipeline
+    client._metrics_instrumented = True
+    return client
@@ -0,0 +1,91 @@
+import os
+import fcntl
+from utils.metrics import TimedLock
+
+# Блокировки для нескольких процессов на одной машине (gunicorn -w N).
+# flock держится на открытом файле, а не на пути, поэтому лок-файл отдельный
+# от данных: данные можно подменять через os.replace, не теряя блокировку.
+
+# ---------------------------
+# FILE LOCK
+# ---------------------------
+
+class FileLock:
+    """Эксклюзивный лок и для потоков процесса, и для других процессов.
+
+    Поток сначала берёт TimedLock (время удержания видно в /metrics),
+    затем процесс - flock на path.
+    """
+
+    def __init__(self, path: str, backend: str):
+        self.path = path
+        self._thread_lock = TimedLock(backend)
+        self._fd = None
+        self._pid = None
+
+    def _lock_fd(self) -> int:
+        # Дескриптор, унаследованный через fork, делит flock с родителем - нужен свой
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def acquire(self) -> bool:
+        self._thread_lock.acquire()
+        try:
+            fcntl.flock(self._lock_fd(), fcntl.LOCK_EX)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        return True
+
+    def release(self):
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._thread_lock.release()
+
+    def locked(self) -> bool:
+        return self._thread_lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+# ---------------------------
+# HOST LEADER
+# ---------------------------
+
+class HostLeader:
+    """Один процесс на машине выполняет фоновую работу (мониторы, синхронизацию).
+
+    Неблокирующий flock на общем файле: лидер держит его до выхода, после его
+    смерти лок освобождает ядро, и следующий try_acquire() другого воркера успешен.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._pid = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None and self._pid == os.getpid()
+
+    def try_acquire(self) -> bool:
+        if self.is_leader:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd, self._pid = fd, os.getpid()
+        return True
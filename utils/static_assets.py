@@ -0,0 +1,298 @@
+import io
+import os
+import re
+import sys
+import json
+import gzip
+import shutil
+import hashlib
+import mimetypes
+import posixpath
+from typing import Dict, NamedTuple, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from fontTools.ttLib import TTFont
+except ImportError:
+    TTFont = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+HOME_FILE = os.path.join(BASE_DIR, "home.html")
+
+# Результат сборки: файлы с хешем содержимого в имени + сжатые варианты .gz/.br
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_NAME = "manifest.json"
+HOME_NAME = "home.html"
+
+# Имя с хешем меняется вместе с содержимым, поэтому такие файлы кешируются навсегда.
+# Всё остальное (страница, исходники без сборки) браузер перепроверяет по ETag.
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+COMPRESSIBLE = {".css", ".js", ".html", ".json", ".svg", ".ttf", ".otf"}
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+mimetypes.add_type("font/woff2", ".woff2")
+mimetypes.add_type("font/ttf", ".ttf")
+mimetypes.add_type("image/webp", ".webp")
+
+# ---------------------------
+# BUILD
+# ---------------------------
+
+CSS_URL_RE = re.compile(
+    r"""url\(\s*(['"]?)([^'")]+)\1\s*\)(\s*format\(\s*['"]?[\w-]+['"]?\s*\))?"""
+)
+HTML_ASSET_RE = re.compile(r"""((?:href|src)=)(['"])/?static/([^'"#?]+)\2""")
+
+def minify_css(text: str) -> str:
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    text = re.sub(r":\s+", ":", text)
+    return text.replace(";}", "}").strip()
+
+def minify_js(text: str) -> str:
+    """Без разбора JS: убираем отступы, пустые строки и строки-комментарии.
+    Переводы строк остаются, так что автоподстановка ';' не ломается."""
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("//"):
+            lines.append(line)
+    return "\n".join(lines) + "\n"
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def hashed_name(rel_path: str, data: bytes) -> str:
+    stem, ext = posixpath.splitext(rel_path)
+    return f"{stem}.{content_hash(data)}{ext}"
+
+def ttf_to_woff2(path: str) -> Optional[bytes]:
+    """woff2 требует fontTools и brotli; без них шрифт уходит в сборку как есть"""
+    if TTFont is None or brotli is None:
+        return None
+    font = TTFont(path)
+    font.flavor = "woff2"
+    buffer = io.BytesIO()
+    font.save(buffer)
+    return buffer.getvalue()
+
+
+class StaticBuilder:
+    """Сборка статики для главной страницы.
+
+    Обходит ресурсы, на которые ссылается home.html (и CSS через url()/@import),
+    минифицирует CSS/JS, переводит .ttf в .woff2, даёт файлам имена с хешем
+    содержимого и рядом кладёт .gz/.br. Ссылки переписываются на новые имена,
+    таблица исходное -> собранное пишется в manifest.json.
+    """
+
+    def __init__(self, static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR,
+                 home_file: str = HOME_FILE):
+        self.static_dir = static_dir
+        self.dist_dir = dist_dir
+        self.home_file = home_file
+        self.manifest: Dict[str, str] = {}
+
+    def build(self) -> Dict[str, str]:
+        if os.path.isdir(self.dist_dir):
+            shutil.rmtree(self.dist_dir)
+        os.makedirs(self.dist_dir)
+        self.manifest = {}
+
+        with open(self.home_file, "r", encoding="utf-8") as f:
+            html = f.read()
+        html = HTML_ASSET_RE.sub(self._rewrite_html_ref, html)
+        self._write(HOME_NAME, html.encode("utf-8"))
+
+        self._write(MANIFEST_NAME, json.dumps(self.manifest, indent=2, sort_keys=True).encode("utf-8"))
+        print(f"[STATIC] Built {len(self.manifest)} assets into {self.dist_dir}")
+        return self.manifest
+
+    def asset(self, rel_path: str) -> str:
+        """Собирает ресурс (один раз) и возвращает его путь внутри dist"""
+        if rel_path in self.manifest:
+            return self.manifest[rel_path]
+
+        source = os.path.join(self.static_dir, *rel_path.split("/"))
+        ext = posixpath.splitext(rel_path)[1].lower()
+        if ext == ".css":
+            with open(source, "r", encoding="utf-8") as f:
+                text = f.read()
+            text = CSS_URL_RE.sub(lambda m: self._rewrite_css_ref(rel_path, m), text)
+            data, out_path = minify_css(text).encode("utf-8"), rel_path
+        elif ext == ".js":
+            with open(source, "r", encoding="utf-8") as f:
+                data, out_path = minify_js(f.read()).encode("utf-8"), rel_path
+        else:
+            woff2 = ttf_to_woff2(source) if ext == ".ttf" else None
+            if woff2 is not None:
+                data, out_path = woff2, posixpath.splitext(rel_path)[0] + ".woff2"
+            else:
+                with open(source, "rb") as f:
+                    data, out_path = f.read(), rel_path
+
+        built = hashed_name(out_path, data)
+        self._write(built, data)
+        self.manifest[rel_path] = built
+        return built
+
+    def _rewrite_html_ref(self, match) -> str:
+        attr, quote, rel_path = match.groups()
+        if not os.path.isfile(os.path.join(self.static_dir, *rel_path.split("/"))):
+            return match.group(0)
+        return f"{attr}{quote}/static/dist/{self.asset(rel_path)}{quote}"
+
+    def _rewrite_css_ref(self, css_path: str, match) -> str:
+        ref, font_format = match.group(2).strip(), match.group(3)
+        if re.match(r"^(?:[a-z]+:|//|#)", ref, re.I):
+            return match.group(0)
+
+        clean_ref = ref.split("#")[0].split("?")[0]
+        if clean_ref.startswith("/static/"):
+            target = clean_ref[len("/static/"):]
+        else:
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(css_path), clean_ref))
+        if not os.path.isfile(os.path.join(self.static_dir, *target.split("/"))):
+            print(f"[STATIC] Missing asset {ref} referenced from {css_path}")
+            return match.group(0)
+
+        built = self.asset(target)
+        url = posixpath.relpath(built, posixpath.dirname(css_path) or ".")
+        if font_format and built.endswith(".woff2"):
+            font_format = " format('woff2')"
+        return f"url('{url}'){font_format or ''}"
+
+    def _write(self, rel_path: str, data: bytes):
+        path = os.path.join(self.dist_dir, *rel_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+        if posixpath.splitext(rel_path)[1].lower() not in COMPRESSIBLE:
+            return
+        variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(data):
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+
+# ---------------------------
+# SERVING
+# ---------------------------
+
+class StaticFile(NamedTuple):
+    path: str
+    mimetype: str
+    etag: str
+    cache_control: str
+    encoding: Optional[str] = None
+    vary: bool = False
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"ETag": f'"{self.etag}"', "Cache-Control": self.cache_control}
+        if self.encoding:
+            headers["Content-Encoding"] = self.encoding
+        if self.vary:
+            headers["Vary"] = "Accept-Encoding"
+        return headers
+
+
+class StaticAssets:
+    """Выбор файла для /static/<path> и главной страницы.
+
+    Не зависит от фреймворка: Flask (routes/views.py) и Quart (asgi.py) только
+    отдают найденный файл с заголовками StaticFile.headers() или 304.
+    """
+
+    def __init__(self, static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR,
+                 home_file: str = HOME_FILE):
+        self.static_dir = os.path.abspath(static_dir)
+        self.dist_dir = os.path.abspath(dist_dir)
+        self.home_file = home_file
+        # path -> (mtime_ns, size, etag): хеш файла считается один раз
+        self._etags: Dict[str, tuple] = {}
+
+    def home(self, accept_encoding: str = "") -> StaticFile:
+        built = os.path.join(self.dist_dir, HOME_NAME)
+        path = built if os.path.isfile(built) else self.home_file
+        return self._file(path, accept_encoding, REVALIDATE_CACHE)
+
+    def resolve(self, filename: str, accept_encoding: str = "") -> Optional[StaticFile]:
+        path = os.path.abspath(os.path.join(self.static_dir, filename))
+        if not path.startswith(self.static_dir + os.sep) or not os.path.isfile(path):
+            return None
+
+        name = os.path.basename(path)
+        hashed = path.startswith(self.dist_dir + os.sep) and name not in (HOME_NAME, MANIFEST_NAME)
+        return self._file(path, accept_encoding, IMMUTABLE_CACHE if hashed else REVALIDATE_CACHE)
+
+    def _file(self, path: str, accept_encoding: str, cache_control: str) -> StaticFile:
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        etag = self._etag(path)
+
+        compressible = os.path.splitext(path)[1].lower() in COMPRESSIBLE
+        if compressible:
+            accepted = parse_accept_encoding(accept_encoding)
+            for encoding, suffix in ENCODINGS:
+                if encoding in accepted and os.path.isfile(path + suffix):
+                    return StaticFile(path + suffix, mimetype, f"{etag}-{encoding}",
+                                      cache_control, encoding, vary=True)
+        return StaticFile(path, mimetype, etag, cache_control, vary=compressible)
+
+    def _etag(self, path: str) -> str:
+        stat = os.stat(path)
+        cached = self._etags.get(path)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+        etag = digest.hexdigest()[:16]
+        self._etags[path] = (stat.st_mtime_ns, stat.st_size, etag)
+        return etag
+
+
+def parse_accept_encoding(header: Optional[str]) -> set:
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+def is_not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/").strip('"') == etag:
+            return True
+    return False
+
+
+# Глобальный выбор статических файлов
+static_assets = StaticAssets()
+
+
+if __name__ == "__main__":
+    # python -m utils.static_assets build
+    if sys.argv[1:] != ["build"]:
+        print("Usage: python -m utils.static_assets build")
+        sys.exit(1)
+    if TTFont is None or brotli is None:
+        print("[STATIC] fonttools/brotli not installed: fonts stay .ttf, no .br variants")
+    StaticBuilder().build()